@@ -0,0 +1,301 @@
+#
+# This file is part of the Fedstellar platform (see https://github.com/enriquetomasmb/fedstellar).
+# Copyright (c) 2023 Enrique Tomás Martínez Beltrán.
+#
+
+import asyncio
+import logging
+import time
+from concurrent import futures
+
+import grpc
+
+from fedstellar.base_node import ModelStreamAssembler
+from fedstellar.messages import NodeMessages
+from fedstellar.neighbors import Neighbors
+from fedstellar.outbox import Outbox
+from fedstellar.proto import node_pb2, node_pb2_grpc
+
+
+class AioNeighbors(Neighbors):
+    """
+    Neighbors using grpc.aio stubs (TRANSPORT: "aio"). All the RPCs run on a single event loop (owned by the node),
+    and the heartbeater is a task of this loop instead of a thread.
+    Blocking methods (called from other threads, e.g. training) submit the coroutines to the loop and wait for them.
+
+    Args:
+        self_addr (str): Address of the node itself.
+        config (Config): Configuration of the node.
+        loop (asyncio.AbstractEventLoop): Event loop of the node.
+    """
+
+    def __init__(self, self_addr, config, loop):
+        super().__init__(self_addr, config)
+        self.__self_addr = self_addr
+        self.__config = config
+        self.__loop = loop
+        self.__tasks = []
+        self.__pending_disconnections = set()
+
+    def start(self):
+        """
+        Start the heartbeater task.
+        """
+        logging.info(f"({self.__self_addr}) Starting heartbeater task")
+        self.__run(self.__start_tasks())
+
+    def stop(self):
+        """
+        Cancel the heartbeater task and close all the connections.
+        """
+        super().stop()
+        # Wait for the pending disconnections (they never block the caller, see _disconnect)
+        futures.wait(list(self.__pending_disconnections), timeout=self.__config.participant["GRPC_TIMEOUT"])
+
+    async def __start_tasks(self):
+        self.__tasks = [
+            asyncio.ensure_future(self.__heartbeater()),
+        ]
+
+    def _stop_heartbeater(self):
+        self.__cancel_tasks()
+
+    def __cancel_tasks(self):
+        for task in self.__tasks:
+            self.__loop.call_soon_threadsafe(task.cancel)
+
+    async def __heartbeater(self):
+        period = self.__config.participant["HEARTBEAT_PERIOD"]
+        toggle = False
+        while True:
+            t = time.time()
+            self.expire_channels()
+            membership = self.get_membership()
+            if membership is not None:
+                # Probes are blocking calls (they wait for the loop), run them out of the loop
+                await self.__loop.run_in_executor(None, membership.probe_round)
+            else:
+                # Check heartbeats (every 2 periods) and send heartbeat (a newer beat replaces the queued one)
+                self.queue_messages(self._build_heartbeats(check_timeouts=toggle), key=NodeMessages.BEAT)
+                toggle = True
+            await asyncio.sleep(max(0, period - (time.time() - t)))
+
+    ####
+    # Loop helpers
+    ####
+
+    def __in_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.__loop
+        except RuntimeError:
+            return False
+
+    def __run(self, coro):
+        """
+        Run a coroutine on the event loop. If called from the loop itself, it is scheduled as a task (fire and forget).
+        Otherwise, the calling thread waits for the result.
+        """
+        if self.__in_loop():
+            return self.__loop.create_task(coro)
+        return self.__wait(coro)
+
+    def __wait(self, coro):
+        """
+        Run a coroutine on the event loop and wait for its result.
+
+        Raises:
+            RuntimeError: If called from the loop itself (waiting would deadlock it).
+        """
+        if self.__in_loop():
+            coro.close()
+            raise RuntimeError(f"({self.__self_addr}) Blocking call from the event loop")
+        return asyncio.run_coroutine_threadsafe(coro, self.__loop).result()
+
+    ####
+    # Message
+    ####
+
+    def send_messages(self, sends):
+        """
+        Send several messages concurrently (one call per neighbor in the event loop, batching the messages to the
+        same neighbor) and wait until all of them are finished. Neighbors that fail are removed.
+
+        Args:
+            sends (list): List of (neighbor address, node_pb2.Message) to send.
+        """
+        self.__run(self.__send_messages(sends))
+
+    def _new_outbox(self, nei):
+        # Senders are tasks of the loop (no threads per neighbor)
+        return Outbox(
+            self.__self_addr,
+            nei,
+            lambda nei, msgs: self.__send_messages([(nei, msg) for msg in msgs]),
+            self.__config,
+            loop=self.__loop,
+        )
+
+    async def __send_messages(self, sends):
+        calls = []
+        for nei, msgs in self._group_messages(sends):
+            try:
+                stub = self.get(nei)
+                start = time.time()
+                if len(msgs) == 1:
+                    call = stub.send_message(msgs[0], timeout=self.__config.participant["GRPC_TIMEOUT"])
+                else:
+                    call = stub.send_messages(node_pb2.MessageBatch(messages=msgs), timeout=self.__config.participant["GRPC_TIMEOUT"])
+                calls.append((nei, msgs, self.__timed(nei, msgs, call, start)))
+            except Exception as e:
+                self._check_message_response(nei, msgs, error=e)
+        results = await asyncio.gather(*[call for _, _, call in calls], return_exceptions=True)
+        resends = []
+        for (nei, msgs, _), res in zip(calls, results):
+            if isinstance(res, Exception):
+                resends += self._check_message_response(nei, msgs, error=res)
+            else:
+                resends += self._check_message_response(nei, msgs, res)
+        if resends:
+            await self.__send_messages(resends)
+
+    async def __timed(self, nei, msgs, call, start):
+        # Traffic accounting and RTT sample of the call
+        try:
+            res = await call
+        except Exception:
+            self._messages_sent(nei, msgs, time.time() - start, False)
+            raise
+        self._messages_sent(nei, msgs, time.time() - start, True)
+        return res
+
+    def _call(self, rpc, request, timeout=None):
+        if timeout is None:
+            timeout = self.__config.participant["GRPC_TIMEOUT"]
+
+        async def call():
+            return await rpc(request, timeout=timeout)
+
+        return self.__wait(call())
+
+    ####
+    # Connections
+    ####
+
+    def _connect(self, addr, handshake_msg):
+        return self.__wait(self.__connect(addr, handshake_msg))
+
+    async def __connect(self, addr, handshake_msg):
+        channel = grpc.aio.insecure_channel(addr)
+        stub = node_pb2_grpc.NodeServicesStub(channel)
+        if handshake_msg:
+            res = await stub.handshake(
+                node_pb2.HandShakeRequest(addr=self.__self_addr, codecs=self.get_codecs(), host_id=self.get_host_id()),
+                timeout=self.__config.participant["GRPC_TIMEOUT"],
+            )
+            if res.error:
+                logging.info(
+                    f"({self.__self_addr}) Cannot add a neighbor: {res.error}"
+                )
+                await channel.close()
+                return None
+            self.set_codec(addr, res.codec if res.HasField("codec") else "none")
+            self.set_host(addr, res.host_id)
+        return channel, stub
+
+    def _disconnect(self, channel, stub, disconnect_msg):
+        # Never wait here: remove() holds the neighbors lock, which is also taken by the tasks of the loop
+        if self.__in_loop():
+            self.__loop.create_task(self.__disconnect(channel, stub, disconnect_msg))
+        elif not self.__loop.is_closed():
+            future = asyncio.run_coroutine_threadsafe(self.__disconnect(channel, stub, disconnect_msg), self.__loop)
+            self.__pending_disconnections.add(future)
+            future.add_done_callback(self.__pending_disconnections.discard)
+
+    async def __disconnect(self, channel, stub, disconnect_msg):
+        try:
+            # If the other node still connected, disconnect
+            if disconnect_msg:
+                await stub.disconnect(
+                    node_pb2.HandShakeRequest(addr=self.__self_addr),
+                    timeout=self.__config.participant["GRPC_TIMEOUT"],
+                )
+            # Close channel
+            await channel.close()
+        except:
+            pass
+
+
+class AioNodeServicer(node_pb2_grpc.NodeServicesServicer):
+    """
+    grpc.aio servicer of a node (TRANSPORT: "aio"). Cheap work (deduplication of messages, reassembly of model
+    streams) is done in the event loop, while the node handlers (callbacks, aggregation) run in the default executor
+    of the loop so they never block it.
+
+    Args:
+        node (BaseNode): Node that handles the requests.
+    """
+
+    def __init__(self, node):
+        self.__node = node
+
+    async def __run_handler(self, handler, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, handler, *args)
+
+    async def handshake(self, request, context):
+        return await self.__run_handler(self.__node.handshake, request, context)
+
+    async def disconnect(self, request, context):
+        return await self.__run_handler(self.__node.disconnect, request, context)
+
+    async def send_message(self, request, context):
+        # If not processed
+        if self.__node._neighbors.add_processed_msg(request.hash):
+            return await self.__run_handler(self.__process_messages, [request])
+        self.__node._message_received(request)
+        return node_pb2.ResponseMessage()
+
+    async def send_messages(self, request, context):
+        # Only the messages not processed before are dispatched
+        msgs = []
+        for msg in request.messages:
+            if self.__node._neighbors.add_processed_msg(msg.hash):
+                msgs.append(msg)
+            else:
+                self.__node._message_received(msg)
+        if not msgs:
+            return node_pb2.ResponseMessage()
+        return await self.__run_handler(self.__process_messages, msgs)
+
+    def __process_messages(self, msgs):
+        error = None
+        for msg in msgs:
+            start = time.time()
+            res = self.__node._process_message(msg)
+            self.__node._message_received(msg, time.time() - start, res)
+            if res.error and error is None:
+                error = res.error
+        if error is not None:
+            return node_pb2.ResponseMessage(error=error)
+        return node_pb2.ResponseMessage()
+
+    async def probe(self, request, context):
+        return await self.__run_handler(self.__node.probe, request, context)
+
+    async def offer_model(self, request, context):
+        return await self.__run_handler(self.__node.offer_model, request, context)
+
+    async def add_model(self, request, context):
+        return await self.__run_handler(self.__node.add_model, request, context)
+
+    async def add_model_stream(self, request_iterator, context):
+        assembler = ModelStreamAssembler(self.__node.config.participant["MAX_MODEL_SIZE"])
+        async for request in request_iterator:
+            if not assembler.add(request):
+                return node_pb2.ResponseMessage(error=assembler.error)
+            if request.WhichOneof("content") == "header" and not self.__node._admit_model(assembler.header):
+                return node_pb2.ResponseMessage(not_needed=True)
+        # Digest verification is CPU-bound, keep it out of the loop
+        weights = await self.__run_handler(assembler.get_weights)
+        if weights is None:
+            return node_pb2.ResponseMessage(error=assembler.error)
+        return await self.__run_handler(self.__node.add_model, weights, context)
@@ -14,10 +14,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import asyncio
 import logging
 import os
 import socket
 import sys
+import threading
+import time
 from concurrent import futures
 from logging import Formatter, FileHandler
 
@@ -27,6 +30,91 @@ from fedstellar.messages import NodeMessages
 from fedstellar.neighbors import Neighbors
 from fedstellar.proto import node_pb2
 from fedstellar.proto import node_pb2_grpc
+from fedstellar.utils import shm
+from fedstellar.utils.functions import payload_digest
+
+
+# Maximum size of a gRPC message
+MAX_MESSAGE_LENGTH = 1024 * 1024 * 1024
+
+
+class ModelStreamAssembler:
+    """
+    Reassemble a model streamed in chunks (add_model_stream). The first request carries the header (source, round,
+    contributors, weight, total size and digest), the following ones the chunks of the serialized model. Chunks are
+    written into a buffer of the announced size, allocated when the first chunk arrives (headers announcing a size out
+    of [0, max_size] are rejected before).
+
+    Args:
+        max_size (int): Maximum size of a model (bytes).
+
+    Attributes:
+        error (str): Reason why the stream was rejected (None if no error).
+    """
+
+    def __init__(self, max_size):
+        self.header = None
+        self.error = None
+        self.__max_size = max_size
+        self.__buffer = None
+        self.__received = 0
+
+    def add(self, request):
+        """
+        Add a request of the stream.
+
+        Args:
+            request (node_pb2.WeightsChunk): Header or chunk of the model.
+
+        Returns:
+            bool: False if the stream must be rejected (see error).
+        """
+        if self.header is None:
+            if request.WhichOneof("content") != "header":
+                self.error = "Model stream must start with a header"
+                return False
+            if not 0 <= request.header.total_size <= self.__max_size:
+                self.error = f"Model stream from {request.header.source} announces {request.header.total_size} bytes (maximum: {self.__max_size})"
+                return False
+            self.header = request.header
+            return True
+        chunk = request.chunk
+        if self.__received + len(chunk) > self.header.total_size:
+            self.error = f"Model stream from {self.header.source} exceeds the announced size ({self.header.total_size} bytes)"
+            return False
+        if self.__buffer is None:
+            self.__buffer = bytearray(self.header.total_size)
+        self.__buffer[self.__received:self.__received + len(chunk)] = chunk
+        self.__received += len(chunk)
+        return True
+
+    def get_weights(self):
+        """
+        Check that the stream is complete and the digest matches.
+
+        Returns:
+            node_pb2.Weights: Reassembled model, or None if the stream must be rejected (see error).
+        """
+        if self.header is None:
+            self.error = "Empty model stream"
+            return None
+        if self.__received != self.header.total_size:
+            self.error = f"Incomplete model stream from {self.header.source} ({self.__received}/{self.header.total_size} bytes)"
+            return None
+        if self.__buffer is None:
+            self.__buffer = bytearray()
+        if payload_digest(self.__buffer) != self.header.digest:
+            self.error = f"Digest mismatch in model stream from {self.header.source}"
+            return None
+        return node_pb2.Weights(
+            source=self.header.source,
+            round=self.header.round,
+            weights=bytes(self.__buffer),
+            contributors=self.header.contributors,
+            weight=self.header.weight,
+            base=self.header.base,
+            base_round=self.header.base_round,
+        )
 
 
 class BaseNode(node_pb2_grpc.NodeServicesServicer):
@@ -65,18 +153,32 @@ class BaseNode(node_pb2_grpc.NodeServicesServicer):
 
         self.addr = f"{self.host}:{self.port}"
 
-        # Neighbors
-        self._neighbors = Neighbors(self.addr, config)
-
         # Server
         self.__running = False
-        opts = [("grpc.keepalive_time_ms", 10000),
+        self.__opts = [("grpc.keepalive_time_ms", 10000),
                 ("grpc.keepalive_timeout_ms", 10000),
                 ("grpc.keepalive_permit_without_calls", True),
                 ("grpc.http2.max_ping_strikes", 0),
-                ("grpc.max_send_message_length", 1024 * 1024 * 1024),
-                ("grpc.max_receive_message_length", 1024 * 1024 * 1024)]
-        self.__server = grpc.server(futures.ThreadPoolExecutor(max_workers=50), options=opts)
+                ("grpc.max_send_message_length", MAX_MESSAGE_LENGTH),
+                ("grpc.max_receive_message_length", MAX_MESSAGE_LENGTH)]
+
+        # Transport: "grpc" (thread pool server), "aio" (grpc.aio server and stubs on one event loop) or "local"
+        # (in-process dispatch between the nodes of a simulation, no gRPC)
+        self.__transport = config.participant["TRANSPORT"]
+        if self.__transport == "aio":
+            from fedstellar.aio_transport import AioNeighbors
+
+            self.__loop = asyncio.new_event_loop()
+            self._neighbors = AioNeighbors(self.addr, config, self.__loop)
+            self.__server = None  # created on the event loop
+        elif self.__transport == "local":
+            from fedstellar.local_transport import LocalNeighbors, LocalServer
+
+            self._neighbors = LocalNeighbors(self.addr, config)
+            self.__server = LocalServer(self)
+        else:
+            self._neighbors = Neighbors(self.addr, config)
+            self.__server = grpc.server(futures.ThreadPoolExecutor(max_workers=50), options=self.__opts)
 
         # Logging
         self.log_dir = os.path.join(config.participant['tracking_args']["log_dir"], self.experiment_name)
@@ -175,17 +277,37 @@ class BaseNode(node_pb2_grpc.NodeServicesServicer):
         # Set running
         self.__running = True
         # Server
-        node_pb2_grpc.add_NodeServicesServicer_to_server(self, self.__server)
-        self.__server.add_insecure_port(self.addr)
-        logging.info(f"({self.addr}) Starting gRPC thread at {self.addr}...")
-        self.__server.start()
+        if self.__transport == "aio":
+            logging.info(f"({self.addr}) Starting gRPC (asyncio) event loop at {self.addr}...")
+            threading.Thread(target=self.__loop.run_forever, name=f"aio_loop-{self.addr}", daemon=True).start()
+            self.__server = asyncio.run_coroutine_threadsafe(self.__start_aio_server(), self.__loop).result()
+        elif self.__transport == "local":
+            logging.info(f"({self.addr}) Starting in-process server at {self.addr}...")
+            self.__server.start()
+        else:
+            node_pb2_grpc.add_NodeServicesServicer_to_server(self, self.__server)
+            self.__server.add_insecure_port(self.addr)
+            logging.info(f"({self.addr}) Starting gRPC thread at {self.addr}...")
+            self.__server.start()
         logging.info(f"({self.addr}) gRPC started.")
         # Heartbeat and Gossip
         self._neighbors.start()
-        
+
+    async def __start_aio_server(self):
+        from fedstellar.aio_transport import AioNodeServicer
+
+        server = grpc.aio.server(options=self.__opts)
+        node_pb2_grpc.add_NodeServicesServicer_to_server(AioNodeServicer(self), server)
+        server.add_insecure_port(self.addr)
+        await server.start()
+        return server
+
     def grpc_wait(self):
         logging.info(f"({self.addr}) Waiting for gRPC to terminate...")
-        self.__server.wait_for_termination()
+        if self.__transport == "aio":
+            asyncio.run_coroutine_threadsafe(self.__server.wait_for_termination(), self.__loop).result()
+        else:
+            self.__server.wait_for_termination()
         logging.info(f"({self.addr}) gRPC terminated.")
 
     def stop(self):
@@ -199,9 +321,14 @@ class BaseNode(node_pb2_grpc.NodeServicesServicer):
         # Check running
         self.assert_running(True)
         # Stop server
-        self.__server.stop(0)
+        if self.__transport == "aio":
+            asyncio.run_coroutine_threadsafe(self.__server.stop(0), self.__loop).result()
+        else:
+            self.__server.stop(0)
         # Stop neighbors
         self._neighbors.stop()
+        if self.__transport == "aio":
+            self.__loop.call_soon_threadsafe(self.__loop.stop)
         # Set not running
         self.__running = False
 
@@ -260,7 +387,11 @@ class BaseNode(node_pb2_grpc.NodeServicesServicer):
         """
         logging.info(f"({self.addr}) handshake (gRPC) | from {request.addr}")
         if self._neighbors.add(request.addr, handshake_msg=False):
-            return node_pb2.ResponseMessage()
+            self._neighbors.set_host(request.addr, request.host_id)
+            return node_pb2.ResponseMessage(
+                codec=self._neighbors.negotiate_codec(request.addr, request.codecs),
+                host_id=self._neighbors.get_host_id(),
+            )
         else:
             return node_pb2.ResponseMessage(
                 error="Cannot add the node (duplicated or wrong direction)"
@@ -282,29 +413,141 @@ class BaseNode(node_pb2_grpc.NodeServicesServicer):
         # logging.info(f"({self.addr}) received message from {request.source} | {request.cmd} {request.args}")
         # If not processed
         if self._neighbors.add_processed_msg(request.hash):
-            # Gossip
-            # logging.info(f"({self.addr}) gossiping message from {request.source} | {request.cmd} {request.args}")
-            self._neighbors.gossip(request)
-            # Process message
-            if request.cmd in self.__msg_callbacks.keys():
-                try:
-                    # logging.info(f"({self.addr}) running callback for {request.cmd} {request.args}")
-                    self.__msg_callbacks[request.cmd](request)
-                except Exception as e:
-                    error_text = f"[{self.addr}] Error while processing command: {request.cmd} {request.args}: {e}"
-                    logging.error(error_text)
-                    return node_pb2.ResponseMessage(error=error_text)
-            else:
-                # disconnect node
-                logging.error(
-                    f"[{self.addr}] Unknown command: {request.cmd} from {request.source}"
-                )
-                return node_pb2.ResponseMessage(error=f"Unknown command: {request.cmd}")
+            start = time.time()
+            res = self._process_message(request)
+            self._message_received(request, time.time() - start, res)
+            return res
+        self._message_received(request)
+        return node_pb2.ResponseMessage()
+
+    def send_messages(self, request, context):
+        """
+        GRPC service. It is called when a node sends a batch of messages to another (gossip).
+        Each message is dispatched as in send_message. The first error (if any) is returned.
+        """
+        error = None
+        for msg in request.messages:
+            res = self.send_message(msg, context)
+            if res.error and error is None:
+                error = res.error
+        if error is not None:
+            return node_pb2.ResponseMessage(error=error)
         return node_pb2.ResponseMessage()
 
+    def _message_received(self, request, seconds=None, res=None):
+        """
+        Account a received message (see TrafficStats). Messages are accounted by source, duplicates without latency.
+
+        Args:
+            request (node_pb2.Message): The message.
+            seconds (float): Time spent processing the message (None if it was a duplicate).
+            res (node_pb2.ResponseMessage): The response.
+        """
+        self._neighbors.get_traffic_stats().record(
+            request.cmd, request.source, "in", request.ByteSize(), seconds, error=res is not None and bool(res.error)
+        )
+
+    def _process_message(self, request):
+        """
+        Gossip a message (not processed before) to the neighbors and run the callback of its command.
+
+        Args:
+            request (node_pb2.Message): The message.
+
+        Returns:
+            node_pb2.ResponseMessage: The response (with error if the command fails or is unknown).
+        """
+        # Gossip
+        # logging.info(f"({self.addr}) gossiping message from {request.source} | {request.cmd} {request.args}")
+        self._neighbors.gossip(request)
+        # Process message
+        if request.cmd in self.__msg_callbacks.keys():
+            try:
+                # logging.info(f"({self.addr}) running callback for {request.cmd} {request.args}")
+                self.__msg_callbacks[request.cmd](request)
+            except Exception as e:
+                error_text = f"[{self.addr}] Error while processing command: {request.cmd} {request.args}: {e}"
+                logging.error(error_text)
+                return node_pb2.ResponseMessage(error=error_text)
+        else:
+            # disconnect node
+            logging.error(
+                f"[{self.addr}] Unknown command: {request.cmd} from {request.source}"
+            )
+            return node_pb2.ResponseMessage(error=f"Unknown command: {request.cmd}")
+        return node_pb2.ResponseMessage()
+
+    def probe(self, request, context):
+        """
+        GRPC service. It is called when a member probes this node (SWIM-style membership).
+        If the membership protocol is not enabled, the node only acks (it is alive).
+        """
+        membership = self._neighbors.get_membership()
+        if membership is None:
+            return node_pb2.ProbeResponse(ack=True)
+        return membership.handle_probe(request)
+
     def add_model(self, request, _):
         raise NotImplementedError
 
+    def offer_model(self, request, _):
+        """
+        GRPC service. It is called when a node offers a model before sending it (only its digest).
+        The node answers have_model if it already holds the model, so the transfer is skipped.
+        """
+        return node_pb2.ResponseMessage(have_model=False)
+
+    def _admit_model(self, request):
+        """
+        Check if a model is needed from the metadata of the transfer (before receiving or decoding the payload).
+
+        Args:
+            request (node_pb2.Weights | node_pb2.WeightsHeader): Model transfer (round, contributors...).
+
+        Returns:
+            bool: False if the model would be discarded.
+        """
+        return True
+
+    def _get_model_payload(self, request):
+        """
+        Get the payload of an add_model request. If it was sent through a shared memory segment, the segment is mapped
+        read-only (zero-copy) and its digest verified.
+
+        Args:
+            request (node_pb2.Weights): The request.
+
+        Returns:
+            bytes: The payload (a read-only mapping for shared memory segments), None if the segment cannot be mapped.
+        """
+        if not request.shm:
+            return request.weights
+        payload = shm.open_segment(self.config.participant["SHM_DIR"], request.shm)
+        if payload is None:
+            logging.info(f"({self.addr}) add_model (gRPC) | Cannot map shared memory segment {request.shm} from {request.source}")
+            return None
+        if payload_digest(payload) != request.digest:
+            logging.info(f"({self.addr}) add_model (gRPC) | Digest mismatch in shared memory segment {request.shm} from {request.source}")
+            return None
+        return payload
+
+    def add_model_stream(self, request_iterator, context):
+        """
+        GRPC service. It is called when a node streams a model in chunks (client-streaming).
+        Once the model is reassembled and its digest verified, it is processed by add_model. Models that are not
+        needed (see _admit_model) are rejected after the header, without receiving the chunks.
+        """
+        assembler = ModelStreamAssembler(self.config.participant["MAX_MODEL_SIZE"])
+        for request in request_iterator:
+            if not assembler.add(request):
+                return node_pb2.ResponseMessage(error=assembler.error)
+            if request.WhichOneof("content") == "header" and not self._admit_model(assembler.header):
+                return node_pb2.ResponseMessage(not_needed=True)
+        weights = assembler.get_weights()
+        if weights is None:
+            return node_pb2.ResponseMessage(error=assembler.error)
+        return self.add_model(weights, context)
+
     ####
     # Message Handlers
     ####
@@ -18,6 +18,7 @@
 from functools import partial
 import logging
 import threading
+import time
 
 
 class Aggregator:
@@ -38,6 +39,11 @@ class Aggregator:
         self.__models = {}
         self.__round = 0
 
+        # Aggregation executor (parameter chunks of the flat models are reduced by a pool of workers)
+        self.workers = max(int(self.config.participant["AGGREGATION_WORKERS"]), 1)
+        self.chunk_size = self.config.participant["AGGREGATION_CHUNK_SIZE"]
+        self.__aggregation_time = None  # wall time (s) of the last aggregation
+
         # Locks
         self.__agg_lock = threading.Lock()
         self.__finish_aggregation_lock = threading.Lock()
@@ -63,6 +69,7 @@ class Aggregator:
             self.__train_set = l
             logging.info(f"({self.node_name}) set_nodes_to_aggregate | Clearing __models.")
             self.__models = {}
+            self._reset_fold()
             logging.info(
                 f"({self.node_name}) set_nodes_to_aggregate | Acquiring __finish_aggregation_lock (timeout={self.config.participant['AGGREGATION_TIMEOUT']})."
             )
@@ -89,6 +96,7 @@ class Aggregator:
         self.__agg_lock.acquire()
         self.__train_set = []
         self.__models = {}
+        self._reset_fold()
         try:
             logging.info(f"({self.node_name}) clear | Releasing __finish_aggregation_lock.")
             self.__finish_aggregation_lock.release()
@@ -125,6 +133,33 @@ class Aggregator:
     def get_aggregated_models_weights(self):
         return self.__models
 
+    def accepts_model(self, contributors, round=None, local=False):
+        """
+        Check, from its metadata only, if a model would be added (same conditions as add_model). It is used to reject
+        models before decoding (or receiving) them.
+
+        Args:
+            contributors: Nodes that collaborated to get the model.
+            round: Round of the model.
+            local: If True, the model is the local model of the node.
+
+        Returns:
+            bool: True if add_model would add the model.
+        """
+        nodes = list(contributors)
+        if nodes == [] or round != self.__round:
+            return False
+        if self.__waiting_aggregated_model and not local:
+            return set(nodes) == set(self.__train_set)
+        aggregated_models = self.get_aggregated_models()
+        if len(self.__train_set) <= len(aggregated_models):
+            # Model not needed
+            return False
+        if not all([n in self.__train_set for n in nodes]):
+            return False
+        # Full aggregation, or at least one contributor not aggregated yet
+        return len(nodes) == len(self.__train_set) or any([n not in aggregated_models for n in nodes])
+
     def add_model(self, model, contributors, weight, source=None, round=None, local=False):
         """
         Add a model. The first model to be added starts the `run` method (timeout).
@@ -146,8 +181,6 @@ class Aggregator:
             logging.info(
                 f"({self.node_name}) Received a model without a list of contributors."
             )
-            logging.info(f"({self.node_name}) add_model (aggregator) | Releasing __agg_lock.")
-            self.__agg_lock.release()
             return None
 
         # Check again if the round is the same as the current one, if not, ignore the model (it is from a previous round)
@@ -169,8 +202,8 @@ class Aggregator:
                     f"({self.node_name}) add_model (aggregator) | __waiting_aggregated_model (True) | Ignoring add_model functionality...")
                 logging.info(
                     f"({self.node_name}) add_model (aggregator) | __waiting_aggregated_model (True) | Received an aggregated model because all contributors are in the train set (me too). Overwriting __models with the aggregated model.")
-                self.__models = {}
                 self.__models = {" ".join(nodes): (model, 1)}
+                self._reset_fold()
                 self.__waiting_aggregated_model = False
                 logging.info(f"({self.node_name}) add_model (aggregator) | Releasing __finish_aggregation_lock.")
                 self.__finish_aggregation_lock.release()
@@ -195,7 +228,9 @@ class Aggregator:
                     if len(nodes) == len(self.__train_set):
                         logging.info(
                             f'({self.node_name}) add_model (aggregator) | The number of contributors is equal to the number of nodes in the train set. --> Full aggregation.')
-                        self.__models = {" ".join(nodes): (model, weight)}
+                        self.__models = {}
+                        self._reset_fold()
+                        self.__store_model(" ".join(nodes), model, weight)
                         logging.info(
                             f"({self.node_name}) add_model (aggregator) | Model added ({str(len(self.get_aggregated_models()))}/{str(len(self.__train_set))}) from {str(nodes)}"
                         )
@@ -212,7 +247,7 @@ class Aggregator:
                         logging.info(
                             f'({self.node_name}) add_model (aggregator) | All contributors are not in the aggregated models. --> Partial aggregation.')
                         # Aggregate model
-                        self.__models[" ".join(nodes)] = (model, weight)
+                        self.__store_model(" ".join(nodes), model, weight)
                         logging.info(
                             f"({self.node_name}) add_model (aggregator) | Model added ({str(len(self.get_aggregated_models()))}/{str(len(self.__train_set))}) from {str(nodes)}"
                         )
@@ -245,7 +280,7 @@ class Aggregator:
 
                         # For each node that is not in the aggregated models, aggregate the model with the aggregated model
                         for n in nodes_not_in_aggregated_models:
-                            self.__models[n] = (model, weight)
+                            self.__store_model(n, model, weight)
 
                         logging.info(
                             f'({self.node_name}) BETA add_model (aggregator) | __models={self.__models.keys()}')
@@ -336,6 +371,31 @@ class Aggregator:
             self.__agg_lock.release()
             return None
 
+    def __store_model(self, key, model, weight):
+        self.__models[key] = (self._fold_model(key, model, weight), weight)
+
+    def _fold_model(self, key, model, weight):
+        """
+        Called with every model added to the aggregation (under the lock of add_model), before it is stored.
+        Streaming aggregators fold the model into a running aggregate here and drop it.
+
+        Args:
+            key (str): Key of the model in __models (its contributors).
+            model: Model added.
+            weight: Weight of the model.
+
+        Returns:
+            The model to store (None if it is no longer needed). The contributors and the weight are always stored.
+        """
+        return model
+
+    def _reset_fold(self):
+        """
+        Called when the stored models are discarded (new train set, full aggregation received or clear), so
+        streaming aggregators reset their running aggregate.
+        """
+        pass
+
     def wait_and_get_aggregation(self):
         """
         Wait for aggregation to finish.
@@ -394,7 +454,22 @@ class Aggregator:
 
         # Notify node
         logging.info(f"({self.node_name}) wait_and_get_aggregation | Aggregating models: {self.__models.keys()}")
-        return self.aggregate(self.__models)
+        start = time.monotonic()
+        aggregated_model = self.aggregate(self.__models)
+        self.__aggregation_time = time.monotonic() - start
+        logging.info(
+            f"({self.node_name}) wait_and_get_aggregation | Aggregation time: {self.__aggregation_time:.3f}s (workers={self.workers})"
+        )
+        return aggregated_model
+
+    def get_aggregation_time(self):
+        """
+        Get the wall time of the last aggregation (wait_and_get_aggregation).
+
+        Returns:
+            Seconds, or None if no aggregation was done.
+        """
+        return self.__aggregation_time
 
     def get_partial_aggregation(self, except_nodes):
         """
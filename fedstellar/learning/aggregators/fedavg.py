@@ -21,20 +21,48 @@ import logging
 import torch
 
 from fedstellar.learning.aggregators.aggregator import Aggregator
+from fedstellar.learning.aggregators.flatmodel import FlatLayout, reduce_columns
 
 
 class FedAvg(Aggregator):
     """
     Federated Averaging (FedAvg) [McMahan et al., 2016]
     Paper: https://arxiv.org/abs/1602.05629
+
+    With aggregator_args.streaming, models are folded into a running weighted sum as they are added, and dropped
+    (only their contributors and weights are kept, and the local model of the node, which is gossiped). The
+    aggregation is a single division, and the memory does not grow with the size of the train set.
     """
 
     def __init__(self, node_name="unknown", config=None):
         super().__init__(node_name, config)
         self.config = config
         self.role = self.config.participant["device_args"]["role"]
+        self.streaming = self.config.participant.get("aggregator_args", {}).get("streaming", False)
+        self.__accum = None  # running weighted sum (streaming, flat vector)
+        self.__layout = None
+        self.__total_weight = 0
+        self.__folded = set()  # keys of the models in the running sum
         logging.info("[FedAvg] My config is {}".format(self.config))
 
+    def _fold_model(self, key, model, weight):
+        if not self.streaming:
+            return model
+        if self.__accum is None:
+            self.__layout = FlatLayout.get(model)
+            self.__accum = torch.zeros(self.__layout.size, dtype=self.__layout.dtype)
+        self.__layout.accumulate(self.__accum, model, alpha=weight)
+        self.__total_weight += weight
+        self.__folded.add(key)
+        # The local model is kept (it is gossiped, see get_local_model)
+        return model if key == self.node_name else None
+
+    def _reset_fold(self):
+        self.__accum = None
+        self.__layout = None
+        self.__total_weight = 0
+        self.__folded = set()
+
     def aggregate(self, models):
         """
         Weighted average of the models.
@@ -46,24 +74,22 @@ class FedAvg(Aggregator):
             logging.error("[FedAvg] Trying to aggregate models when there are no models")
             return None
 
+        if self.streaming and set(models.keys()) == self.__folded:
+            # Models already summed on arrival
+            logging.info(f"[FedAvg.aggregate] Aggregating models (streaming): num={len(models)}")
+            return self.__layout.unflatten(self.__accum / self.__total_weight)
+
+        if any(model is None for model, _ in models.values()):
+            logging.error("[FedAvg] Trying to aggregate models that were folded into the running sum (streaming)")
+            return None
+
         models = list(models.values())
 
         # Total Samples
         total_samples = sum(w for _, w in models)
 
-        # Create a Zero Model
-        accum = {layer: torch.zeros_like(param) for layer, param in models[-1][0].items()}
-
-        # Add weighted models
+        # Weighted sum of the flat models (N x P matrix), chunk by chunk of parameters
         logging.info(f"[FedAvg.aggregate] Aggregating models: num={len(models)}")
-        for model, weight in models:
-            for layer in accum:
-                accum[layer] += model[layer] * weight
-
-        # Normalize Accum
-        for layer in accum:
-            accum[layer] /= total_samples
-            
-        # self.print_model_size(accum)
-
-        return accum
+        params = [model for model, _ in models]
+        weights = torch.tensor([weight for _, weight in models], dtype=FlatLayout.get(params[-1]).dtype)
+        return reduce_columns(params, lambda block: (weights @ block) / total_samples, self.chunk_size, self.workers)
@@ -0,0 +1,228 @@
+#
+# This file is part of the Fedstellar platform (see https://github.com/enriquetomasmb/fedstellar).
+# Copyright (c) 2023 Enrique Tomás Martínez Beltrán.
+#
+
+import bisect
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+###########################
+#       Flat models       #
+###########################
+#
+# A model (state_dict) packed into one contiguous 1-D tensor, so the aggregators stack N models into an N x P matrix
+# and reduce it with a single vectorized operation instead of looping over the layers. The layout (names, shapes,
+# dtypes and offsets of the layers) is computed once per model architecture and cached. All the layers are stored in a
+# common floating point dtype (the widest float dtype of the model): layers of that dtype are unpacked as views of the
+# vector, the others (e.g. integer buffers such as num_batches_tracked) are converted back.
+
+_layouts = {}  # architecture key -> FlatLayout
+_layouts_lock = threading.Lock()
+
+
+class FlatLayout:
+    """
+    Layout of a model architecture in a flat vector. Use FlatLayout.get to obtain the (cached) layout of a model.
+
+    Args:
+        names (list): Names of the layers (in order).
+        shapes (list): Shapes of the layers.
+        dtypes (list): Dtypes of the layers.
+    """
+
+    def __init__(self, names, shapes, dtypes):
+        self.names = list(names)
+        self.shapes = [torch.Size(shape) for shape in shapes]
+        self.dtypes = list(dtypes)
+        self.numels = [shape.numel() for shape in self.shapes]
+        self.offsets = []
+        offset = 0
+        for numel in self.numels:
+            self.offsets.append(offset)
+            offset += numel
+        self.size = offset
+        float_dtypes = [dtype for dtype in self.dtypes if dtype.is_floating_point]
+        self.dtype = torch.float32
+        for dtype in float_dtypes:
+            self.dtype = torch.promote_types(self.dtype, dtype)
+
+    @staticmethod
+    def get(state_dict):
+        """
+        Get the layout of a model (computed once per architecture).
+
+        Args:
+            state_dict (dict): Parameters of the model (tensors).
+
+        Returns:
+            FlatLayout: Layout of the model.
+        """
+        key = tuple((name, tuple(tensor.shape), tensor.dtype) for name, tensor in state_dict.items())
+        layout = _layouts.get(key)
+        if layout is None:
+            _layouts_lock.acquire()
+            layout = _layouts.get(key)
+            if layout is None:
+                layout = _layouts[key] = FlatLayout(*zip(*key)) if key else FlatLayout([], [], [])
+            _layouts_lock.release()
+        return layout
+
+    def flatten(self, state_dict, out=None):
+        """
+        Pack a model into a flat vector.
+
+        Args:
+            state_dict (dict): Parameters of the model (same architecture as the layout).
+            out (torch.Tensor): Vector to write into (e.g. a row of a matrix). A new one is created if None.
+
+        Returns:
+            torch.Tensor: 1-D tensor of size self.size and dtype self.dtype.
+        """
+        if out is None:
+            out = torch.empty(self.size, dtype=self.dtype)
+        for name, offset, numel in zip(self.names, self.offsets, self.numels):
+            out[offset:offset + numel].copy_(state_dict[name].reshape(-1))
+        return out
+
+    def accumulate(self, vector, state_dict, alpha=1):
+        """
+        Add a model (scaled by alpha) to a flat vector in place, without packing it.
+
+        Args:
+            vector (torch.Tensor): 1-D tensor of size self.size.
+            state_dict (dict): Parameters of the model (same architecture as the layout).
+            alpha: Scale of the model.
+        """
+        for name, offset, numel in zip(self.names, self.offsets, self.numels):
+            vector[offset:offset + numel].add_(state_dict[name].reshape(-1), alpha=alpha)
+
+    def unflatten(self, vector):
+        """
+        Unpack a flat vector into a model.
+
+        Args:
+            vector (torch.Tensor): 1-D tensor of size self.size.
+
+        Returns:
+            OrderedDict: Parameters of the model (views of the vector for the layers of dtype self.dtype).
+        """
+        state_dict = OrderedDict()
+        for name, shape, dtype, offset, numel in zip(self.names, self.shapes, self.dtypes, self.offsets, self.numels):
+            layer = vector[offset:offset + numel].view(shape)
+            state_dict[name] = layer if layer.dtype == dtype else layer.to(dtype)
+        return state_dict
+
+    def stack(self, state_dicts, start=0, end=None):
+        """
+        Pack several models into a matrix (one flat model per row), or only the columns [start, end) of it.
+
+        Args:
+            state_dicts (list): Parameters of the models (same architecture as the layout).
+            start (int): First column.
+            end (int): Last column (excluded). self.size if None.
+
+        Returns:
+            torch.Tensor: N x (end - start) matrix.
+        """
+        end = self.size if end is None else end
+        matrix = torch.empty((len(state_dicts), end - start), dtype=self.dtype)
+        if start == 0 and end == self.size:
+            for i, state_dict in enumerate(state_dicts):
+                self.flatten(state_dict, out=matrix[i])
+            return matrix
+        first = bisect.bisect_right(self.offsets, start) - 1
+        for name, offset, numel in zip(self.names[first:], self.offsets[first:], self.numels[first:]):
+            if offset >= end:
+                break
+            lo, hi = max(start, offset), min(end, offset + numel)
+            for i, state_dict in enumerate(state_dicts):
+                matrix[i, lo - start:hi - start].copy_(state_dict[name].reshape(-1)[lo - offset:hi - offset])
+        return matrix
+
+
+class FlatModel:
+    """
+    A model packed into a flat vector, with its layout.
+
+    Args:
+        vector (torch.Tensor): Flat parameters.
+        layout (FlatLayout): Layout of the model.
+    """
+
+    def __init__(self, vector, layout):
+        self.vector = vector
+        self.layout = layout
+
+    @classmethod
+    def from_state_dict(cls, state_dict):
+        layout = FlatLayout.get(state_dict)
+        return cls(layout.flatten(state_dict), layout)
+
+    def to_state_dict(self):
+        return self.layout.unflatten(self.vector)
+
+
+def stack_models(models):
+    """
+    Pack the models to aggregate into a matrix.
+
+    Args:
+        models (list): Parameters of the models (same architecture).
+
+    Returns:
+        tuple: N x P matrix and layout of the models.
+    """
+    layout = FlatLayout.get(models[-1])
+    return layout.stack(models), layout
+
+
+def map_columns(size, chunk_size, function, workers=1):
+    """
+    Apply a function to fixed-size column chunks [start, end) of the flat parameter space. With several workers, the
+    chunks are processed concurrently by a thread pool (torch kernels release the GIL). The chunks only depend on
+    chunk_size, so the results do not depend on the number of workers.
+
+    Args:
+        size (int): Number of columns (parameters).
+        chunk_size (int): Number of columns per chunk.
+        function (function): Called as function(start, end) for each chunk.
+        workers (int): Number of threads.
+
+    Returns:
+        list: Results of the function, in chunk order.
+    """
+    chunk_size = max(int(chunk_size), 1)
+    chunks = [(start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)]
+    if workers <= 1 or len(chunks) <= 1:
+        return [function(start, end) for start, end in chunks]
+    with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        return list(executor.map(lambda chunk: function(*chunk), chunks))
+
+
+def reduce_columns(models, reduce, chunk_size, workers=1):
+    """
+    Reduce the models parameter by parameter, over fixed-size column chunks of the N x P matrix of the flat models.
+    Only one N x chunk_size block per worker is packed at a time, so the memory does not grow with the size of the
+    models.
+
+    Args:
+        models (list): Parameters of the models (same architecture).
+        reduce (function): Reduces an N x C block to a vector of size C.
+        chunk_size (int): Number of columns (parameters) per chunk.
+        workers (int): Number of threads (see map_columns).
+
+    Returns:
+        OrderedDict: Parameters of the reduced model.
+    """
+    layout = FlatLayout.get(models[-1])
+    result = torch.empty(layout.size, dtype=layout.dtype)
+
+    def reduce_chunk(start, end):
+        result[start:end] = reduce(layout.stack(models, start, end))
+
+    map_columns(layout.size, chunk_size, reduce_chunk, workers)
+    return layout.unflatten(result)
@@ -1,22 +1,82 @@
 import logging
 
 import torch
-import numpy
 from fedstellar.learning.aggregators.aggregator import Aggregator
+from fedstellar.learning.aggregators.flatmodel import FlatLayout, map_columns, reduce_columns
 
 
 class Krum(Aggregator):
     """
     Krum [Peva Blanchard et al., 2017]
     Paper: https://papers.nips.cc/paper/2017/hash/f4b9ec30ad9f68f89b29639786cb62ef-Abstract.html
+
+    aggregator_args.f is the number of Byzantine models tolerated (the score of a model is the sum of the squared
+    distances to its n - f - 2 nearest models), and aggregator_args.m the number of models selected: m = 1 is Krum,
+    m > 1 is Multi-Krum (weighted average of the m models with the lowest scores).
     """
 
     def __init__(self, node_name="unknown", config=None):
         super().__init__(node_name, config)
         self.config = config
         self.role = self.config.participant["device_args"]["role"]
+        aggregator_args = self.config.participant.get("aggregator_args", {})
+        self.f = aggregator_args.get("f", 0)
+        self.m = aggregator_args.get("m", 1)
         logging.info("[Krum] My config is {}".format(self.config))
 
+    def get_gram(self, models):
+        """
+        Gram matrix of the flat models (inner products), accumulated over column chunks (see map_columns).
+
+        Args:
+            models: Parameters of the models (same architecture).
+
+        Returns:
+            N x N matrix.
+        """
+        layout = FlatLayout.get(models[-1])
+
+        def chunk_gram(start, end):
+            block = layout.stack(models, start, end)
+            return block @ block.T
+
+        # Partial Gram matrices are summed in chunk order (deterministic for any number of workers)
+        gram = torch.zeros((len(models), len(models)), dtype=layout.dtype)
+        for partial_gram in map_columns(layout.size, self.chunk_size, chunk_gram, self.workers):
+            gram += partial_gram
+        return gram
+
+    @staticmethod
+    def get_distances(gram):
+        """
+        Pairwise squared euclidean distances between the flat models, from the Gram matrix.
+
+        Args:
+            gram: N x N Gram matrix of the flat models.
+
+        Returns:
+            N x N matrix of squared distances.
+        """
+        norms = torch.diagonal(gram)
+        distances = (norms.unsqueeze(0) + norms.unsqueeze(1) - 2 * gram).clamp_(min=0)
+        distances.fill_diagonal_(0)
+        return distances
+
+    def get_scores(self, distances):
+        """
+        Krum score of each model: sum of the squared distances to its n - f - 2 nearest models.
+
+        Args:
+            distances: N x N matrix of squared distances.
+        """
+        n = len(distances)
+        neighbors = min(max(n - self.f - 2, 1), n - 1)
+        if neighbors <= 0:
+            return torch.zeros(n, dtype=distances.dtype)
+        # The distance of a model to itself (0) is always the smallest one, skip it
+        nearest, _ = torch.sort(distances, dim=1)
+        return nearest[:, 1:neighbors + 1].sum(dim=1)
+
     def aggregate(self, models):
         """
         Krum selects one of the m local models that is similar to other models
@@ -32,51 +92,19 @@ class Krum(Aggregator):
             )
             return None
 
+        nodes = list(models.keys())
         models = list(models.values())
 
-        # Total Samples
-        total_samples = sum([y for _, y in models])
+        logging.info("[Krum.aggregate] Aggregating models: num={}".format(len(models)))
 
-        # Create a Zero Model
-        accum = (models[-1][0]).copy()
-        for layer in accum:
-            accum[layer] = torch.zeros_like(accum[layer])
+        params = [m for m, _ in models]
+        scores = self.get_scores(self.get_distances(self.get_gram(params)))
 
-        # Add weighteds models
-        logging.info("[Krum.aggregate] Aggregating models: num={}".format(len(models)))
+        # Models with the lowest scores (ties broken by order)
+        selected = torch.argsort(scores, stable=True)[:max(self.m, 1)].tolist()
+        logging.info("[Krum.aggregate] Selected models: {}".format([nodes[i] for i in selected]))
 
-        # Create model distance list
-        total_models = len(models)
-        distance_list = [0 for i in range(0, total_models)]
-
-        # Calculate the L2 Norm between xi and xj
-        min_index = 0
-        min_distance_sum = float('inf')
-
-        for i in range(0, total_models):
-            m1, _ = models[i]
-            for j in range(0, total_models):
-                m2, _ = models[j]
-                distance = 0
-                if i == j:
-                    distance = 0
-                else:
-                    for layer in m1:
-                        l1 = m1[layer]
-                        # l1 = l1.view(len(l1), 1)
-
-                        l2 = m2[layer]
-                        # l2 = l2.view(len(l2), 1)
-                        distance += numpy.linalg.norm(l1 - l2)
-                distance_list[i] += distance
-
-            if min_distance_sum > distance_list[i]:
-                min_distance_sum = distance_list[i]
-                min_index = i
-
-        # Assign the model with min distance with others as the aggregated model
-        m, _ = models[min_index]
-        for layer in m:
-            accum[layer] = accum[layer] + m[layer]
-
-        return accum
\ No newline at end of file
+        # Krum: the selected model. Multi-Krum: weighted average of the selected models
+        weights = torch.tensor([models[i][1] for i in selected], dtype=FlatLayout.get(params[-1]).dtype)
+        weights = weights / weights.sum() if len(selected) > 1 else torch.ones(1, dtype=weights.dtype)
+        return reduce_columns([params[i] for i in selected], lambda block: weights @ block, self.chunk_size, self.workers)
@@ -1,8 +1,8 @@
 import logging
 
 import torch
-import numpy as np
 from fedstellar.learning.aggregators.aggregator import Aggregator
+from fedstellar.learning.aggregators.flatmodel import reduce_columns
 
 
 class Median(Aggregator):
@@ -24,7 +24,7 @@ class Median(Aggregator):
         median is the mean of the middle two parameters.
 
         Args:
-            weights: weights list, 2D tensor
+            weights: weights list, 2D tensor (models x parameters)
         """
 
         # check if the weight tensor has enough space
@@ -35,23 +35,13 @@ class Median(Aggregator):
             )
             return None
 
-            # get the median
-        median = 0
         if weight_len % 2 == 1:
             # odd number, return the median
-            median, _ = torch.median(weights, 0)
+            median, _ = torch.kthvalue(weights, (weight_len + 1) // 2, dim=0)
         else:
             # even number, return the mean of median two numbers
-            # sort the tensor
-            arr_weights = np.asarray(weights)
-            nobs = arr_weights.shape[0]
-            start = int(nobs / 2) - 1
-            end = int(nobs / 2) + 1
-            atmp = np.partition(arr_weights, (start, end - 1), 0)
-            sl = [slice(None)] * atmp.ndim
-            sl[0] = slice(start, end)
-            arr_median = np.mean(atmp[tuple(sl)], axis=0)
-            median = torch.tensor(arr_median)
+            middle, _ = torch.topk(weights, weight_len // 2 + 1, dim=0, largest=False)
+            median = middle[-2:].mean(dim=0)
         return median
 
     def aggregate(self, models):
@@ -74,41 +64,8 @@ class Median(Aggregator):
         models = list(models.values())
         models_params = [m for m, _ in models]
 
-        # Total Samples
-        total_samples = sum([y for _, y in models])
-        total_models = len(models)
-
-        # Create a Zero Model
-        accum = (models[-1][0]).copy()
-        for layer in accum:
-            accum[layer] = torch.zeros_like(accum[layer])
-
         # Add weighteds models
         logging.info("[Median.aggregate] Aggregating models: num={}".format(len(models)))
 
-        # Calculate the trimmedmean for each parameter
-        for layer in accum:
-            weight_layer = accum[layer]
-            # get the shape of layer tensor
-            l_shape = list(weight_layer.shape)
-
-            # get the number of elements of layer tensor
-            number_layer_weights = torch.numel(weight_layer)
-            # if its 0-d tensor
-            if l_shape == []:
-                weights = torch.tensor([models_params[j][layer] for j in range(0, total_models)])
-                weights = weights.double()
-                w = self.get_median(weights)
-                accum[layer] = w
-
-            else:
-                # flatten the tensor
-                weight_layer_flatten = weight_layer.view(number_layer_weights)
-
-                # flatten the tensor of each model
-                models_layer_weight_flatten = torch.stack([models_params[j][layer].view(number_layer_weights) for j in range(0, total_models)], 0)
-
-                # get the weight list [w1j,w2j,··· ,wmj], where wij is the jth parameter of the ith local model
-                median = self.get_median(models_layer_weight_flatten)
-                accum[layer] = median.view(l_shape)
-        return accum
\ No newline at end of file
+        # Reduce the flat models (N x P matrix) over the models, chunk by chunk of parameters
+        return reduce_columns(models_params, self.get_median, self.chunk_size, self.workers)
@@ -1,8 +1,8 @@
 import logging
 
 import torch
-import numpy as np
 from fedstellar.learning.aggregators.aggregator import Aggregator
+from fedstellar.learning.aggregators.flatmodel import reduce_columns
 
 
 class TrimmedMean(Aggregator):
@@ -11,10 +11,10 @@ class TrimmedMean(Aggregator):
     Paper: https://arxiv.org/pdf/1803.01498.pdf
     """
 
-    def __init__(self, node_name="unknown", config=None, beta=0):
+    def __init__(self, node_name="unknown", config=None, beta=None):
         super().__init__(node_name, config)
-        self.beta = beta
         self.config = config
+        self.beta = beta if beta is not None else self.config.participant.get("aggregator_args", {}).get("beta", 0)
         self.role = self.config.participant["device_args"]["role"]
         logging.info("[TrimmedMean] My config is {}".format(self.config))
 
@@ -25,7 +25,7 @@ class TrimmedMean(Aggregator):
         m-2β parameters
 
         Args:
-            weights: weights list, 2D tensor
+            weights: weights list, 2D tensor (models x parameters)
         """
 
         # check if the weight tensor has enough space
@@ -45,18 +45,8 @@ class TrimmedMean(Aggregator):
 
         else:
             # remove the largest and smallest β items
-            arr_weights = np.asarray(weights)
-            nobs = arr_weights.shape[0]
-            start = self.beta
-            end = nobs - self.beta
-            atmp = np.partition(arr_weights, (start, end - 1), 0)
-            sl = [slice(None)] * atmp.ndim
-            sl[0] = slice(start, end)
-            print(atmp[tuple(sl)])
-            arr_median = np.mean(atmp[tuple(sl)], axis=0)
-            res = torch.tensor(arr_median)
-
-        # get the mean of the remaining weights
+            sorted_weights, _ = torch.sort(weights, dim=0)
+            res = torch.mean(sorted_weights[self.beta:weight_len - self.beta], 0)
 
         return res
 
@@ -81,42 +71,8 @@ class TrimmedMean(Aggregator):
         models = list(models.values())
         models_params = [m for m, _ in models]
 
-        # Total Samples
-        total_samples = sum([y for _, y in models])
-        total_models = len(models)
-
-        # Create a Zero Model
-        accum = (models[-1][0]).copy()
-        for layer in accum:
-            accum[layer] = torch.zeros_like(accum[layer])
-
-        # Add weighted models
+        # Add weighteds models
         logging.info("[TrimmedMean.aggregate] Aggregating models: num={}".format(len(models)))
 
-        # Calculate the trimmedmean for each parameter
-        for layer in accum:
-            weight_layer = accum[layer]
-            # get the shape of layer tensor
-            l_shape = list(weight_layer.shape)
-
-            # get the number of elements of layer tensor
-            number_layer_weights = torch.numel(weight_layer)
-            # if its 0-d tensor
-            if l_shape == []:
-                weights = torch.tensor([models_params[j][layer] for j in range(0, total_models)])
-                weights = weights.double()
-                w = self.get_trimmedmean(weights)
-                accum[layer] = w
-
-            else:
-                # flatten the tensor
-                weight_layer_flatten = weight_layer.view(number_layer_weights)
-
-                # flatten the tensor of each model
-                models_layer_weight_flatten = torch.stack([models_params[j][layer].view(number_layer_weights) for j in range(0, total_models)], 0)
-
-                # get the weight list [w1j,w2j,··· ,wmj], where wij is the jth parameter of the ith local model
-                trimmedmean = self.get_trimmedmean(models_layer_weight_flatten)
-                accum[layer] = trimmedmean.view(l_shape)
-
-        return accum
\ No newline at end of file
+        # Reduce the flat models (N x P matrix) over the models, chunk by chunk of parameters
+        return reduce_columns(models_params, self.get_trimmedmean, self.chunk_size, self.workers)
@@ -56,6 +56,55 @@ class NodeLearner:
         """
         pass
 
+    def get_codecs(self):
+        """
+        Get the codecs supported to encode the parameters, in order of preference.
+        Each pair of neighbors uses the first codec of the initiator of the connection supported by both.
+
+        Returns:
+            list: Codec names.
+        """
+        pass
+
+    def get_parameters_size(self, params=None):
+        """
+        Get the size of the parameters in memory (used to report the compression ratio of the codecs).
+
+        Args:
+            params: The parameters of the model. (non-binary)
+
+        Returns:
+            int: Size in bytes.
+        """
+        pass
+
+    def compute_delta(self, params, base, topk=1.0):
+        """
+        Compute the difference between the parameters and a base model (delta encoding).
+
+        Args:
+            params: The parameters of the model. (non-binary)
+            base: The parameters of the base model. (non-binary)
+            topk (float): Fraction of the values of each layer kept (the largest in magnitude), the rest are zeroed.
+
+        Returns:
+            The delta (non-binary), or None if delta encoding is not supported.
+        """
+        pass
+
+    def apply_delta(self, base, delta):
+        """
+        Reconstruct the parameters from a base model and a delta (see compute_delta).
+
+        Args:
+            base: The parameters of the base model. (non-binary)
+            delta: The delta. (non-binary)
+
+        Returns:
+            The parameters of the model. (non-binary)
+        """
+        pass
+
     def decode_parameters(self, data):
         """
         Decode the parameters of the model. (binary)
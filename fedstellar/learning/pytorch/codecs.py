@@ -0,0 +1,202 @@
+#
+# This file is part of the Fedstellar platform (see https://github.com/enriquetomasmb/fedstellar).
+# Copyright (c) 2023 Enrique Tomás Martínez Beltrán.
+#
+
+import io
+from collections import OrderedDict
+
+import torch
+
+from fedstellar.utils import flat
+
+try:
+    import zstandard
+except ModuleNotFoundError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ModuleNotFoundError:
+    lz4 = None
+
+###########################
+#      Model codecs       #
+###########################
+#
+# A codec is "<quantizer>[+<compressor>]", e.g. "fp16", "int8_channel+zstd" or "none+lz4".
+#   - Quantizers (lossy, floating point tensors only): none, fp16, bf16, int8 (per-tensor) and int8_channel
+#     (per-channel over the first dimension). int8 quantization is affine (scale and zero-point).
+#   - Compressors (lossless, optional dependencies): zstd (zstandard) and lz4.
+# Payloads are self-describing: MAGIC + length of the codec name + codec name + body. The body uses the flat format
+# (fedstellar.utils.flat), and the "none" codec produces the plain flat payload (without codec header). Legacy
+# torch.save payloads are still decoded, with weights_only (tensors only, no arbitrary objects are unpickled).
+
+MAGIC = b"FSTC"
+
+QUANTIZERS = ["none", "fp16", "bf16", "int8", "int8_channel"]
+
+COMPRESSORS = {}
+if zstandard is not None:
+    COMPRESSORS["zstd"] = (
+        lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+if lz4 is not None:
+    COMPRESSORS["lz4"] = (lz4.frame.compress, lz4.frame.decompress)
+
+
+def parse_codec(codec):
+    """
+    Args:
+        codec (str): Codec name ("<quantizer>[+<compressor>]").
+
+    Returns:
+        tuple: (quantizer, compressor or None).
+    """
+    quantizer, _, compressor = codec.partition("+")
+    return quantizer, compressor or None
+
+
+def is_supported(codec):
+    """
+    Returns:
+        bool: True if the quantizer is known and the compressor (if any) is installed.
+    """
+    quantizer, compressor = parse_codec(codec)
+    return quantizer in QUANTIZERS and (compressor is None or compressor in COMPRESSORS)
+
+
+def available_codecs(preferences):
+    """
+    Filter a list of codecs (in order of preference) keeping the supported ones. "none" is always supported.
+
+    Args:
+        preferences (list): Codec names.
+
+    Returns:
+        list: Supported codec names (in order of preference).
+    """
+    codecs = [codec for codec in preferences if is_supported(codec)]
+    if "none" not in codecs:
+        codecs.append("none")
+    return codecs
+
+
+def _quantize(name, tensor, quantizer, arrays, meta):
+    if quantizer == "none" or not torch.is_floating_point(tensor) or tensor.numel() == 0:
+        arrays[name] = tensor
+        return
+    meta[name] = {"q": quantizer, "dtype": str(tensor.dtype).replace("torch.", "")}
+    if quantizer == "fp16":
+        arrays[name] = tensor.to(torch.float16)
+        return
+    if quantizer == "bf16":
+        arrays[name] = tensor.to(torch.bfloat16)
+        return
+
+    # int8: affine quantization, per-tensor or per-channel (first dimension)
+    x = tensor.detach().to(torch.float32)
+    if quantizer == "int8_channel" and x.dim() > 1:
+        flat_x = x.reshape(x.shape[0], -1)
+        view = (-1,) + (1,) * (x.dim() - 1)
+        minimum, maximum = flat_x.min(dim=1).values.view(view), flat_x.max(dim=1).values.view(view)
+    else:
+        minimum, maximum = x.min(), x.max()
+    scale = (maximum - minimum) / 255
+    scale = torch.where(scale > 0, scale, torch.ones_like(scale))
+    zero_point = torch.round(-128 - minimum / scale)
+    arrays[name] = torch.clamp(torch.round(x / scale) + zero_point, -128, 127).to(torch.int8)
+    arrays[name + "::scale"] = scale
+    arrays[name + "::zero_point"] = zero_point
+
+
+def _dequantize(name, arrays, meta):
+    entry = meta[name]
+    dtype = getattr(torch, entry["dtype"])
+    if entry["q"] in ("fp16", "bf16"):
+        return arrays[name].to(dtype)
+    return ((arrays[name].to(torch.float32) - arrays[name + "::zero_point"]) * arrays[name + "::scale"]).to(dtype)
+
+
+def encode(params, codec="none"):
+    """
+    Encode a state_dict with a codec.
+
+    Args:
+        params (dict): State dict.
+        codec (str): Codec name.
+
+    Returns:
+        bytes: Encoded parameters.
+    """
+    quantizer, compressor = parse_codec(codec)
+    if quantizer == "none":
+        body = flat.pack(params)
+    else:
+        arrays, meta = OrderedDict(), {}
+        for k, v in params.items():
+            _quantize(k, v, quantizer, arrays, meta)
+        body = flat.pack(arrays, meta={"quantized": meta})
+    if codec == "none":
+        return body
+    if compressor is not None:
+        body = COMPRESSORS[compressor][0](body)
+    name = codec.encode()
+    return MAGIC + bytes([len(name)]) + name + body
+
+
+def _decode_body(body):
+    if not flat.is_flat(body):
+        # Legacy payload (torch.save). Only tensors and plain containers are loaded (no arbitrary unpickling).
+        params = torch.load(io.BytesIO(body), map_location="cpu", weights_only=True)
+        return OrderedDict(params), {}
+    arrays, meta = flat.unpack(body)
+    return arrays, meta.get("quantized", {})
+
+
+def decode(data):
+    """
+    Decode parameters encoded with any codec (detected from the payload). Tensors of uncompressed payloads are
+    read-only views over data (no copies).
+
+    Args:
+        data (bytes): Encoded parameters (any bytes-like object, e.g. a memory-mapped segment).
+
+    Returns:
+        OrderedDict: State dict (with the original dtypes).
+
+    Raises:
+        ValueError: If the codec is not supported by this node.
+    """
+    data = memoryview(data)
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        return _decode_body(data)[0]
+    length = data[len(MAGIC)]
+    codec = bytes(data[len(MAGIC) + 1:len(MAGIC) + 1 + length]).decode()
+    if not is_supported(codec):
+        raise ValueError(f"Codec {codec} not supported")
+    _, compressor = parse_codec(codec)
+    body = data[len(MAGIC) + 1 + length:]
+    if compressor is not None:
+        body = COMPRESSORS[compressor][1](body)
+    arrays, quantized = _decode_body(body)
+    if not quantized:
+        return arrays
+    return OrderedDict(
+        (k, _dequantize(k, arrays, quantized) if k in quantized else v)
+        for k, v in arrays.items()
+        if not k.endswith(("::scale", "::zero_point"))
+    )
+
+
+def get_codec(data):
+    """
+    Returns:
+        str: Codec of an encoded payload.
+    """
+    data = memoryview(data)
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        return "none"
+    length = data[len(MAGIC)]
+    return bytes(data[len(MAGIC) + 1:len(MAGIC) + 1 + length]).decode()
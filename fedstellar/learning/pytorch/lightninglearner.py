@@ -33,6 +33,7 @@ from lightning.pytorch.callbacks.progress.rich_progress import RichProgressBarTh
 import copy
 
 from fedstellar.learning.exceptions import DecodingParamsError, ModelNotMatchingError
+from fedstellar.learning.pytorch import codecs
 from fedstellar.learning.learner import NodeLearner
 from torch.nn import functional as F
 
@@ -94,23 +95,45 @@ class LightningLearner(NodeLearner):
     # Model weights
     # Encode/decode parameters: https://pytorch.org/docs/stable/notes/serialization.html
     # There are other ways to encode/decode parameters: protobuf, msgpack, etc.
+    # Lossy (fp16/bf16/int8) and lossless (zstd/lz4) codecs are available, see codecs.py
     ####
-    def encode_parameters(self, params=None):
+    def encode_parameters(self, params=None, codec="none"):
         if params is None:
             params = self.model.state_dict()
-        buffer = io.BytesIO()
-        #with gzip.GzipFile(fileobj=buffer, mode='wb') as f:
-        #    torch.save(params, f)
-        torch.save(params, buffer)
-        return buffer.getvalue()
+        return codecs.encode(params, codec)
+
+    def get_codecs(self):
+        return codecs.available_codecs(self.config.participant["MODEL_CODECS"])
+
+    def get_parameters_size(self, params=None):
+        if params is None:
+            params = self.model.state_dict()
+        return sum(v.numel() * v.element_size() for v in params.values())
+
+    def compute_delta(self, params, base, topk=1.0):
+        delta = OrderedDict()
+        for key, value in params.items():
+            if not torch.is_floating_point(value):
+                # Non trainable values (e.g. num_batches_tracked) are sent as they are
+                delta[key] = value
+                continue
+            diff = value - base[key]
+            if topk < 1 and diff.numel() > 0:
+                keep = max(1, int(diff.numel() * topk))
+                mask = torch.zeros(diff.numel(), dtype=torch.bool)
+                mask[diff.abs().flatten().topk(keep).indices] = True
+                diff = torch.where(mask.view(diff.shape), diff, torch.zeros_like(diff))
+            delta[key] = diff
+        return delta
+
+    def apply_delta(self, base, delta):
+        return OrderedDict(
+            (key, base[key] + value if torch.is_floating_point(value) else value) for key, value in delta.items()
+        )
 
     def decode_parameters(self, data):
         try:
-            buffer = io.BytesIO(data)
-            #with gzip.GzipFile(fileobj=buffer, mode='rb') as f:
-            #    params_dict = torch.load(f, map_location='cpu')
-            params_dict = torch.load(buffer, map_location='cpu')
-            return OrderedDict(params_dict)
+            return codecs.decode(data)
         except Exception as e:
             raise DecodingParamsError("Error decoding parameters: {}".format(e))
 
@@ -14,6 +14,7 @@ import copy
 
 from fedstellar.learning.exceptions import DecodingParamsError, ModelNotMatchingError
 from fedstellar.learning.learner import NodeLearner
+from fedstellar.utils import flat
 
 
 ###########################
@@ -51,12 +52,38 @@ class ScikitLearner(NodeLearner):
     def encode_parameters(self, params=None, contributors=None, weight=None):
         if params is None:
             params = self.model.get_params()
-        return pickle.dumps(params)
+        # Flat format (arrays in the data region, plain values in the header). Pickle only for other objects, and
+        # only if ALLOW_PICKLE_PAYLOADS is enabled (unpickling a payload of a peer can run arbitrary code).
+        arrays = OrderedDict((k, v) for k, v in params.items() if isinstance(v, np.ndarray) and v.dtype != object)
+        values = {k: v for k, v in params.items() if k not in arrays}
+        try:
+            return flat.pack(arrays, meta={"values": values, "order": list(params)})
+        except TypeError:
+            if not self.__allow_pickle():
+                raise TypeError("Parameters not supported by the flat format (pickled payloads are disabled, see ALLOW_PICKLE_PAYLOADS)")
+            logging.warning("Parameters not supported by the flat format, encoding them with pickle")
+            return pickle.dumps(params)
+
+    def __allow_pickle(self):
+        return self.config is not None and self.config.participant["ALLOW_PICKLE_PAYLOADS"]
+
+    def get_codecs(self):
+        return ["none"]
+
+    def get_parameters_size(self, params=None):
+        return None
+
+    def compute_delta(self, params, base, topk=1.0):
+        return None
 
     def decode_parameters(self, data):
+        if not flat.is_flat(data) and not self.__allow_pickle():
+            raise DecodingParamsError("Error decoding parameters: pickled payloads are disabled (see ALLOW_PICKLE_PAYLOADS)")
         try:
-            params = pickle.loads(data)
-            return params
+            if not flat.is_flat(data):
+                return pickle.loads(data)
+            arrays, meta = flat.unpack(data)
+            return {k: arrays[k] if k in arrays else meta["values"][k] for k in meta["order"]}
         except:
             raise DecodingParamsError("Error decoding parameters")
 
@@ -0,0 +1,251 @@
+#
+# This file is part of the Fedstellar platform (see https://github.com/enriquetomasmb/fedstellar).
+# Copyright (c) 2023 Enrique Tomás Martínez Beltrán.
+#
+
+import logging
+import threading
+from concurrent import futures
+
+import grpc
+from google.protobuf.message import Message
+
+from fedstellar.neighbors import Neighbors
+from fedstellar.proto import node_pb2
+
+###########################
+#   In-process transport  #
+###########################
+#
+# TRANSPORT: "local" runs the nodes of a simulation in one process without gRPC: calls are dispatched to the handlers
+# of the destination node (found by address in a process-wide registry) on the thread pool of its LocalServer, so the
+# threading model (and the timeouts) of the gRPC servers is kept. Messages are not serialized, but each receiver gets
+# its own copy of the request (handlers modify them, e.g. the TTL of gossiped messages, and the sender may still have
+# them queued for other neighbors). Only the (immutable) model payload built by the sender is handed over by
+# reference, and the receiver decodes it without copies (flat format, see fedstellar.utils.flat).
+
+_servers = {}  # addr -> LocalServer
+_servers_lock = threading.Lock()
+
+
+class LocalTransportError(Exception):
+    """
+    The destination node is not running in this process.
+    """
+    pass
+
+
+class LocalServer:
+    """
+    In-process server of a node (same interface as grpc.server: start, stop and wait_for_termination).
+
+    Args:
+        node (BaseNode): Node that handles the requests.
+        max_workers (int): Number of threads that run the handlers.
+    """
+
+    def __init__(self, node, max_workers=50):
+        self.__node = node
+        self.__max_workers = max_workers
+        self.__executor = None
+        self.__terminated = threading.Event()
+
+    def start(self):
+        self.__executor = futures.ThreadPoolExecutor(max_workers=self.__max_workers, thread_name_prefix=f"local-{self.__node.addr}")
+        _servers_lock.acquire()
+        _servers[self.__node.addr] = self
+        _servers_lock.release()
+
+    def stop(self, grace=None):
+        _servers_lock.acquire()
+        if _servers.get(self.__node.addr) is self:
+            del _servers[self.__node.addr]
+        _servers_lock.release()
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False, cancel_futures=True)
+        self.__terminated.set()
+
+    def wait_for_termination(self):
+        self.__terminated.wait()
+
+    def submit(self, method, request):
+        """
+        Run a handler of the node.
+
+        Args:
+            method (str): Name of the handler (e.g. send_message).
+            request: Request (see copy_request).
+
+        Returns:
+            concurrent.futures.Future: Future of the response.
+        """
+        return self.__executor.submit(getattr(self.__node, method), request, None)
+
+
+def copy_request(request):
+    """
+    Copy of a request for the receiving node. Protobuf messages are copied, LocalWeights are copied except for the
+    model payload (shared by reference), and other requests (e.g. iterators of streamed chunks) are passed as is.
+
+    Args:
+        request: Request of a call.
+
+    Returns:
+        Request to dispatch.
+    """
+    if isinstance(request, LocalWeights):
+        return request.copy()
+    if isinstance(request, Message):
+        copy = type(request)()
+        copy.CopyFrom(request)
+        return copy
+    return request
+
+
+def get_server(addr):
+    """
+    Returns:
+        LocalServer: Server of the node running at addr.
+
+    Raises:
+        LocalTransportError: If there is no node running at addr.
+    """
+    server = _servers.get(addr)
+    if server is None:
+        raise LocalTransportError(f"No local node running at {addr}")
+    return server
+
+
+class LocalFuture:
+    """
+    Future of a local call, with the part of the interface of the gRPC futures used by Neighbors.
+
+    Args:
+        future (concurrent.futures.Future): Future of the handler.
+        timeout (float): Timeout of the call.
+    """
+
+    def __init__(self, future, timeout):
+        self.__future = future
+        self.__timeout = timeout
+
+    def result(self):
+        return self.__future.result(timeout=self.__timeout)
+
+    def code(self):
+        if not self.__future.done():
+            return grpc.StatusCode.DEADLINE_EXCEEDED
+        if self.__future.cancelled() or self.__future.exception() is not None:
+            return grpc.StatusCode.UNAVAILABLE
+        return grpc.StatusCode.OK
+
+    def add_done_callback(self, fn):
+        self.__future.add_done_callback(lambda _: fn(self))
+
+
+class LocalMethod:
+    """
+    Method of a LocalStub (blocking call, or future).
+    """
+
+    def __init__(self, addr, method):
+        self.__addr = addr
+        self.__method = method
+
+    def __call__(self, request, timeout=None):
+        return self.future(request, timeout=timeout).result()
+
+    def future(self, request, timeout=None):
+        return LocalFuture(get_server(self.__addr).submit(self.__method, copy_request(request)), timeout)
+
+
+class LocalStub:
+    """
+    Stub of a node of the same process (same methods as node_pb2_grpc.NodeServicesStub). There is no channel: the
+    stub is used as its own channel, and closing it does nothing.
+
+    Args:
+        addr (str): Address of the node.
+    """
+
+    METHODS = ["handshake", "disconnect", "send_message", "send_messages", "add_model", "add_model_stream", "offer_model", "probe"]
+
+    def __init__(self, addr):
+        for method in self.METHODS:
+            setattr(self, method, LocalMethod(addr, method))
+
+    def close(self):
+        pass
+
+
+class LocalWeights:
+    """
+    Model transfer of the local transport: the fields of node_pb2.Weights, with the payload passed by reference
+    (building a protobuf message would copy it).
+    """
+
+    __slots__ = ["source", "round", "weights", "contributors", "weight", "base", "base_round", "shm", "digest"]
+
+    def __init__(self, source, round, weights, contributors, weight, base="", base_round=0):
+        self.source = source
+        self.round = round
+        self.weights = weights
+        self.contributors = list(contributors)
+        self.weight = weight
+        self.base = base
+        self.base_round = base_round
+        self.shm = ""
+        self.digest = ""
+
+    def copy(self):
+        """
+        Copy of the transfer (the payload is shared).
+        """
+        copy = LocalWeights(self.source, self.round, self.weights, self.contributors, self.weight, self.base, self.base_round)
+        copy.shm = self.shm
+        copy.digest = self.digest
+        return copy
+
+
+class LocalNeighbors(Neighbors):
+    """
+    Neighbors of a node using the in-process transport (TRANSPORT: "local"). See LocalServer.
+
+    Args:
+        self_addr (str): Address of the node itself.
+        config (Config): Configuration of the node.
+    """
+
+    def __init__(self, self_addr, config):
+        super().__init__(self_addr, config)
+        self.__self_addr = self_addr
+        self.__config = config
+
+    def _connect(self, addr, handshake_msg):
+        stub = LocalStub(addr)
+        if handshake_msg:
+            res = stub.handshake(
+                node_pb2.HandShakeRequest(addr=self.__self_addr, codecs=self.get_codecs()),
+                timeout=self.__config.participant["GRPC_TIMEOUT"],
+            )
+            if res.error:
+                logging.info(
+                    f"({self.__self_addr}) Cannot add a neighbor: {res.error}"
+                )
+                return None
+            self.set_codec(addr, res.codec if res.HasField("codec") else "none")
+        return stub, stub
+
+    def _disconnect(self, channel, stub, disconnect_msg):
+        # Never wait here: remove() holds the neighbors lock, and the other node may be removing this one
+        if disconnect_msg:
+            try:
+                stub.disconnect.future(node_pb2.HandShakeRequest(addr=self.__self_addr))
+            except Exception:
+                pass
+
+    def _send_model_request(self, nei, stub, round, serialized_model, contributors, weight, base, base_round):
+        return self._call(
+            stub.add_model,
+            LocalWeights(self.__self_addr, round, serialized_model, contributors, weight, base, base_round),
+        )
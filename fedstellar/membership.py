@@ -0,0 +1,321 @@
+#
+# This file is part of the Fedstellar platform (see https://github.com/enriquetomasmb/fedstellar).
+# Copyright (c) 2023 Enrique Tomás Martínez Beltrán.
+#
+
+import logging
+import math
+import random
+import threading
+import time
+from concurrent import futures
+
+from fedstellar.proto import node_pb2
+
+
+class Membership:
+    """
+    SWIM-style membership of the federation (MEMBERSHIP_PROTOCOL: "swim"). It replaces the BEAT messages flooded to the
+    whole network with:
+        - Randomized probes: every period (HEARTBEAT_PERIOD) one member is probed directly (round-robin over a
+          shuffled member list). If it does not answer, SWIM_INDIRECT_PROBES other members are asked (in parallel) to
+          probe it.
+        - Suspicion: members that do not answer any probe are suspected and, after SWIM_SUSPECT_TIMEOUT seconds without
+          refuting it (increasing its incarnation), declared dead and removed from the neighbors. Dead members are
+          forgotten after SWIM_DEAD_TIMEOUT seconds (long enough to disseminate their death).
+        - Dissemination: membership updates are piggybacked on the probes and their acks (at most SWIM_MAX_PIGGYBACK
+          per message, each one retransmitted O(log N) times).
+    Thus, the membership overhead of a node is constant per period, independently of the size of the federation.
+    Alive members that are not direct neighbors are kept as non-direct neighbors.
+
+    Args:
+        self_addr (str): Address of the node itself.
+        config (Config): Configuration of the node.
+        neighbors (Neighbors): Neighbors of the node (used to send the probes and to add/remove members).
+    """
+
+    RETRANSMISSION_MULTIPLIER = 3
+
+    def __init__(self, self_addr, config, neighbors):
+        self.__self_addr = self_addr
+        self.__config = config
+        self.__neighbors = neighbors
+        self.__incarnation = 0
+        self.__members = {}  # addr -> [incarnation, state, time of the last state change]
+        self.__updates = {}  # addr -> [node_pb2.MemberUpdate, transmissions]
+        self.__probe_order = []
+        self.__sync_pending = set()  # members that must receive the full membership (new connections)
+        self.__lock = threading.Lock()
+        # Indirect probes (each helper is asked from a thread of the pool)
+        self.__executor = futures.ThreadPoolExecutor(
+            max_workers=max(self.__config.participant["SWIM_INDIRECT_PROBES"], 1),
+            thread_name_prefix=f"swim-indirect-probe-{self_addr}",
+        )
+
+    def stop(self):
+        """
+        Stop the indirect probes (the pending ones are cancelled).
+        """
+        self.__executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_members(self, states=(node_pb2.ALIVE, node_pb2.SUSPECT)):
+        """
+        Args:
+            states (tuple): States of the members to return.
+
+        Returns:
+            list: Addresses of the members in the given states.
+        """
+        self.__lock.acquire()
+        members = [addr for addr, (_, state, _) in self.__members.items() if state in states]
+        self.__lock.release()
+        return members
+
+    def on_connect(self, addr):
+        """
+        Mark a new direct neighbor as alive. The next probe sent to it carries the full membership.
+
+        Args:
+            addr (str): Address of the neighbor.
+        """
+        self.__lock.acquire()
+        member = self.__members.get(addr)
+        if member is None or member[1] != node_pb2.ALIVE:
+            incarnation = member[0] if member is not None else 0
+            self.__members[addr] = [incarnation, node_pb2.ALIVE, time.time()]
+            self.__enqueue(addr)
+        self.__sync_pending.add(addr)
+        self.__lock.release()
+
+    ####
+    # Failure detection
+    ####
+
+    def probe_round(self):
+        """
+        Run a protocol period: expire suspicions (and dead members) and probe the next member (directly and, if
+        needed, indirectly).
+        """
+        self.__expire_suspects()
+        self.__expire_dead()
+        target = self.__next_target()
+        if target is None:
+            return
+        self.__lock.acquire()
+        sync = target in self.__sync_pending
+        self.__lock.release()
+        if self.__probe(target, sync=sync):
+            if target not in self.__neighbors.get_all():
+                self.__neighbors.add(target, non_direct=True)
+            return
+
+        # Indirect probes
+        helpers = [m for m in self.get_members(states=(node_pb2.ALIVE,)) if m != target]
+        helpers = random.sample(helpers, min(self.__config.participant["SWIM_INDIRECT_PROBES"], len(helpers)))
+        if self.__probe_indirectly(target, helpers):
+            return
+        logging.info(f"({self.__self_addr}) Membership | No ack from {target} (direct and {len(helpers)} indirect probes)")
+        self.__suspect(target)
+
+    def __probe_indirectly(self, target, helpers):
+        """
+        Ask the helpers to probe the target, concurrently (on the pool of the membership). The whole indirect phase is
+        bounded by a single timeout (the one of an indirect probe), and it finishes as soon as one of the helpers acks.
+
+        Args:
+            target (str): Address of the member to probe.
+            helpers (list): Addresses of the members asked to probe it.
+
+        Returns:
+            bool: True if one of the helpers acked.
+        """
+        if not helpers:
+            return False
+        try:
+            pending = [self.__executor.submit(self.__probe, helper, target=target) for helper in helpers]
+        except RuntimeError:
+            # Membership stopped
+            return False
+        try:
+            for future in futures.as_completed(pending, timeout=2 * self.__config.participant["SWIM_PROBE_TIMEOUT"]):
+                if not future.cancelled() and future.result():
+                    return True
+        except futures.TimeoutError:
+            pass
+        return False
+
+    def handle_probe(self, request):
+        """
+        Answer a probe (direct or indirect) of another member.
+
+        Args:
+            request (node_pb2.ProbeRequest): The probe.
+
+        Returns:
+            node_pb2.ProbeResponse: Ack (or nack if an indirect probe failed) with the piggybacked updates.
+        """
+        self.merge(request.updates)
+        ack = True
+        if request.target and request.target != self.__self_addr:
+            ack = self.__probe(request.target)
+        return node_pb2.ProbeResponse(ack=ack, updates=self.__piggyback(full=request.sync))
+
+    def __next_target(self):
+        self.__lock.acquire()
+        members = [addr for addr, (_, state, _) in self.__members.items() if state != node_pb2.DEAD]
+        self.__probe_order = [addr for addr in self.__probe_order if addr in members]
+        if not self.__probe_order:
+            self.__probe_order = random.sample(members, len(members))
+        target = self.__probe_order.pop(0) if self.__probe_order else None
+        self.__lock.release()
+        return target
+
+    def __probe(self, addr, sync=False, target=""):
+        request = node_pb2.ProbeRequest(
+            source=self.__self_addr,
+            target=target,
+            sync=sync,
+            updates=self.__piggyback(full=sync),
+        )
+        # Indirect probes wait for the probe of the helper
+        timeout = self.__config.participant["SWIM_PROBE_TIMEOUT"] * (2 if target else 1)
+        try:
+            res = self.__neighbors.send_probe(addr, request, timeout)
+        except Exception as e:
+            logging.debug(f"({self.__self_addr}) Membership | Probe to {addr} failed: {e}")
+            return False
+        if sync:
+            self.__lock.acquire()
+            self.__sync_pending.discard(addr)
+            self.__lock.release()
+        self.merge(res.updates)
+        return res.ack
+
+    def __suspect(self, addr):
+        self.__lock.acquire()
+        member = self.__members.get(addr)
+        if member is not None and member[1] == node_pb2.ALIVE:
+            member[1] = node_pb2.SUSPECT
+            member[2] = time.time()
+            self.__enqueue(addr)
+        self.__lock.release()
+
+    def __expire_suspects(self):
+        dead = []
+        self.__lock.acquire()
+        for addr, member in self.__members.items():
+            if member[1] == node_pb2.SUSPECT and time.time() - member[2] > self.__config.participant["SWIM_SUSPECT_TIMEOUT"]:
+                member[1] = node_pb2.DEAD
+                member[2] = time.time()
+                self.__enqueue(addr)
+                dead.append(addr)
+        self.__lock.release()
+        for addr in dead:
+            logging.info(f"({self.__self_addr}) Membership | {addr} declared dead. Removing...")
+            self.__neighbors.remove(addr)
+
+    def __expire_dead(self):
+        self.__lock.acquire()
+        expired = [
+            addr for addr, (_, state, since) in self.__members.items()
+            if state == node_pb2.DEAD and time.time() - since > self.__config.participant["SWIM_DEAD_TIMEOUT"]
+        ]
+        for addr in expired:
+            del self.__members[addr]
+            self.__sync_pending.discard(addr)
+        self.__lock.release()
+        if expired:
+            logging.info(f"({self.__self_addr}) Membership | Forgetting dead members {expired}")
+
+    ####
+    # Dissemination
+    ####
+
+    def merge(self, updates):
+        """
+        Apply membership updates received from other members, adding the new members as non-direct neighbors and
+        removing the dead ones.
+
+        Args:
+            updates (list): List of node_pb2.MemberUpdate.
+        """
+        added, removed = [], []
+        self.__lock.acquire()
+        for update in updates:
+            action = self.__apply(update)
+            if action == node_pb2.ALIVE:
+                added.append(update.addr)
+            elif action == node_pb2.DEAD:
+                removed.append(update.addr)
+        self.__lock.release()
+        for addr in added:
+            self.__neighbors.add(addr, non_direct=True)
+        for addr in removed:
+            logging.info(f"({self.__self_addr}) Membership | {addr} is dead. Removing...")
+            self.__neighbors.remove(addr)
+
+    def __apply(self, update):
+        """
+        Apply an update following the SWIM precedence rules (lock must be held).
+
+        Returns:
+            int: ALIVE if the member must be added to the neighbors, DEAD if it must be removed, None otherwise.
+        """
+        if update.addr == self.__self_addr:
+            # Refute suspicions (or death) about itself
+            # (the node always piggybacks itself, so the new incarnation is disseminated with every probe and ack)
+            if update.state != node_pb2.ALIVE and update.incarnation >= self.__incarnation:
+                self.__incarnation = update.incarnation + 1
+            return None
+
+        member = self.__members.get(update.addr)
+        if member is None:
+            newer = True
+        elif update.state == node_pb2.ALIVE:
+            newer = update.incarnation > member[0]
+        elif update.state == node_pb2.SUSPECT:
+            newer = update.incarnation > member[0] or (update.incarnation == member[0] and member[1] == node_pb2.ALIVE)
+        else:
+            newer = member[1] != node_pb2.DEAD
+        if not newer:
+            return None
+
+        was_dead = member is None or member[1] == node_pb2.DEAD
+        self.__members[update.addr] = [update.incarnation, update.state, time.time()]
+        self.__enqueue(update.addr)
+        if update.state == node_pb2.DEAD:
+            return None if was_dead else node_pb2.DEAD
+        return node_pb2.ALIVE if was_dead else None
+
+    def __enqueue(self, addr):
+        # Lock must be held
+        incarnation, state, _ = self.__members[addr]
+        self.__updates[addr] = [node_pb2.MemberUpdate(addr=addr, incarnation=incarnation, state=state), 0]
+
+    def __piggyback(self, full=False):
+        """
+        Select the updates to piggyback on a probe or an ack. The node always includes itself.
+
+        Args:
+            full (bool): If True, include the full membership (synchronization of new connections).
+
+        Returns:
+            list: List of node_pb2.MemberUpdate.
+        """
+        self.__lock.acquire()
+        updates = [node_pb2.MemberUpdate(addr=self.__self_addr, incarnation=self.__incarnation, state=node_pb2.ALIVE)]
+        if full:
+            updates += [
+                node_pb2.MemberUpdate(addr=addr, incarnation=incarnation, state=state)
+                for addr, (incarnation, state, _) in self.__members.items()
+            ]
+        else:
+            max_transmissions = self.RETRANSMISSION_MULTIPLIER * math.ceil(math.log2(len(self.__members) + 2))
+            pending = sorted(self.__updates.items(), key=lambda item: item[1][1])
+            for addr, entry in pending[:self.__config.participant["SWIM_MAX_PIGGYBACK"]]:
+                updates.append(entry[0])
+                entry[1] += 1
+                if entry[1] >= max_transmissions:
+                    del self.__updates[addr]
+        self.__lock.release()
+        return updates
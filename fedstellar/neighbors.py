@@ -24,8 +24,16 @@ from datetime import datetime
 
 import grpc
 
+from fedstellar.membership import Membership
 from fedstellar.messages import NodeMessages
+from fedstellar.outbox import Outbox
 from fedstellar.proto import node_pb2, node_pb2_grpc
+from fedstellar.utils.channel_pool import ChannelPool
+from fedstellar.utils.deduplication import DeduplicationIndex
+from fedstellar.utils.functions import payload_digest
+from fedstellar.utils.link_stats import LinkStats
+from fedstellar.utils.shm import SegmentStore, get_host_id
+from fedstellar.utils.traffic import TrafficStats
 
 
 class Neighbors:
@@ -34,8 +42,12 @@ class Neighbors:
         - Add neighbors (check duplicates)
         - Remove neighbors
         - Get neighbors
-        - Heartbeat: remove neighbors that not send a heartbeat in a period of time
+        - Heartbeat: remove neighbors that not send a heartbeat in a period of time (or SWIM-style membership, see Membership)
         - Gossip: resend messages to neighbors allowing communication between non-direct connected nodes
+        - Outboxes: messages and models are queued per neighbor (see Outbox), so a slow neighbor does not delay the rest
+        - Traffic: messages, bytes and latencies per command, neighbor and direction (see TrafficStats)
+        - Shared memory: models to neighbors of the same host are exchanged through shared memory segments if
+          SHM_EXCHANGE is enabled (see SegmentStore)
 
     Args:
         self_addr (str): Address of the node itself.
@@ -47,31 +59,71 @@ class Neighbors:
         self.__neighbors = {}  # private to avoid concurrency issues
         self.__neighbors_location = {}  # private to avoid concurrency issues
         self.__nei_lock = threading.Lock()
+        self.__listeners = []  # called when a neighbor is added or removed
 
         # Heartbeat
         self.__heartbeat_terminate_flag = threading.Event()
+        if self.__config.participant["MEMBERSHIP_PROTOCOL"] == "swim":
+            self.__membership = Membership(self_addr, config, self)
+        else:
+            self.__membership = None
 
         # Gossip
-        self.__pending_msgs = []
-        self.__pending_msgs_lock = threading.Lock()
-        self.__gossip_terminate_flag = threading.Event()
-        self.__processed_messages = []
-        self.__processed_messages_lock = threading.Lock()
+        self.__outboxes = {}
+        self.__outboxes_lock = threading.Lock()
+        self.__processed_messages = DeduplicationIndex(self.__config.participant["AMOUNT_LAST_MESSAGES_SAVED"])
+
+        # Models
+        self.__unary_model_neis = set()  # neighbors without add_model_stream support
+        self.__unbatched_neis = set()  # neighbors without send_messages support
+        self.__no_offer_neis = set()  # neighbors without offer_model support
+        self.__codecs = ["none"]  # codecs supported by the node (in order of preference)
+        self.__nei_codecs = {}  # codec agreed with each neighbor at handshake
+
+        # Shared memory (neighbors of the same host, announced at handshake)
+        self.__host_id = get_host_id()
+        self.__nei_hosts = {}
+        self.__shm_unsupported = set()  # neighbors that cannot map the segments (e.g. no shared /dev/shm)
+        if self.__config.participant["SHM_EXCHANGE"]:
+            self.__segments = SegmentStore(
+                self.__config.participant["SHM_DIR"],
+                "fedstellar-" + self_addr.replace(":", "-"),
+                self.__config.participant["SHM_MAX_SEGMENTS"],
+            )
+        else:
+            self.__segments = None
+
+        # Link estimates (RTT and throughput of each neighbor), used to choose the gossip targets
+        self.__link_stats = LinkStats(self.__config.participant["LINK_STATS_ALPHA"])
+        self.__traffic_stats = TrafficStats()
+
+        # Channels to non-direct neighbors (model sends and probes)
+        self.__channel_pool = ChannelPool(
+            lambda addr: self._connect(addr, handshake_msg=False),
+            lambda channel, stub: self._disconnect(channel, stub, disconnect_msg=False),
+            self.__config.participant["CHANNEL_POOL_SIZE"],
+            self.__config.participant["CHANNEL_POOL_TTL"],
+        )
 
     def start(self):
         """
-        Start the heartbeater and gossiper threads.
+        Start the heartbeater thread.
         """
         self.__start_heartbeater()
-        self.__start_gossiper()
 
     def stop(self):
         """
-        Stop the heartbeater and gossiper threads. Also, close all the connections.
+        Stop the heartbeater thread (and the membership probes), send the queued messages and stop the outboxes. Also,
+        close all the connections.
         """
         self._stop_heartbeater()
-        self._stop_gossiper()
+        if self.__membership is not None:
+            self.__membership.stop()
+        self.__stop_outboxes()
         self.clear_neis()
+        self.__channel_pool.clear()
+        if self.__segments is not None:
+            self.__segments.clear()
 
     ####
     # Message
@@ -111,31 +163,126 @@ class Neighbors:
             nei (str): Address of the neighbor.
             msg (node_pb2.Message): Message to send.
         """
-        try:
-            # logging.info(f"({self.__self_addr}) Sending message (gRPC) {msg.cmd} to {self.__neighbors[nei][1]}")
-            res = self.__neighbors[nei][1].send_message(
-                msg, timeout=self.__config.participant["GRPC_TIMEOUT"]
-            )
-            if res.error:
-                logging.error(
-                    f"[{self.__self_addr}] send_message (gRPC) | Error while sending a message: {msg.cmd} {msg.args}: {res.error}"
+        self.send_messages([(nei, msg)])
+
+    def send_messages(self, sends):
+        """
+        Send several messages concurrently (gRPC futures) and wait until all of them are finished.
+        Thus, the time spent is the one of the slowest neighbor instead of the sum over all the neighbors.
+        Messages to the same neighbor are sent in a single send_messages RPC (MessageBatch).
+        Neighbors that fail are removed.
+
+        Args:
+            sends (list): List of (neighbor address, node_pb2.Message) to send.
+        """
+        pending = []
+        for nei, msgs in self._group_messages(sends):
+            try:
+                # logging.info(f"({self.__self_addr}) Sending message (gRPC) {msg.cmd} to {self.__neighbors[nei][1]}")
+                stub = self.__neighbors[nei][1]
+                start = time.time()
+                if len(msgs) == 1:
+                    future = stub.send_message.future(
+                        msgs[0], timeout=self.__config.participant["GRPC_TIMEOUT"]
+                    )
+                else:
+                    future = stub.send_messages.future(
+                        node_pb2.MessageBatch(messages=msgs), timeout=self.__config.participant["GRPC_TIMEOUT"]
+                    )
+                # RTT sample (when the call finishes, not when the result is read)
+                future.add_done_callback(
+                    lambda f, nei=nei, msgs=msgs, start=start: self._messages_sent(nei, msgs, time.time() - start, f.code() == grpc.StatusCode.OK)
                 )
-                self.remove(nei, disconnect_msg=True)
+                pending.append((nei, msgs, future))
+            except Exception as e:
+                self._check_message_response(nei, msgs, error=e)
+
+        resends = []
+        for nei, msgs, future in pending:
+            try:
+                resends += self._check_message_response(nei, msgs, future.result())
+            except Exception as e:
+                resends += self._check_message_response(nei, msgs, error=e)
+        if resends:
+            self.send_messages(resends)
+
+    def _messages_sent(self, nei, msgs, seconds, ok):
+        """
+        Account a finished call that sent messages to a neighbor (traffic and, if successful, RTT sample).
+
+        Args:
+            nei (str): Address of the neighbor.
+            msgs (list): Messages sent (node_pb2.Message).
+            seconds (float): Duration of the call.
+            ok (bool): True if the call succeeded.
+        """
+        if ok:
+            self.__link_stats.add_rtt(nei, seconds)
+        for msg in msgs:
+            self.__traffic_stats.record(msg.cmd, nei, "out", msg.ByteSize(), seconds, error=not ok)
+
+    def _group_messages(self, sends):
+        """
+        Group the messages by destination (keeping their order). Neighbors without send_messages support get one
+        group per message.
+
+        Args:
+            sends (list): List of (neighbor address, node_pb2.Message) to send.
+
+        Returns:
+            list: List of (neighbor address, list of node_pb2.Message).
+        """
+        groups = {}
+        for nei, msg in sends:
+            groups.setdefault(nei, []).append(msg)
+        grouped = []
+        for nei, msgs in groups.items():
+            if nei in self.__unbatched_neis:
+                grouped += [(nei, [msg]) for msg in msgs]
             else:
-                pass
-                # logging.debug(
-                #     f"({self.__self_addr}) send_message (gRPC) | Message {msg.cmd} sent to {nei} with hash {msg.hash}"
-                # )
-        except Exception as e:
+                grouped.append((nei, msgs))
+        return grouped
+
+    def _check_message_response(self, nei, msgs, res=None, error=None):
+        """
+        Check the result of sending messages to a neighbor. Neighbors that fail are removed.
+
+        Args:
+            nei (str): Address of the neighbor.
+            msgs (list): Messages sent (node_pb2.Message).
+            res (node_pb2.ResponseMessage): Response of the neighbor.
+            error (Exception): Exception raised while sending the messages.
+
+        Returns:
+            list: List of (neighbor address, node_pb2.Message) to send again one by one (the neighbor does not
+            implement send_messages).
+        """
+        cmds = [msg.cmd for msg in msgs]
+        if isinstance(error, grpc.RpcError) and error.code() == grpc.StatusCode.UNIMPLEMENTED and len(msgs) > 1:
+            logging.info(f"({self.__self_addr}) {nei} does not implement send_messages, falling back to send_message")
+            self.__unbatched_neis.add(nei)
+            return [(nei, msg) for msg in msgs]
+        if error is not None:
             # Remove neighbor
             logging.error(
-                f"({self.__self_addr}) send_message (gRPC) | Cannot send message {msg.cmd} to {nei}. Error: {str(e)}"
+                f"({self.__self_addr}) send_message (gRPC) | Cannot send message {cmds} to {nei}. Error: {str(error)}"
             )
             self.remove(nei)
+        elif res.error:
+            logging.error(
+                f"[{self.__self_addr}] send_message (gRPC) | Error while sending a message: {cmds}: {res.error}"
+            )
+            self.remove(nei, disconnect_msg=True)
+        else:
+            pass
+            # logging.debug(
+            #     f"({self.__self_addr}) send_message (gRPC) | Message {cmds} sent to {nei}"
+            # )
+        return []
 
     def broadcast_msg(self, msg, node_list=None):
         """
-        Broadcast a message to all the neighbors.
+        Broadcast a message to all the neighbors (queued in the outbox of each neighbor).
 
         Args:
             msg (node_pb2.Message): Message to send.
@@ -148,12 +295,12 @@ class Neighbors:
             node_list = self.get_all(only_direct=True)
         # Send
         logging.info(f"({self.__self_addr}) Broadcasting\n{msg}--> to {node_list}")
-        for n in node_list:
-            self.send_message(n, msg)
+        self.queue_messages([(n, msg) for n in node_list])
 
-    def send_model(self, nei, round, serialized_model, contributors=[], weight=1):
+    def send_model(self, nei, round, serialized_model, contributors=[], weight=1, codec="none", compression_ratio=None, base="", base_round=0):
         """
-        Send a model to a neighbor.
+        Send a model to a neighbor. The model is streamed in chunks (add_model_stream) if MODEL_STREAMING is enabled,
+        falling back to the unary add_model if the neighbor does not implement it.
 
         Args:
             nei (str): Address of the neighbor.
@@ -161,34 +308,38 @@ class Neighbors:
             serialized_model (bytes): Serialized model.
             contributors (list): List of contributors of the model.
             weight (float): Weight of the model.
+            codec (str): Codec used to encode the model (only logged).
+            compression_ratio (float): Size of the parameters in memory / size of the serialized model (only logged).
+            base (str): If the model is a delta, identifier of the base model held by the neighbor.
+            base_round (int): Round of the base model.
+
+        Returns:
+            node_pb2.ResponseMessage: Response of the neighbor (None if the model could not be sent).
         """
         try:
             logging.info(
-                f"({self.__self_addr}) Sending model to {nei} with round {round}: contributors={contributors}, weight={weight} | size={sys.getsizeof(serialized_model) / (1024 ** 2) if serialized_model is not None else 0} MB"
+                f"({self.__self_addr}) Sending model to {nei} with round {round}: contributors={contributors}, weight={weight} | size={sys.getsizeof(serialized_model) / (1024 ** 2) if serialized_model is not None else 0} MB | codec={codec}, compression_ratio={f'{compression_ratio:.2f}' if compression_ratio else 'n/a'}{f' | delta (base={base}, base_round={base_round})' if base else ''}"
             )
             stub = self.__neighbors[nei][1]
-            # if not connected, create a temporal stub to send the message
+            # if not connected, use a pooled channel to send the message
+            channel = None
             if stub is None:
-                channel = grpc.insecure_channel(nei)
-                stub = node_pb2_grpc.NodeServicesStub(channel)
-            else:
-                channel = None
-            res = stub.add_model(
-                node_pb2.Weights(
-                    source=self.__self_addr,
-                    round=round,
-                    weights=serialized_model,
-                    contributors=contributors,
-                    weight=weight,
-                ),
-                timeout=self.__config.participant["GRPC_TIMEOUT"],
-            )
+                channel, stub = self.__channel_pool.acquire(nei)
+            start = time.time()
+            res = None
+            try:
+                res = self._send_model_request(nei, stub, round, serialized_model, contributors, weight, base, base_round)
+            finally:
+                if channel is not None:
+                    self.__channel_pool.release(nei, channel)
+                self.__traffic_stats.record("add_model", nei, "out", len(serialized_model), time.time() - start, error=res is None or bool(res.error))
             # Handling errors -> however errors in aggregation stops the other nodes and are not raised (decoding/non-matching/unexpected)
             if res.error:
                 logging.error(f"[{self.__self_addr}] Error while sending a model: {res.error}")
                 self.remove(nei, disconnect_msg=True)
-            if not (channel is None):
-                channel.close()
+            elif not res.base_missing:
+                self.__link_stats.add_transfer(nei, len(serialized_model), time.time() - start)
+            return res
 
         except Exception as e:
             # Remove neighbor
@@ -196,6 +347,200 @@ class Neighbors:
                 f"({self.__self_addr}) Cannot send model to {nei}. Error: {str(e)}"
             )
             self.remove(nei)
+            return None
+
+    def offer_model(self, nei, round, digest, size, contributors=[], weight=1):
+        """
+        Offer a model to a neighbor before sending it (only its digest and metadata are sent).
+
+        Args:
+            nei (str): Address of the neighbor.
+            round (int): Round of the model.
+            digest (str): Digest of the serialized model.
+            size (int): Size of the serialized model.
+            contributors (list): List of contributors of the model.
+            weight (float): Weight of the model.
+
+        Returns:
+            node_pb2.ResponseMessage: Answer of the neighbor (have_model if it already holds the model, not_needed if
+                it would discard it), None if the offer failed or is not supported (the model must be sent).
+        """
+        if nei in self.__no_offer_neis:
+            return None
+        request = node_pb2.WeightsHeader(
+            source=self.__self_addr, round=round, contributors=contributors, weight=weight, total_size=size, digest=digest
+        )
+        start = time.time()
+        try:
+            stub = self.__neighbors[nei][1]
+            channel = None
+            if stub is None:
+                channel, stub = self.__channel_pool.acquire(nei)
+            try:
+                res = self._call(stub.offer_model, request)
+            finally:
+                if channel is not None:
+                    self.__channel_pool.release(nei, channel)
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.UNIMPLEMENTED:
+                logging.info(f"({self.__self_addr}) {nei} does not implement offer_model, sending models without offers")
+                self.__no_offer_neis.add(nei)
+            self.__traffic_stats.record("offer_model", nei, "out", request.ByteSize(), time.time() - start, error=True)
+            return None
+        except Exception as e:
+            logging.info(f"({self.__self_addr}) Cannot offer model to {nei}: {e}")
+            self.__traffic_stats.record("offer_model", nei, "out", request.ByteSize(), time.time() - start, error=True)
+            return None
+        self.__traffic_stats.record("offer_model", nei, "out", request.ByteSize(), time.time() - start)
+        return res
+
+    def _send_model_request(self, nei, stub, round, serialized_model, contributors, weight, base, base_round):
+        """
+        Perform the call that transfers a model (streamed in chunks if MODEL_STREAMING is enabled and the neighbor
+        implements it, unary otherwise).
+
+        Returns:
+            node_pb2.ResponseMessage: Response of the neighbor.
+        """
+        if self.__segments is not None and self.is_colocated(nei) and nei not in self.__shm_unsupported:
+            res = self.__send_model_shm(nei, stub, round, serialized_model, contributors, weight, base, base_round)
+            if res is not None:
+                return res
+        if self.__config.participant["MODEL_STREAMING"] and nei not in self.__unary_model_neis:
+            try:
+                return self._call(
+                    stub.add_model_stream,
+                    self.__model_chunks(round, serialized_model, contributors, weight, base, base_round),
+                )
+            except grpc.RpcError as e:
+                if e.code() != grpc.StatusCode.UNIMPLEMENTED:
+                    raise
+                logging.info(f"({self.__self_addr}) {nei} does not implement add_model_stream, falling back to add_model")
+                self.__unary_model_neis.add(nei)
+        return self.__send_model_unary(stub, round, serialized_model, contributors, weight, base, base_round)
+
+    def _call(self, rpc, request, timeout=None):
+        """
+        Perform a blocking call of a stub method.
+
+        Args:
+            rpc: Stub method.
+            request: Request (or iterator of requests in client-streaming methods).
+            timeout (float): Timeout of the call (GRPC_TIMEOUT if None).
+
+        Returns:
+            Response of the call.
+        """
+        if timeout is None:
+            timeout = self.__config.participant["GRPC_TIMEOUT"]
+        return rpc(request, timeout=timeout)
+
+    def send_probe(self, addr, request, timeout):
+        """
+        Send a membership probe to a member (using a pooled channel if it is not a direct neighbor).
+
+        Args:
+            addr (str): Address of the member.
+            request (node_pb2.ProbeRequest): The probe.
+            timeout (float): Timeout of the probe.
+
+        Returns:
+            node_pb2.ProbeResponse: Response of the member.
+
+        Raises:
+            grpc.RpcError: If the member does not answer.
+        """
+        try:
+            stub = self.__neighbors[addr][1]
+        except KeyError:
+            stub = None
+        channel = None
+        if stub is None:
+            channel, stub = self.__channel_pool.acquire(addr)
+        start = time.time()
+        try:
+            res = self._call(stub.probe, request, timeout=timeout)
+        except Exception:
+            self.__traffic_stats.record("probe", addr, "out", request.ByteSize(), time.time() - start, error=True)
+            # Do not reuse the channel (it may be in reconnection backoff)
+            if channel is not None:
+                self.__channel_pool.release(addr, channel, discard=True)
+            raise
+        self.__traffic_stats.record("probe", addr, "out", request.ByteSize(), time.time() - start)
+        if channel is not None:
+            self.__channel_pool.release(addr, channel)
+        return res
+
+    def __send_model_shm(self, nei, stub, round, serialized_model, contributors, weight, base, base_round):
+        """
+        Send a model through a shared memory segment (only its name and digest are sent).
+
+        Returns:
+            node_pb2.ResponseMessage: Response of the neighbor, None if the model must be sent in the request (the
+            segment cannot be written or the neighbor cannot map it).
+        """
+        digest = payload_digest(serialized_model)
+        try:
+            name = self.__segments.acquire(serialized_model, digest)
+        except OSError as e:
+            logging.info(f"({self.__self_addr}) Cannot write shared memory segment, sending the model to {nei} in the request: {e}")
+            return None
+        try:
+            res = self._call(
+                stub.add_model,
+                node_pb2.Weights(
+                    source=self.__self_addr,
+                    round=round,
+                    contributors=contributors,
+                    weight=weight,
+                    base=base,
+                    base_round=base_round,
+                    shm=name,
+                    digest=digest,
+                ),
+            )
+        finally:
+            # The neighbor mapped the segment before answering
+            self.__segments.release(digest)
+        if res.shm_missing:
+            logging.info(f"({self.__self_addr}) {nei} cannot map shared memory segments, sending models in the requests")
+            self.__shm_unsupported.add(nei)
+            return None
+        return res
+
+    def __send_model_unary(self, stub, round, serialized_model, contributors, weight, base, base_round):
+        return self._call(
+            stub.add_model,
+            node_pb2.Weights(
+                source=self.__self_addr,
+                round=round,
+                weights=serialized_model,
+                contributors=contributors,
+                weight=weight,
+                base=base,
+                base_round=base_round,
+            ),
+        )
+
+    def __model_chunks(self, round, serialized_model, contributors, weight, base, base_round):
+        """
+        Generate the add_model_stream requests: a header with the model metadata followed by fixed-size chunks.
+        """
+        yield node_pb2.WeightsChunk(
+            header=node_pb2.WeightsHeader(
+                source=self.__self_addr,
+                round=round,
+                contributors=contributors,
+                weight=weight,
+                total_size=len(serialized_model),
+                digest=payload_digest(serialized_model),
+                base=base,
+                base_round=base_round,
+            )
+        )
+        chunk_size = self.__config.participant["MODEL_CHUNK_SIZE"]
+        for offset in range(0, len(serialized_model), chunk_size):
+            yield node_pb2.WeightsChunk(chunk=serialized_model[offset:offset + chunk_size])
 
     ####
     # Neighbors management
@@ -216,6 +561,7 @@ class Neighbors:
         self.__nei_lock.acquire()
         self.__neighbors[addr] = [None, None, time.time()]
         self.__nei_lock.release()
+        self.__notify_listeners()
         return True
 
     def direct_add_node(self, handshake_msg, addr):
@@ -231,22 +577,11 @@ class Neighbors:
         """
         logging.info(f"({self.__self_addr}) Adding direct connected neighbor {addr}")
         try:
-            # Create channel and stub
-            channel = grpc.insecure_channel(addr)
-            stub = node_pb2_grpc.NodeServicesStub(channel)
-
-            # Handshake
-            if handshake_msg:
-                res = stub.handshake(
-                    node_pb2.HandShakeRequest(addr=self.__self_addr),
-                    timeout=self.__config.participant["GRPC_TIMEOUT"],
-                )
-                if res.error:
-                    logging.info(
-                        f"({self.__self_addr}) Cannot add a neighbor: {res.error}"
-                    )
-                    channel.close()
-                    return False
+            # Create channel and stub (and handshake)
+            connection = self._connect(addr, handshake_msg)
+            if connection is None:
+                return False
+            channel, stub = connection
 
             # Add neighbor
             self.__nei_lock.acquire()
@@ -258,6 +593,9 @@ class Neighbors:
                 if addr not in self.__config.participant["network_args"]["neighbors"]:
                     self.__config.participant["network_args"]["neighbors"] += " " + addr
             self.__nei_lock.release()
+            if self.__membership is not None:
+                self.__membership.on_connect(addr)
+            self.__notify_listeners()
             return True
 
         except Exception as e:
@@ -269,6 +607,55 @@ class Neighbors:
                 pass
             return False
 
+    def _connect(self, addr, handshake_msg):
+        """
+        Create the channel and the stub of a neighbor and, if required, send the handshake message.
+
+        Args:
+            addr (str): Address of the neighbor.
+            handshake_msg (bool): If True, send a handshake message to the neighbor.
+
+        Returns:
+            tuple: (channel, stub) or None if the neighbor rejected the handshake.
+        """
+        channel = grpc.insecure_channel(addr)
+        stub = node_pb2_grpc.NodeServicesStub(channel)
+        if handshake_msg:
+            res = stub.handshake(
+                node_pb2.HandShakeRequest(addr=self.__self_addr, codecs=self.get_codecs(), host_id=self.get_host_id()),
+                timeout=self.__config.participant["GRPC_TIMEOUT"],
+            )
+            if res.error:
+                logging.info(
+                    f"({self.__self_addr}) Cannot add a neighbor: {res.error}"
+                )
+                channel.close()
+                return None
+            self.set_codec(addr, res.codec if res.HasField("codec") else "none")
+            self.set_host(addr, res.host_id)
+        return channel, stub
+
+    def _disconnect(self, channel, stub, disconnect_msg):
+        """
+        Close the connection with a neighbor.
+
+        Args:
+            channel: Channel of the neighbor.
+            stub: Stub of the neighbor.
+            disconnect_msg (bool): If True, send a disconnect message to the neighbor.
+        """
+        try:
+            # If the other node still connected, disconnect
+            if disconnect_msg:
+                stub.disconnect(
+                    node_pb2.HandShakeRequest(addr=self.__self_addr),
+                    timeout=self.__config.participant["GRPC_TIMEOUT"],
+                )
+            # Close channel
+            channel.close()
+        except:
+            pass
+
     def add(self, addr, handshake_msg=True, non_direct=False):
         """
         Add a neighbor if it is not itself or already added. It also sends a handshake message to check if the neighbor is available and create a bidirectional connection.
@@ -326,20 +713,26 @@ class Neighbors:
             disconnect_msg (bool): If True, send a disconnect message to the neighbor.
         """
         logging.info(f"({self.__self_addr}) Removing {nei}")
+        self.__channel_pool.remove(nei)
+        self.__link_stats.remove(nei)
+        self.__outboxes_lock.acquire()
+        outbox = self.__outboxes.pop(nei, None)
+        self.__outboxes_lock.release()
+        if outbox is not None:
+            outbox.stop()
         self.__nei_lock.acquire()
         try:
-            try:
-                # If the other node still connected, disconnect
-                if disconnect_msg:
-                    self.__neighbors[nei][1].disconnect(
-                        node_pb2.HandShakeRequest(addr=self.__self_addr)
-                    )
-                # Close channel
-                self.__neighbors[nei][0].close()
-            except:
-                pass
+            channel, stub, _ = self.__neighbors[nei]
+            if channel is not None:
+                self._disconnect(channel, stub, disconnect_msg)
             # Remove neighbor
             del self.__neighbors[nei]
+            self.__nei_hosts.pop(nei, None)
+            self.__shm_unsupported.discard(nei)
+            self.__unary_model_neis.discard(nei)
+            self.__unbatched_neis.discard(nei)
+            self.__no_offer_neis.discard(nei)
+            self.__nei_codecs.pop(nei, None)
             # Remove neighbor from config
             current_neighbors = self.get_all(only_direct=True)
             logging.info(f"({self.__self_addr}) Current neighbors: {current_neighbors}")
@@ -358,6 +751,102 @@ class Neighbors:
         except:
             pass
         self.__nei_lock.release()
+        self.__notify_listeners()
+
+    def add_listener(self, listener):
+        """
+        Register a function called (without arguments) whenever a neighbor is added or removed. It must not block.
+
+        Args:
+            listener (function): Function to call.
+        """
+        self.__listeners.append(listener)
+
+    def __notify_listeners(self):
+        for listener in self.__listeners:
+            listener()
+
+    ####
+    # Codecs
+    ####
+
+    def set_codecs(self, codecs):
+        """
+        Set the codecs supported by the node (in order of preference). They are announced in the handshakes.
+
+        Args:
+            codecs (list): Codec names.
+        """
+        self.__codecs = list(codecs)
+
+    def get_codecs(self):
+        """
+        Returns:
+            list: Codecs supported by the node (in order of preference).
+        """
+        return self.__codecs
+
+    def negotiate_codec(self, nei, codecs):
+        """
+        Choose the codec to use with a neighbor: the first codec announced by the neighbor that this node supports
+        ("none" if there is none, e.g. nodes without codecs).
+
+        Args:
+            nei (str): Address of the neighbor.
+            codecs (list): Codecs announced by the neighbor (in order of preference).
+
+        Returns:
+            str: Codec agreed.
+        """
+        codec = next((c for c in codecs if c in self.__codecs), "none")
+        self.set_codec(nei, codec)
+        return codec
+
+    def set_codec(self, nei, codec):
+        """
+        Set the codec agreed with a neighbor.
+
+        Args:
+            nei (str): Address of the neighbor.
+            codec (str): Codec name.
+        """
+        if codec != "none":
+            logging.info(f"({self.__self_addr}) Using codec {codec} with {nei}")
+        self.__nei_codecs[nei] = codec
+
+    def get_codec(self, nei):
+        """
+        Args:
+            nei (str): Address of the neighbor.
+
+        Returns:
+            str: Codec agreed with the neighbor ("none" if there is none, e.g. non-direct neighbors).
+        """
+        return self.__nei_codecs.get(nei, "none")
+
+    def get_host_id(self):
+        """
+        Returns:
+            str: Identifier of the host of the node (announced in the handshakes).
+        """
+        return self.__host_id
+
+    def set_host(self, nei, host_id):
+        """
+        Set the host announced by a neighbor at handshake.
+
+        Args:
+            nei (str): Address of the neighbor.
+            host_id (str): Identifier of the host of the neighbor ("" if unknown).
+        """
+        self.__nei_hosts[nei] = host_id
+
+    def is_colocated(self, nei):
+        """
+        Returns:
+            bool: True if the neighbor runs on the same host.
+        """
+        return self.__nei_hosts.get(nei) == self.__host_id
 
     def get(self, nei):
         """
@@ -401,6 +890,13 @@ class Neighbors:
     # Heartbeating
     ####
 
+    def get_membership(self):
+        """
+        Returns:
+            Membership: SWIM-style membership (None if MEMBERSHIP_PROTOCOL is "heartbeat").
+        """
+        return self.__membership
+
     def heartbeat(self, nei, time):
         """
         Update the time of the last heartbeat of a neighbor. If the neighbor is not added, add it.
@@ -436,74 +932,91 @@ class Neighbors:
             self
     ):
         period = self.__config.participant["HEARTBEAT_PERIOD"]
-        timeout = self.__config.participant["HEARTBEAT_TIMEOUT"]
         toggle = False
         
         while not self.__heartbeat_terminate_flag.is_set():
             t = time.time()
+            self.expire_channels()
 
-            # Check heartbeats (every 2 periods)
-            if toggle:
-                nei_copy = self.__neighbors.copy()
-                for nei in nei_copy.keys():
-                    if t - nei_copy[nei][2] > timeout:
-                        logging.info(
-                            f"({self.__self_addr}) Heartbeat timeout for {nei} ({t - nei_copy[nei][2]}). Removing..."
-                        )
-                        self.remove(nei)
+            if self.__membership is not None:
+                self.__membership.probe_round()
             else:
+                # Check heartbeats (every 2 periods) and send heartbeat (a newer beat replaces the queued one)
+                self.queue_messages(self._build_heartbeats(check_timeouts=toggle), key=NodeMessages.BEAT)
                 toggle = True
 
-            # Send heartbeat
+            # Sleep to allow the periodicity
+            sleep_time = max(0, period - (t - time.time()))
+            time.sleep(sleep_time)
+
+    def _build_heartbeats(self, check_timeouts=True):
+        """
+        Remove the neighbors whose last heartbeat is older than HEARTBEAT_TIMEOUT and build the heartbeat to send.
+
+        Args:
+            check_timeouts (bool): If True, check the heartbeat timeouts.
+
+        Returns:
+            list: List of (neighbor address, node_pb2.Message) to send.
+        """
+        t = time.time()
+        if check_timeouts:
             nei_copy = self.__neighbors.copy()
-            msg = self.build_msg(NodeMessages.BEAT, args=[str(time.time())])
-            self.add_processed_msg(msg)
-            for nei, (_, stub, _) in nei_copy.items():
-                if stub is None:
-                    continue
-                try:
-                    stub.send_message(msg, timeout=self.__config.participant["GRPC_TIMEOUT"])
-                except Exception as e:
+            for nei in nei_copy.keys():
+                if t - nei_copy[nei][2] > self.__config.participant["HEARTBEAT_TIMEOUT"]:
                     logging.info(
-                        f"({self.__self_addr}) Cannot send heartbeat to {nei}. Error: {str(e)}"
+                        f"({self.__self_addr}) Heartbeat timeout for {nei} ({t - nei_copy[nei][2]}). Removing..."
                     )
                     self.remove(nei)
 
-            # Sleep to allow the periodicity
-            sleep_time = max(0, period - (t - time.time()))
-            time.sleep(sleep_time)
+        nei_copy = self.__neighbors.copy()
+        msg = self.build_msg(NodeMessages.BEAT, args=[str(time.time())])
+        self.add_processed_msg(msg.hash)
+        return [(nei, msg) for nei, (_, stub, _) in nei_copy.items() if stub is not None]
 
     ####
     # Gossiping
     ####
 
-    def add_processed_msg(self, msg):
+    def add_processed_msg(self, msg_hash):
         """
-        Add a message to the list of processed messages.
+        Add a message hash to the index of processed messages.
 
         Args:
-            msg (node_pb2.Message): Message to add.
+            msg_hash (int): Hash of the message.
 
         Returns:
             bool: True if the message was added, False if it was already processed.
         """
-        self.__processed_messages_lock.acquire()
-        # Check if message was already processed
-        if msg in self.__processed_messages:
-            self.__processed_messages_lock.release()
-            return False
-        # If there are more than X messages, remove the oldest one
-        if len(self.__processed_messages) > self.__config.participant["AMOUNT_LAST_MESSAGES_SAVED"]:
-            self.__processed_messages.pop(0)
-        # Add message
-        # logging.debug(f"({self.__self_addr}) Adding processed message\n{msg}")
-        self.__processed_messages.append(msg)
-        self.__processed_messages_lock.release()
-        return True
+        return self.__processed_messages.add(msg_hash)
+
+    def get_processed_msgs_stats(self):
+        """
+        Get the statistics (hits/misses) of the index of processed messages.
+
+        Returns:
+            dict: Statistics of the index.
+        """
+        return self.__processed_messages.get_stats()
+
+    def get_channel_pool_stats(self):
+        """
+        Get the statistics (hits/misses/evictions) of the pool of channels to non-direct neighbors.
+
+        Returns:
+            dict: Statistics of the pool.
+        """
+        return self.__channel_pool.get_stats()
+
+    def expire_channels(self):
+        """
+        Close the pooled channels idle for more than CHANNEL_POOL_TTL seconds (called by the heartbeater).
+        """
+        self.__channel_pool.expire()
 
     def gossip(self, msg):
         """
-        Add a message to the list of pending messages to gossip.
+        Queue a message to gossip (to the direct connected neighbors, except its source).
 
         Args:
             msg (node_pb2.Message): Message to add.
@@ -513,68 +1026,113 @@ class Neighbors:
         if msg.ttl > 1:
             # Update ttl and broadcast
             msg.ttl -= 1
+            pending_neis = [n for n in self.get_all(only_direct=True) if n != msg.source]
+            self.queue_messages([(n, msg) for n in pending_neis])
 
-            # Add to pending messages
-            self.__pending_msgs_lock.acquire()
-            pending_neis = [n for n in self.__neighbors.keys() if n != msg.source]
-            # logging.debug(f"({self.__self_addr}) Adding pending message\n{msg}")
-            self.__pending_msgs.append((msg, pending_neis))
-            # logging.debug(f"Pending messages to gossip:\n{str(self.__pending_msgs)}")
-            self.__pending_msgs_lock.release()
+    ####
+    # Outboxes
+    ####
 
-    def __start_gossiper(self):
-        logging.info(f"({self.__self_addr}) Starting gossiper thread")
-        threading.Thread(target=self.__gossiper).start()
+    def __get_outbox(self, nei):
+        self.__outboxes_lock.acquire()
+        outbox = self.__outboxes.get(nei)
+        if outbox is None:
+            outbox = self._new_outbox(nei)
+            self.__outboxes[nei] = outbox
+        self.__outboxes_lock.release()
+        return outbox
 
-    def _stop_gossiper(self):
-        self.__gossip_terminate_flag.set()
+    def _new_outbox(self, nei):
+        """
+        Create the outbox of a neighbor (its senders are threads, see Outbox).
 
-    def __gossiper(
-            self
-    ):
-        period = self.__config.participant["GOSSIP_PERIOD"]
-        messases_per_period = self.__config.participant["GOSSIP_MESSAGES_PER_PERIOD"]
-        while not self.__gossip_terminate_flag.is_set():
-            t = time.time()
-            messages_to_send = []
-            messages_left = messases_per_period
-
-            # Lock
-            self.__pending_msgs_lock.acquire()
-
-            # Select the max amount of messages to send
-            while messages_left > 0 and len(self.__pending_msgs) > 0:
-                head_msg = self.__pending_msgs[0]
-                # Select msgs
-                if len(head_msg[1]) < messages_left:
-                    # Select all
-                    messages_to_send.append(head_msg)
-                    # Remove from pending
-                    self.__pending_msgs.pop(0)
-                else:
-                    # Select only the first neis
-                    messages_to_send.append((head_msg[0], head_msg[1][:messages_left]))
-                    # Remove from pending
-                    self.__pending_msgs[0][1] = self.__pending_msgs[0][1][
-                                                messages_left:
-                                                ]
-
-            # Unlock
-            self.__pending_msgs_lock.release()
-            for msg, neis in messages_to_send:
-                for nei in neis:
-                    # send only if direct connected (also add a try to deal with disconnections)
-                    try:
-                        if self.__neighbors[nei][1] is not None:
-                            logging.debug(
-                                f"({self.__self_addr}) Sending message (gossip)\n{msg}--> to {nei}"
-                            )
-                            self.send_message(nei, msg)
-                    except KeyError:
-                        pass
-            # Sleep to allow periodicity
-            sleep_time = max(0, period - (t - time.time()))
-            time.sleep(sleep_time)
+        Args:
+            nei (str): Address of the neighbor.
+
+        Returns:
+            Outbox: Outbox of the neighbor.
+        """
+        return Outbox(
+            self.__self_addr,
+            nei,
+            lambda nei, msgs: self.send_messages([(nei, msg) for msg in msgs]),
+            self.__config,
+        )
+
+    def queue_messages(self, sends, key=None):
+        """
+        Queue messages in the outboxes of the neighbors. They are sent in batches by the sender of each outbox.
+
+        Args:
+            sends (list): List of (neighbor address, node_pb2.Message) to send.
+            key: Merge key. If a queued message of the neighbor has the same key, it is replaced.
+        """
+        for nei, msg in sends:
+            if nei in self.__neighbors:
+                self.__get_outbox(nei).put_message(msg, key=key)
+
+    def queue_model(self, nei, key, send):
+        """
+        Queue a model transfer in the outbox of a neighbor.
+
+        Args:
+            nei (str): Address of the neighbor.
+            key: Merge key (e.g. the round). If a queued model of the neighbor has the same key, it is replaced.
+            send (callable): Function that sends the model (e.g. calling send_model).
+        """
+        if nei in self.__neighbors:
+            self.__get_outbox(nei).put_model(key, send)
+
+    ####
+    # Link estimates
+    ####
+
+    def get_link_stats(self):
+        """
+        Returns:
+            LinkStats: RTT and throughput estimates of the neighbors.
+        """
+        return self.__link_stats
+
+    def get_traffic_stats(self):
+        """
+        Returns:
+            TrafficStats: Traffic and latency accounting of the node (sent and received messages).
+        """
+        return self.__traffic_stats
+
+    def select_targets(self, neis, k):
+        """
+        Choose the neighbors to gossip a model to, following GOSSIP_TARGET_POLICY (see LinkStats).
+
+        Args:
+            neis (list): Candidate neighbors.
+            k (int): Number of targets.
+
+        Returns:
+            list: Selected neighbors.
+        """
+        outboxes = self.__outboxes.copy()
+        queued = {nei: outboxes[nei].pending_models() for nei in neis if nei in outboxes}
+        return self.__link_stats.select(neis, k, policy=self.__config.participant["GOSSIP_TARGET_POLICY"], queued=queued)
+
+    def get_outbox_stats(self):
+        """
+        Get the statistics (sent/merged/dropped) of the outboxes.
+
+        Returns:
+            dict: Statistics of the outbox of each neighbor.
+        """
+        return {nei: outbox.get_stats() for nei, outbox in self.__outboxes.copy().items()}
+
+    def __stop_outboxes(self):
+        # Send the queued messages (all the outboxes share the timeout)
+        deadline = time.time() + self.__config.participant["GRPC_TIMEOUT"]
+        outboxes = list(self.__outboxes.copy().values())
+        for outbox in outboxes:
+            outbox.flush(max(0, deadline - time.time()))
+        for outbox in outboxes:
+            outbox.stop()
 
     def __str__(self):
         return str(self.__neighbors.keys())
@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import functools
 import json
 import logging
 import math
@@ -21,7 +22,8 @@ import os
 from datetime import datetime
 import traceback
 
-from fedstellar.utils.functions import print_msg_box
+from fedstellar.utils.functions import print_msg_box, payload_digest
+from fedstellar.utils.model_cache import DecodedModelCache
 from fedstellar.attacks.aggregation import create_attack
 from fedstellar.learning.aggregators.aggregator import create_malicious_aggregator
 from fedstellar.learning.pytorch.remotelogger import FedstellarWBLogger
@@ -166,6 +168,28 @@ class Node(BaseNode):
         self.__models_aggregated = {}
         self.__nei_status = {}
 
+        # Encoded models (serialized once and shared by every send_model of the same model)
+        self.__encoded_models = {}
+        self.__encoded_models_lock = threading.Lock()
+        self.__model_version = 0
+
+        # Model inventory (models held in the current round, identified by digest and contributors, advertised on the
+        # status messages and checked before sending a model, see offer_model)
+        self.__inventory = {}  # inventory key -> round of the models held
+        self.__nei_inventory = {}  # neighbor -> (round, set of inventory keys advertised by the neighbor)
+        self.__inventory_lock = threading.Lock()
+
+        # Decoded models, by payload digest (byte-identical models received several times are decoded once)
+        self.__decoded_models = DecodedModelCache(self.config.participant["DECODED_MODEL_CACHE_BYTES"])
+
+        # Delta encoding (models are sent as the difference with the last model transferred to each neighbor)
+        self.__sent_bases = {}  # neighbor -> (base id, round): last model transferred to the neighbor
+        self.__received_bases = {}  # source -> (base id, params): last model received from the source
+        self.__base_models = {}  # base id -> params (of the models in __sent_bases)
+        self.__delta_unsupported = set()  # neighbors that did not hold the base during this round
+        self.__learner_supports_delta = True  # False once the learner returned no delta (see compute_delta)
+        self.__delta_lock = threading.Lock()
+
         # Attack environment
         self.model_dir = self.config.participant['tracking_args']["model_dir"]
         self.model_name = f"{self.model_dir}/participant_{self.idx}_model.pk"
@@ -218,6 +242,7 @@ class Node(BaseNode):
                                                      version=f"participant_{self.idx}", log_graph=True)
         
         self.learner = learner(model, data, config=self.config, logger=fedstellarlogger)
+        self._neighbors.set_codecs(self.learner.get_codecs() or ["none"])
         print_msg_box(msg=f"Logging type: {fedstellarlogger.__class__.__name__}", indent=2, title="Logging information")
 
         # Aggregators
@@ -229,6 +254,10 @@ class Node(BaseNode):
             self.aggregator = Median(node_name=self.get_name(), config=self.config)
         elif self.config.participant["aggregator_args"]["algorithm"] == "TrimmedMean":
             self.aggregator = TrimmedMean(node_name=self.get_name(), config=self.config)
+        if getattr(self.aggregator, "streaming", False) and (self.with_reputation or self.is_dynamic_aggregation):
+            # The reputation system and the dynamic aggregation need the stored models
+            logging.info(f"({self.addr}) Streaming aggregation disabled (reputation or dynamic aggregation enabled)")
+            self.aggregator.streaming = False
         
         self.__trusted_nei = []
         self.__is_malicious = False
@@ -246,9 +275,14 @@ class Node(BaseNode):
         self.__train_set_votes = {}
         self.__train_set_votes_lock = threading.Lock()
 
+        # State changes (votes, status of the neighbors, models aggregated, neighbors added or removed, end of the
+        # learning). The voting and gossip loops wait on it instead of polling (see __wait_state_change)
+        self.__state_changed = threading.Condition()
+        self.__state_version = 0
+        self._neighbors.add_listener(self.__notify_state_change)
+
         # Locks
         self.__start_thread_lock = threading.Lock()
-        self.__wait_votes_ready_lock = threading.Lock()
         self.__model_initialized_lock = threading.Lock()
         self.__model_initialized_lock.acquire()
         self.finish_round_lock = threading.Lock()
@@ -328,6 +362,7 @@ class Node(BaseNode):
 
     def __model_initialized_callback(self, msg):
         self.__nei_status[msg.source] = -1
+        self.__notify_state_change()
 
     def __vote_train_set_callback(self, msg):
         # check moment: round or round + 1 because of node async
@@ -345,10 +380,7 @@ class Node(BaseNode):
             self.__train_set_votes[msg.source] = tmp_votes
             self.__train_set_votes_lock.release()
             # Communicate to the training process that a vote has been received
-            try:
-                self.__wait_votes_ready_lock.release()
-            except:
-                pass
+            self.__notify_state_change()
         else:
             logging.error(
                 f"({self.addr}) Vote received in a late round. Ignored. {msg.round} != {self.round} / {self.round + 1}"
@@ -357,6 +389,7 @@ class Node(BaseNode):
     def __models_agregated_callback(self, msg):
         if msg.round == self.round:
             self.__models_aggregated[msg.source] = msg.args
+            self.__notify_state_change()
 
     def __models_ready_callback(self, msg):
         ########################################################
@@ -364,6 +397,9 @@ class Node(BaseNode):
         ########################################################
         if msg.round in [self.round - 1, self.round]:
             self.__nei_status[msg.source] = int(msg.args[0])
+            # Models held by the neighbor in the round
+            self.__set_nei_inventory(msg.source, int(msg.args[0]), msg.args[1:])
+            self.__notify_state_change()
         else:
             logging.error(
                 f"({self.addr}) Models ready in a late round. Ignored. {msg.round} != {self.round} / {self.round - 1}"
@@ -383,7 +419,52 @@ class Node(BaseNode):
     def add_model(self, request, _):
         """
         GRPC service. It is called when a node wants to add a model to the network.
+        The reception is accounted in the traffic stats of the node (by source).
+        """
+        start = time.time()
+        weights = self._get_model_payload(request)
+        if weights is None:
+            # Shared memory segment not mapped, the model must be sent in the request
+            return node_pb2.ResponseMessage(shm_missing=True)
+        res = self.__add_model(request, weights)
+        self._neighbors.get_traffic_stats().record(
+            "add_model", request.source, "in", len(weights), time.time() - start, error=bool(res.error)
+        )
+        return res
+
+    def offer_model(self, request, _):
+        """
+        GRPC service. It is called when a node offers a model before sending it. The transfer is skipped if the node
+        already holds the model (same digest) in the round of the offer, or if the model would be discarded.
+        """
+        self.__inventory_lock.acquire()
+        have_model = self.__inventory.get(self.__inventory_key(request.digest, request.contributors)) == request.round
+        self.__inventory_lock.release()
+        if have_model:
+            logging.info(f"({self.addr}) offer_model (gRPC) | Already holding the model offered by {request.source} ({request.digest})")
+            return node_pb2.ResponseMessage(have_model=True)
+        if self.round is None or request.round != self.round or not self._admit_model(request):
+            logging.info(f"({self.addr}) offer_model (gRPC) | Model offered by {request.source} not needed (contributors: {request.contributors})")
+            return node_pb2.ResponseMessage(not_needed=True)
+        return node_pb2.ResponseMessage()
+
+    def _admit_model(self, request):
+        """
+        Check if a model is needed from the metadata of the transfer (round and contributors), before receiving or
+        decoding the payload. Models are always needed before the initialization, otherwise the decision is the one of
+        the aggregator (see Aggregator.accepts_model).
+
+        Args:
+            request (node_pb2.Weights | node_pb2.WeightsHeader): Model transfer.
+
+        Returns:
+            bool: False if the model would be discarded.
         """
+        if self.__model_initialized_lock.locked():
+            return True
+        return self.aggregator.accepts_model(request.contributors, round=request.round)
+
+    def __add_model(self, request, weights):
         # Check if Learning is running
         if self.round is not None:
             # Check source
@@ -408,12 +489,25 @@ class Node(BaseNode):
                 )
                 return node_pb2.ResponseMessage()
 
+            # Check if the model is needed before decoding it
+            if not self._admit_model(request):
+                logging.info(
+                    f"({self.addr}) add_model (gRPC) | Model from {request.source} not needed (contributors: {request.contributors}), not decoded"
+                )
+                return node_pb2.ResponseMessage(not_needed=True)
+
             try:
+                digest = payload_digest(weights) if not request.base else None
+                decoded_model, validated = self.__decode_model(request, weights, digest)
+                if decoded_model is None:
+                    return node_pb2.ResponseMessage(base_missing=True)
+
                 if not self.__model_initialized_lock.locked():
                     # Add model to aggregator
                     logging.info(f"({self.addr}) add_model (gRPC) | Remote Service using gRPC (executed by {request.source})")
-                    decoded_model = self.learner.decode_parameters(request.weights)
-                    if self.learner.check_parameters(decoded_model):
+                    if validated or self.learner.check_parameters(decoded_model):
+                        if digest is not None and not validated:
+                            self.__decoded_models.put(digest, decoded_model, len(weights))
                         # Check model similarity between the model and the aggregated models. If the similarity is low enough, ignore the model. Use cossine similarity.
                         if self.config.participant["adaptive_args"]["model_similarity"]:
                             logging.info(f"({self.addr}) add_model (gRPC) | Checking model similarity")
@@ -434,6 +528,9 @@ class Node(BaseNode):
                             decoded_model, request.contributors, request.weight, source=request.source, round=request.round
                         )
                         if models_added is not None:
+                            if self.config.participant["MODEL_INVENTORY"] and not request.base:
+                                self.__add_to_inventory(digest, request.contributors, request.round)
+                            self.__notify_state_change()
                             logging.info(
                                 f'({self.addr}) add_model (gRPC) | Models added using local aggregator, now sending models_added using MODELS_AGGREGATED): {models_added}'
                             )
@@ -450,8 +547,10 @@ class Node(BaseNode):
                     logging.info(f"({self.addr}) add_model (gRPC) | Initializing model (executed by {request.source}) | contributors={request.contributors}")
                     try:
                         self.__model_initialized_lock.release()
-                        model = self.learner.decode_parameters(request.weights)
-                        self.learner.set_parameters(model)
+                        self.learner.set_parameters(decoded_model)
+                        self.__invalidate_encoded_models()
+                        if self.config.participant["MODEL_INVENTORY"] and not request.base and not request.contributors:
+                            self.__add_to_inventory(digest, request.contributors, request.round)
                         logging.info(f"({self.addr}) add_model (gRPC) | Model Weights Initialized")
                         # Communicate Initialization
                         self._neighbors.broadcast_msg(
@@ -752,6 +851,7 @@ class Node(BaseNode):
             model: Model to be used in the learning process.
         """
         self.learner.set_model(model)
+        self.__invalidate_encoded_models()
 
     ###############################################
     #         Network Learning Management         #
@@ -852,11 +952,8 @@ class Node(BaseNode):
         self.learner.interrupt_fit()
         # Aggregator
         self.aggregator.clear()
-        # Try to free wait locks
-        try:
-            self.__wait_votes_ready_lock.release()
-        except:
-            pass
+        # Wake up the voting and gossip loops
+        self.__notify_state_change()
 
     #######################
     #    Training Steps    #
@@ -870,12 +967,16 @@ class Node(BaseNode):
             logging.info(
                 f"({self.addr}) __wait_aggregated_model | Aggregation done for round {self.round}, including parameters in local model.")
             self.learner.set_parameters(params)
+            self.__invalidate_encoded_models()
+            aggregation_time = self.aggregator.get_aggregation_time()
+            if aggregation_time is not None:
+                self.learner.logger.log_metrics({"Aggregation/wall_time": aggregation_time}, step=self.round)
             # Share that aggregation is done
             logging.info(
                 f"({self.addr}) __wait_aggregated_model | Broadcasting aggregation done for round {self.round}")
             self._neighbors.broadcast_msg(
                 self._neighbors.build_msg(
-                    LearningNodeMessages.MODELS_READY, [self.round]
+                    LearningNodeMessages.MODELS_READY, [self.round] + self.__get_inventory(self.round)
                 )
             )
         else:
@@ -1062,6 +1163,8 @@ class Node(BaseNode):
         begin = time.time()
 
         while True:
+            version = self.__state_version
+
             # If the trainning has been interrupted, stop waiting
             if self.round is None:
                 logging.info(f"({self.addr}) Stopping on_round_finished process.")
@@ -1112,8 +1215,8 @@ class Node(BaseNode):
                 logging.info(f"({self.addr}) Computed {len(nc_votes)} votes.")
                 return votes
 
-            # Wait for votes or refresh every 2 seconds
-            self.__wait_votes_ready_lock.acquire(timeout=2)
+            # Wait for votes (or any other change, e.g. a neighbor removed) until the timeout
+            self.__wait_state_change(version, self.config.participant["VOTE_TIMEOUT"] - count)
 
     def __validate_train_set(self, train_set):
         # Verify if node set is valid (can happend that a node was down when the votes were being processed)
@@ -1130,6 +1233,7 @@ class Node(BaseNode):
     def __train(self):
         logging.info(f"({self.addr}) Training...")
         self.learner.fit()
+        self.__invalidate_encoded_models()
         logging.info(f"({self.addr}) Finished training.")
 
     def __evaluate(self):
@@ -1170,7 +1274,30 @@ class Node(BaseNode):
         self.aggregator.set_round(self.round)
         # Clear node aggregation
         self.__models_aggregated = {}
+        self.__invalidate_encoded_models()
+        self.__delta_unsupported = set()
+        # Models of the previous rounds are no longer offered
+        self.__inventory_lock.acquire()
+        self.__inventory = {k: r for k, r in self.__inventory.items() if r >= self.round}
+        self.__nei_inventory = {n: entry for n, entry in self.__nei_inventory.items() if entry[0] >= self.round}
+        self.__inventory_lock.release()
         self.finish_round_lock.release()
+        logging.info(f"({self.addr}) Processed messages stats: {self._neighbors.get_processed_msgs_stats()}")
+        logging.info(f"({self.addr}) Channel pool stats: {self._neighbors.get_channel_pool_stats()}")
+        logging.info(f"({self.addr}) Outbox stats: {self._neighbors.get_outbox_stats()}")
+        logging.info(f"({self.addr}) Link stats: {self._neighbors.get_link_stats().get_stats()}")
+        # Traffic of the finished round (counters are reset)
+        traffic_metrics = self._neighbors.get_traffic_stats().get_metrics(reset=True)
+        if traffic_metrics:
+            self.learner.logger.log_metrics(traffic_metrics, step=self.round - 1)
+        # Decoded model cache of the finished round (models of previous rounds are not received again)
+        cache_stats = self.__decoded_models.get_stats(reset=True)
+        logging.info(f"({self.addr}) Decoded model cache stats: {cache_stats}")
+        if cache_stats["hits"] + cache_stats["misses"] > 0:
+            self.learner.logger.log_metrics(
+                {f"DecodedModelCache/{k}": cache_stats[k] for k in ("hits", "misses", "hit_ratio")}, step=self.round - 1
+            )
+        self.__decoded_models.clear()
         
         # Change the connections of the node
         self.__change_connections()
@@ -1321,20 +1448,305 @@ class Node(BaseNode):
         # Gossip
         self.__gossip_model(candidate_condition, status_function, model_function)
 
+    def __invalidate_encoded_models(self):
+        """
+        Discard the encoded models. Called whenever a new model is produced (parameters set, local training,
+        aggregation or end of round).
+        """
+        self.__encoded_models_lock.acquire()
+        self.__model_version += 1
+        self.__encoded_models = {}
+        self.__encoded_models_lock.release()
+
+    @staticmethod
+    def __inventory_key(digest, contributors):
+        return f"{digest}/{' '.join(sorted(contributors))}"
+
+    def __add_to_inventory(self, digest, contributors, round):
+        """
+        Add a model held by the node to the inventory.
+
+        Args:
+            digest (str): Digest of the serialized model.
+            contributors (list): Nodes that collaborated to get the model.
+            round (int): Round of the model.
+
+        Returns:
+            str: Inventory key of the model.
+        """
+        key = self.__inventory_key(digest, contributors)
+        self.__inventory_lock.acquire()
+        self.__inventory[key] = round
+        self.__inventory_lock.release()
+        return key
+
+    def __get_inventory(self, round):
+        """
+        Returns:
+            list: Inventory keys of the models held by the node in a round.
+        """
+        if not self.config.participant["MODEL_INVENTORY"]:
+            return []
+        self.__inventory_lock.acquire()
+        keys = [k for k, r in self.__inventory.items() if r == round]
+        self.__inventory_lock.release()
+        return keys
+
+    def __set_nei_inventory(self, nei, round, keys, replace=True):
+        """
+        Set the models held by a neighbor (advertised on its status messages or answered to an offer).
+
+        Args:
+            nei (str): Address of the neighbor.
+            round (int): Round of the models.
+            keys (list): Inventory keys of the models.
+            replace (bool): If False, the keys are added to the ones known for the round.
+        """
+        self.__inventory_lock.acquire()
+        known_round, known = self.__nei_inventory.get(nei, (None, set()))
+        if replace or known_round != round:
+            known = set()
+        self.__nei_inventory[nei] = (round, known | set(keys))
+        self.__inventory_lock.release()
+
+    def __nei_holds(self, nei, key, round):
+        """
+        Returns:
+            bool: True if the neighbor holds the model (inventory key) in the round.
+        """
+        self.__inventory_lock.acquire()
+        known_round, known = self.__nei_inventory.get(nei, (None, set()))
+        self.__inventory_lock.release()
+        return known_round == round and key in known
+
+    def __get_encoded_model(self, model, contributors, version, codec="none", base=None):
+        """
+        Get the serialized model, encoding it only the first time it is requested.
+        The payload is identified by the round, the contributors, the model version, the codec and the base (delta
+        encoding), so the same bytes are sent to every neighbor using the same codec and base until the model changes.
+        Models of an outdated version (queued before the model changed) are encoded but not cached.
+
+        Args:
+            model: Parameters of the model. (non-binary)
+            contributors (list): Nodes that collaborated to get the model.
+            version (int): Model version when the model was taken (see __invalidate_encoded_models).
+            codec (str): Codec agreed with the neighbor.
+            base (str): Identifier of the base model (the delta with the base is encoded). None to encode the model.
+
+        Returns:
+            tuple: Encoded model (bytes), compression ratio (None if unknown) and digest of the encoded model. None if
+                a delta was requested and the learner does not support delta encoding.
+        """
+        self.__encoded_models_lock.acquire()
+        key = (self.round, tuple(sorted(contributors)), version, codec, base)
+        entry = self.__encoded_models.get(key)
+        if entry is None:
+            if base is not None:
+                model = self.learner.compute_delta(model, self.__base_models[base], self.config.participant["DELTA_TOPK"])
+                if model is None:
+                    self.__encoded_models_lock.release()
+                    return None
+            if codec == "none":
+                encoded_model = self.learner.encode_parameters(params=model)
+            else:
+                encoded_model = self.learner.encode_parameters(params=model, codec=codec)
+            size = self.learner.get_parameters_size(params=model)
+            entry = (encoded_model, size / len(encoded_model) if size else None, payload_digest(encoded_model))
+            if version == self.__model_version:
+                self.__encoded_models[key] = entry
+        else:
+            logging.debug(f"({self.addr}) Gossip | Reusing encoded model (round={key[0]}, contributors={key[1]}, version={key[2]}, codec={codec})")
+        self.__encoded_models_lock.release()
+        return entry
+
+    def __send_model(self, nei, model, contributors, weight, round, version, candidate_condition=None):
+        """
+        Send a model to a neighbor using the codec agreed with it. If DELTA_ENCODING is enabled, only the difference
+        with the last model transferred to the neighbor is sent, falling back to the full model if the neighbor does
+        not hold it.
+
+        Args:
+            nei (str): Address of the neighbor.
+            model: Parameters of the model. (non-binary)
+            contributors (list): Nodes that collaborated to get the model.
+            weight (int): Weight of the model.
+            round (int): Round of the model. Models queued in a previous round are not sent.
+            version (int): Model version when the model was queued (see __get_encoded_model).
+            candidate_condition (function): If given, the model is only sent if the neighbor still needs it.
+        """
+        if round != self.round:
+            logging.info(f"({self.addr}) Gossip | Discarding model of round {round} queued to {nei} (current round: {self.round})")
+            return
+        if candidate_condition is not None and not candidate_condition(nei):
+            logging.info(f"({self.addr}) Gossip | Discarding model queued to {nei} (no longer needed)")
+            return
+        codec = self._neighbors.get_codec(nei)
+        if self.config.participant["MODEL_INVENTORY"]:
+            # Skip the transfer if the neighbor already holds the model (advertised or answered to the offer), or
+            # would discard it
+            encoded_model, _, digest = self.__get_encoded_model(model, contributors, version, codec)
+            key = self.__add_to_inventory(digest, contributors, round)
+            holds = self.__nei_holds(nei, key, round)
+            offer = None if holds else self._neighbors.offer_model(nei, round, digest, len(encoded_model), contributors, weight)
+            if holds or (offer is not None and offer.have_model):
+                logging.info(f"({self.addr}) Gossip | {nei} already holds the model {digest} (contributors: {contributors}), skipping the transfer")
+                self.__set_nei_inventory(nei, round, [key], replace=False)
+                return
+            if offer is not None and offer.not_needed:
+                logging.info(f"({self.addr}) Gossip | {nei} does not need the model {digest} (contributors: {contributors}), skipping the transfer")
+                return
+        delta_encoding = self.config.participant["DELTA_ENCODING"] and self.__learner_supports_delta
+        base = None
+        if delta_encoding:
+            self.__delta_lock.acquire()
+            if nei in self.__sent_bases and nei not in self.__delta_unsupported:
+                base, base_round = self.__sent_bases[nei]
+            self.__delta_lock.release()
+
+        entry = self.__get_encoded_model(model, contributors, version, codec, base=base) if base is not None else None
+        if base is not None and entry is None:
+            # The learner does not support delta encoding: full models are sent from now on, without bases
+            logging.info(f"({self.addr}) Gossip | The learner does not support delta encoding, sending full models")
+            self.__delta_lock.acquire()
+            self.__learner_supports_delta = False
+            self.__sent_bases = {}
+            self.__base_models = {}
+            self.__delta_lock.release()
+            delta_encoding = False
+        elif base is not None:
+            encoded_model, compression_ratio, _ = entry
+            res = self._neighbors.send_model(
+                nei, round, encoded_model, contributors, weight, codec=codec, compression_ratio=compression_ratio,
+                base=base, base_round=base_round
+            )
+            if res is not None and res.base_missing:
+                logging.info(f"({self.addr}) Gossip | {nei} does not hold the base model {base}, sending the full model")
+                self.__delta_lock.acquire()
+                self.__delta_unsupported.add(nei)
+                self.__delta_lock.release()
+            else:
+                if res is not None and not res.error and not res.not_needed:
+                    self.__set_sent_base(nei, payload_digest((base + payload_digest(encoded_model)).encode()), lambda: self.learner.apply_delta(self.__base_models[base], self.learner.decode_parameters(encoded_model)))
+                return
+
+        encoded_model, compression_ratio, _ = self.__get_encoded_model(model, contributors, version, codec)
+        res = self._neighbors.send_model(
+            nei, round, encoded_model, contributors, weight, codec=codec, compression_ratio=compression_ratio
+        )
+        if delta_encoding and res is not None and not res.error and not res.not_needed:
+            self.__set_sent_base(nei, payload_digest(encoded_model), lambda: self.learner.decode_parameters(encoded_model))
+
+    def __set_sent_base(self, nei, base, reconstruct):
+        """
+        Save the model held by a neighbor after a transfer (as reconstructed by the neighbor), to be used as base of the
+        next delta. Models shared by several neighbors are reconstructed only once.
+
+        Args:
+            nei (str): Address of the neighbor.
+            base (str): Identifier of the model.
+            reconstruct (function): Function that returns the parameters of the model.
+        """
+        self.__delta_lock.acquire()
+        if base not in self.__base_models:
+            self.__base_models[base] = reconstruct()
+        self.__sent_bases[nei] = (base, self.round)
+        # Discard the models that are not the base of any neighbor
+        in_use = {b for b, _ in self.__sent_bases.values()}
+        self.__base_models = {b: params for b, params in self.__base_models.items() if b in in_use}
+        self.__delta_lock.release()
+
+    def __decode_model(self, request, weights, digest):
+        """
+        Decode the model of an add_model request. If it is a delta, the model is reconstructed from the base model
+        (the last model received from the same source). Full models already received (same payload digest) are taken
+        from the decoded model cache.
+
+        Args:
+            request (node_pb2.Weights): The request.
+            weights (bytes): Payload of the request (see BaseNode._get_model_payload).
+            digest (str): Digest of the payload (None for deltas).
+
+        Returns:
+            tuple: The parameters of the model (non-binary), or None if the base model is not held (or the learner does
+                not support delta encoding), and whether they were taken from the cache (already validated).
+        """
+        cached = False
+        if request.base:
+            self.__delta_lock.acquire()
+            received = self.__received_bases.get(request.source)
+            self.__delta_lock.release()
+            if received is None or received[0] != request.base:
+                logging.info(f"({self.addr}) add_model (gRPC) | Base model {request.base} (round {request.base_round}) from {request.source} not held")
+                return None, False
+            model = self.learner.apply_delta(received[1], self.learner.decode_parameters(weights))
+            if model is None:
+                # The learner does not support delta encoding (answered as base_missing, the full model is sent)
+                logging.info(f"({self.addr}) add_model (gRPC) | Delta from {request.source} not supported by the learner")
+                return None, False
+            base = payload_digest((request.base + payload_digest(weights)).encode())
+        else:
+            model = self.__decoded_models.get(digest) if self.__decoded_models.max_bytes > 0 else None
+            cached = model is not None
+            if model is None:
+                model = self.learner.decode_parameters(weights)
+            base = digest
+        if self.config.participant["DELTA_ENCODING"]:
+            self.__delta_lock.acquire()
+            self.__received_bases[request.source] = (base, model)
+            self.__delta_lock.release()
+        return model, cached
+
+    def __notify_state_change(self):
+        """
+        Wake up the loops waiting for a state change (see __wait_state_change).
+        """
+        self.__state_changed.acquire()
+        self.__state_version += 1
+        self.__state_changed.notify_all()
+        self.__state_changed.release()
+
+    def __wait_state_change(self, version, timeout):
+        """
+        Wait until the state changes or the timeout expires.
+
+        Args:
+            version (int): Value of __state_version read before checking the state (so changes made in between are
+                not missed).
+            timeout (float): Maximum time to wait (seconds).
+
+        Returns:
+            bool: True if the state changed, False if the timeout expired.
+        """
+        self.__state_changed.acquire()
+        changed = self.__state_changed.wait_for(lambda: self.__state_version != version, timeout=max(0, timeout))
+        self.__state_changed.release()
+        return changed
+
     def __gossip_model(
             self,
             candidate_condition,
             status_function,
             model_function
     ):
+        """
+        Gossip models to the neighbors that need them, every GOSSIP_MODELS_PERIOD seconds. Between iterations the loop
+        waits for state changes (models aggregated, status of the neighbors, neighbors added or removed), so it ends as
+        soon as no neighbor needs models. It also ends when the status of the neighbors does not change in
+        GOSSIP_EXIT_ON_X_EQUAL_ROUNDS iterations.
+
+        Args:
+            candidate_condition (function): Whether a neighbor needs models.
+            status_function (function): Status of a neighbor (compared between iterations).
+            model_function (function): Model to send to a neighbor (model, contributors, weight).
+        """
         period = self.config.participant["GOSSIP_MODELS_PERIOD"]
         # Initialize list with status of nodes in the last X iterations
         last_x_status = []
         j = 0
+        next_iteration = time.time()
 
         while True:
-            # Get time to calculate frequency
-            t = time.time()
+            version = self.__state_version
 
             # If the training has been interrupted, stop waiting
             if self.round is None:
@@ -1343,14 +1755,21 @@ class Node(BaseNode):
 
             # Get nodes which need models
             neis = [n for n in self.get_neighbors() if candidate_condition(n)]
-            logging.info(
-                f"({self.addr} Gossip | {neis} need models --> (node not in self.aggregator.get_aggregated_models()) and (node in self.__train_set)")
 
             # Determine end of gossip
             if not neis:
                 logging.info(f"({self.addr}) Gossip| Gossip finished. No more nodes need models.")
                 return
-            
+
+            # Woken up by a state change before the end of the period: only the end of the gossip is checked
+            t = time.time()
+            if t < next_iteration:
+                self.__wait_state_change(version, next_iteration - t)
+                continue
+            next_iteration = t + period
+
+            logging.info(
+                f"({self.addr} Gossip | {neis} need models --> (node not in self.aggregator.get_aggregated_models()) and (node in self.__train_set)")
             logging.info(f"({self.addr}) Gossip | last_x_status: {last_x_status} | j: {j}")
 
             # Save state of neighbors. If nodes are not responding gossip will stop
@@ -1370,27 +1789,28 @@ class Node(BaseNode):
                     )
                     return
 
-            # Select a random subset of neighbors
+            # Select a subset of neighbors (GOSSIP_TARGET_POLICY, random by default)
             samples = min(self.config.participant["GOSSIP_MODELS_PER_ROUND"], len(neis))
-            neis = random.sample(neis, samples)
+            neis = self._neighbors.select_targets(neis, samples)
             logging.info(f"({self.addr}) Gossip | Gossiping models to {neis}")
 
             # Generate and Send Model Partial Aggregations (model, node_contributors)
             for nei in neis:
+                # Version read before taking the model (if the model changes in between, it is not cached)
+                version = self.__model_version
                 model, contributors, weight = model_function(nei)
 
                 # Send Partial Aggregation
                 if model is not None:
                     logging.info(
                         f"({self.addr}) Gossip | Gossiping model to {nei} with contributors: {contributors} and weight: {weight}")
-                    encoded_model = self.learner.encode_parameters(params=model)
-                    self._neighbors.send_model(
-                        nei, self.round, encoded_model, contributors, weight
+                    # Queued in the outbox of the neighbor (a newer model of the same round replaces the unsent one)
+                    self._neighbors.queue_model(
+                        nei, self.round, functools.partial(self.__send_model, nei, model, contributors, weight, self.round, version, candidate_condition)
                     )
 
-            # Sleep to allow periodicity
-            sleep_time = max(0, period - (t - time.time()))
-            time.sleep(sleep_time)
+            # Wait for the next period (or a state change)
+            self.__wait_state_change(version, next_iteration - time.time())
 
 
 class MaliciousNode(Node):
@@ -0,0 +1,293 @@
+#
+# This file is part of the Fedstellar platform (see https://github.com/enriquetomasmb/fedstellar).
+# Copyright (c) 2023 Enrique Tomás Martínez Beltrán.
+#
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+
+class Outbox:
+    """
+    Outgoing queue of a neighbor. It has two priority classes, each one served by its own sender, so control
+    messages (beats, votes, gossip) never wait behind a model transfer, and a slow neighbor only delays its own sends:
+        - Messages: sent in batches of at most GOSSIP_MESSAGES_PER_PERIOD messages. If a batch is full, the next one
+          waits GOSSIP_PERIOD seconds. At most OUTBOX_MAX_MESSAGES messages are queued (the oldest ones are dropped),
+          and a message with a merge key (e.g. BEAT) replaces the queued message with the same key.
+        - Models: send functions queued with a key (the round). A newer model replaces the unsent one with the same
+          key, and at most OUTBOX_MAX_MODELS models are queued (the oldest ones are dropped).
+    The senders are daemon threads or, if an event loop is given (TRANSPORT: "aio"), tasks of the loop: messages are
+    sent by a coroutine, and the (blocking) model sends run in the default executor of the loop, so there are no
+    threads per neighbor.
+
+    Args:
+        self_addr (str): Address of the node itself.
+        nei (str): Address of the neighbor.
+        send_messages (callable): Function (nei, msgs) -> None that sends a list of messages to the neighbor (a
+            coroutine function if loop is given).
+        config (Config): Configuration of the node.
+        loop (asyncio.AbstractEventLoop): Event loop running the senders. None to use threads.
+    """
+
+    def __init__(self, self_addr, nei, send_messages, config, loop=None):
+        self.__self_addr = self_addr
+        self.__nei = nei
+        self.__send_messages = send_messages
+        self.__config = config
+        self.__loop = loop
+        self.__messages = deque()  # [key, node_pb2.Message]
+        self.__models = deque()  # [key, send function]
+        self.__in_flight = 0  # batches of messages being sent
+        self.__stopped = False
+        self.__cond = threading.Condition()
+        self.__wakeups = []  # asyncio.Event of each sender task (loop only)
+        self.__stats = {"messages": 0, "models": 0, "merged": 0, "dropped": 0}
+        if loop is None:
+            threading.Thread(target=self.__messages_sender, name=f"outbox-messages-{nei}", daemon=True).start()
+            threading.Thread(target=self.__models_sender, name=f"outbox-models-{nei}", daemon=True).start()
+        else:
+            loop.call_soon_threadsafe(self.__start_tasks)
+
+    def put_message(self, msg, key=None):
+        """
+        Queue a message.
+
+        Args:
+            msg (node_pb2.Message): Message to send.
+            key: Merge key. If a queued message has the same key, it is replaced.
+        """
+        self.__cond.acquire()
+        self.__put(self.__messages, key, msg, self.__config.participant["OUTBOX_MAX_MESSAGES"])
+        self.__cond.release()
+
+    def put_model(self, key, send):
+        """
+        Queue a model transfer.
+
+        Args:
+            key: Merge key (e.g. the round). If a queued model has the same key, it is replaced.
+            send (callable): Function that sends the model.
+        """
+        self.__cond.acquire()
+        self.__put(self.__models, key, send, self.__config.participant["OUTBOX_MAX_MODELS"])
+        self.__cond.release()
+
+    def __put(self, queue, key, item, max_depth):
+        # Lock must be held
+        if self.__stopped:
+            return
+        if key is not None:
+            for entry in queue:
+                if entry[0] == key:
+                    entry[1] = item
+                    self.__stats["merged"] += 1
+                    return
+        queue.append([key, item])
+        while len(queue) > max_depth:
+            queue.popleft()
+            self.__stats["dropped"] += 1
+        self.__notify()
+
+    def __notify(self):
+        # Lock must be held
+        self.__cond.notify_all()
+        for wakeup in self.__wakeups:
+            try:
+                self.__loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                pass  # loop closed
+
+    def flush(self, timeout):
+        """
+        Wait until the queued messages are sent (models are not waited for).
+
+        Args:
+            timeout (float): Maximum time to wait.
+
+        Returns:
+            bool: True if all the messages were sent.
+        """
+        self.__cond.acquire()
+        flushed = self.__cond.wait_for(lambda: self.__stopped or (not self.__messages and self.__in_flight == 0), timeout)
+        self.__cond.release()
+        return flushed
+
+    def stop(self):
+        """
+        Discard the queued sends and stop the senders (sends in progress are finished).
+        """
+        self.__cond.acquire()
+        self.__stopped = True
+        self.__messages.clear()
+        self.__models.clear()
+        self.__notify()
+        self.__cond.release()
+
+    def __len__(self):
+        return len(self.__messages) + len(self.__models)
+
+    def pending_models(self):
+        """
+        Returns:
+            int: Number of queued models.
+        """
+        return len(self.__models)
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: Messages and models sent, merged and dropped, and sends pending.
+        """
+        self.__cond.acquire()
+        stats = dict(self.__stats, pending=len(self))
+        self.__cond.release()
+        return stats
+
+    ####
+    # Senders
+    ####
+
+    def __take_messages(self, next_batch):
+        """
+        Take the next batch of messages (lock must be held).
+
+        Returns:
+            tuple: Messages (None if there is no batch to send yet) and time to wait before the next batch (None to
+                wait until a message is queued).
+        """
+        if self.__messages and time.time() >= next_batch:
+            count = min(self.__config.participant["GOSSIP_MESSAGES_PER_PERIOD"], len(self.__messages))
+            self.__in_flight += 1
+            return [self.__messages.popleft()[1] for _ in range(count)], None
+        return None, max(0, next_batch - time.time()) if self.__messages else None
+
+    def __messages_done(self, msgs, sent):
+        self.__cond.acquire()
+        self.__in_flight -= 1
+        if sent:
+            self.__stats["messages"] += len(msgs)
+        self.__notify()
+        self.__cond.release()
+
+    def __model_done(self, sent):
+        if sent:
+            self.__cond.acquire()
+            self.__stats["models"] += 1
+            self.__cond.release()
+
+    def __next_batch(self, msgs):
+        # A full batch delays the next one a period
+        if len(msgs) == self.__config.participant["GOSSIP_MESSAGES_PER_PERIOD"]:
+            return time.time() + self.__config.participant["GOSSIP_PERIOD"]
+        return 0
+
+    def __messages_sender(self):
+        next_batch = 0
+        while True:
+            self.__cond.acquire()
+            while True:
+                if self.__stopped:
+                    self.__cond.release()
+                    return
+                msgs, timeout = self.__take_messages(next_batch)
+                if msgs is not None:
+                    break
+                self.__cond.wait(timeout)
+            self.__cond.release()
+
+            next_batch = self.__next_batch(msgs)
+            sent = False
+            try:
+                self.__send_messages(self.__nei, msgs)
+                sent = True
+            except Exception as e:
+                logging.info(f"({self.__self_addr}) Outbox | Cannot send messages to {self.__nei}: {e}")
+            self.__messages_done(msgs, sent)
+
+    def __models_sender(self):
+        while True:
+            self.__cond.acquire()
+            while not self.__stopped and not self.__models:
+                self.__cond.wait()
+            if self.__stopped:
+                self.__cond.release()
+                return
+            _, send = self.__models.popleft()
+            self.__cond.release()
+
+            sent = False
+            try:
+                send()
+                sent = True
+            except Exception as e:
+                logging.info(f"({self.__self_addr}) Outbox | Cannot send model to {self.__nei}: {e}")
+            self.__model_done(sent)
+
+    def __start_tasks(self):
+        self.__loop.create_task(self.__messages_task())
+        self.__loop.create_task(self.__models_task())
+
+    async def __wait(self, wakeup, timeout):
+        try:
+            await asyncio.wait_for(wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def __messages_task(self):
+        wakeup = asyncio.Event()
+        self.__cond.acquire()
+        self.__wakeups.append(wakeup)
+        self.__cond.release()
+        next_batch = 0
+        while True:
+            # The lock is never held while awaiting (the event is cleared with the lock held, so no wakeup is lost)
+            self.__cond.acquire()
+            stopped = self.__stopped
+            msgs, timeout = (None, None) if stopped else self.__take_messages(next_batch)
+            if msgs is None:
+                wakeup.clear()
+            self.__cond.release()
+            if stopped:
+                return
+            if msgs is None:
+                await self.__wait(wakeup, timeout)
+                continue
+
+            next_batch = self.__next_batch(msgs)
+            sent = False
+            try:
+                await self.__send_messages(self.__nei, msgs)
+                sent = True
+            except Exception as e:
+                logging.info(f"({self.__self_addr}) Outbox | Cannot send messages to {self.__nei}: {e}")
+            self.__messages_done(msgs, sent)
+
+    async def __models_task(self):
+        wakeup = asyncio.Event()
+        self.__cond.acquire()
+        self.__wakeups.append(wakeup)
+        self.__cond.release()
+        while True:
+            self.__cond.acquire()
+            stopped = self.__stopped
+            send = self.__models.popleft()[1] if not stopped and self.__models else None
+            if send is None:
+                wakeup.clear()
+            self.__cond.release()
+            if stopped:
+                return
+            if send is None:
+                await self.__wait(wakeup, None)
+                continue
+
+            # Model sends are blocking (encoding, RPCs waiting for the loop): run them in the executor of the loop
+            sent = False
+            try:
+                await self.__loop.run_in_executor(None, send)
+                sent = True
+            except Exception as e:
+                logging.info(f"({self.__self_addr}) Outbox | Cannot send model to {self.__nei}: {e}")
+            self.__model_done(sent)
@@ -15,21 +15,35 @@ _sym_db = _symbol_database.Default()
 from google.protobuf import empty_pb2 as google_dot_protobuf_dot_empty__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nnode.proto\x12\x04node\x1a\x1bgoogle/protobuf/empty.proto\"m\n\x07Message\x12\x0e\n\x06source\x18\x01 \x01(\t\x12\x0b\n\x03ttl\x18\x02 \x01(\x05\x12\x0c\n\x04hash\x18\x03 \x01(\x03\x12\x0b\n\x03\x63md\x18\x04 \x01(\t\x12\x0c\n\x04\x61rgs\x18\x05 \x03(\t\x12\x12\n\x05round\x18\x06 \x01(\x05H\x00\x88\x01\x01\x42\x08\n\x06_round\"_\n\x07Weights\x12\x0e\n\x06source\x18\x01 \x01(\t\x12\r\n\x05round\x18\x02 \x01(\x05\x12\x0f\n\x07weights\x18\x03 \x01(\x0c\x12\x14\n\x0c\x63ontributors\x18\x04 \x03(\t\x12\x0e\n\x06weight\x18\x05 \x01(\x03\" \n\x10HandShakeRequest\x12\x0c\n\x04\x61\x64\x64r\x18\x01 \x01(\t\"/\n\x0fResponseMessage\x12\x12\n\x05\x65rror\x18\x01 \x01(\tH\x00\x88\x01\x01\x42\x08\n\x06_error2\xf1\x01\n\x0cNodeServices\x12:\n\thandshake\x12\x16.node.HandShakeRequest\x1a\x15.node.ResponseMessage\x12<\n\ndisconnect\x12\x16.node.HandShakeRequest\x1a\x16.google.protobuf.Empty\x12\x34\n\x0csend_message\x12\r.node.Message\x1a\x15.node.ResponseMessage\x12\x31\n\tadd_model\x12\r.node.Weights\x1a\x15.node.ResponseMessageb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nnode.proto\x12\x04node\x1a\x1bgoogle/protobuf/empty.proto\"m\n\x07Message\x12\x0e\n\x06source\x18\x01 \x01(\t\x12\x0b\n\x03ttl\x18\x02 \x01(\x05\x12\x0c\n\x04hash\x18\x03 \x01(\x03\x12\x0b\n\x03\x63md\x18\x04 \x01(\t\x12\x0c\n\x04\x61rgs\x18\x05 \x03(\t\x12\x12\n\x05round\x18\x06 \x01(\x05H\x00\x88\x01\x01\x42\x08\n\x06_round\"/\n\x0cMessageBatch\x12\x1f\n\x08messages\x18\x01 \x03(\x0b\x32\r.node.Message\"\x9e\x01\n\x07Weights\x12\x0e\n\x06source\x18\x01 \x01(\t\x12\r\n\x05round\x18\x02 \x01(\x05\x12\x0f\n\x07weights\x18\x03 \x01(\x0c\x12\x14\n\x0c\x63ontributors\x18\x04 \x03(\t\x12\x0e\n\x06weight\x18\x05 \x01(\x03\x12\x0c\n\x04\x62\x61se\x18\x06 \x01(\t\x12\x12\n\nbase_round\x18\x07 \x01(\x05\x12\x0b\n\x03shm\x18\x08 \x01(\t\x12\x0e\n\x06\x64igest\x18\t \x01(\t\"\x9a\x01\n\rWeightsHeader\x12\x0e\n\x06source\x18\x01 \x01(\t\x12\r\n\x05round\x18\x02 \x01(\x05\x12\x14\n\x0c\x63ontributors\x18\x03 \x03(\t\x12\x0e\n\x06weight\x18\x04 \x01(\x03\x12\x12\n\ntotal_size\x18\x05 \x01(\x03\x12\x0e\n\x06\x64igest\x18\x06 \x01(\t\x12\x0c\n\x04\x62\x61se\x18\x07 \x01(\t\x12\x12\n\nbase_round\x18\x08 \x01(\x05\"Q\n\x0cWeightsChunk\x12%\n\x06header\x18\x01 \x01(\x0b\x32\x13.node.WeightsHeaderH\x00\x12\x0f\n\x05\x63hunk\x18\x02 \x01(\x0cH\x00\x42\t\n\x07\x63ontent\"A\n\x10HandShakeRequest\x12\x0c\n\x04\x61\x64\x64r\x18\x01 \x01(\t\x12\x0e\n\x06\x63odecs\x18\x02 \x03(\t\x12\x0f\n\x07host_id\x18\x03 \x01(\t\"S\n\x0cMemberUpdate\x12\x0c\n\x04\x61\x64\x64r\x18\x01 \x01(\t\x12\x13\n\x0bincarnation\x18\x02 \x01(\x03\x12 \n\x05state\x18\x03 \x01(\x0e\x32\x11.node.MemberState\"a\n\x0cProbeRequest\x12\x0e\n\x06source\x18\x01 \x01(\t\x12\x0e\n\x06target\x18\x02 \x01(\t\x12\x0c\n\x04sync\x18\x03 \x01(\x08\x12#\n\x07updates\x18\x04 \x03(\x0b\x32\x12.node.MemberUpdate\"A\n\rProbeResponse\x12\x0b\n\x03\x61\x63k\x18\x01 \x01(\x08\x12#\n\x07updates\x18\x02 \x03(\x0b\x32\x12.node.MemberUpdate\"\x95\x02\n\x0fResponseMessage\x12\x12\n\x05\x65rror\x18\x01 \x01(\tH\x00\x88\x01\x01\x12\x12\n\x05\x63odec\x18\x02 \x01(\tH\x01\x88\x01\x01\x12\x19\n\x0c\x62\x61se_missing\x18\x03 \x01(\x08H\x02\x88\x01\x01\x12\x14\n\x07host_id\x18\x04 \x01(\tH\x03\x88\x01\x01\x12\x18\n\x0bshm_missing\x18\x05 \x01(\x08H\x04\x88\x01\x01\x12\x17\n\nhave_model\x18\x06 \x01(\x08H\x05\x88\x01\x01\x12\x17\n\nnot_needed\x18\x07 \x01(\x08H\x06\x88\x01\x01\x42\x08\n\x06_errorB\x08\n\x06_codecB\x0f\n\r_base_missingB\n\n\x08_host_idB\x0e\n\x0c_shm_missingB\r\n\x0b_have_modelB\r\n\x0b_not_needed*/\n\x0bMemberState\x12\t\n\x05\x41LIVE\x10\x00\x12\x0b\n\x07SUSPECT\x10\x01\x12\x08\n\x04\x44\x45\x41\x44\x10\x02\x32\xdb\x03\n\x0cNodeServices\x12:\n\thandshake\x12\x16.node.HandShakeRequest\x1a\x15.node.ResponseMessage\x12<\n\ndisconnect\x12\x16.node.HandShakeRequest\x1a\x16.google.protobuf.Empty\x12\x34\n\x0csend_message\x12\r.node.Message\x1a\x15.node.ResponseMessage\x12:\n\rsend_messages\x12\x12.node.MessageBatch\x1a\x15.node.ResponseMessage\x12\x31\n\tadd_model\x12\r.node.Weights\x1a\x15.node.ResponseMessage\x12?\n\x10\x61\x64\x64_model_stream\x12\x12.node.WeightsChunk\x1a\x15.node.ResponseMessage(\x01\x12\x39\n\x0boffer_model\x12\x13.node.WeightsHeader\x1a\x15.node.ResponseMessage\x12\x30\n\x05probe\x12\x12.node.ProbeRequest\x1a\x13.node.ProbeResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'node_pb2', _globals)
 if _descriptor._USE_C_DESCRIPTORS == False:
   DESCRIPTOR._options = None
+  _globals['_MEMBERSTATE']._serialized_start=1208
+  _globals['_MEMBERSTATE']._serialized_end=1255
   _globals['_MESSAGE']._serialized_start=49
   _globals['_MESSAGE']._serialized_end=158
-  _globals['_WEIGHTS']._serialized_start=160
-  _globals['_WEIGHTS']._serialized_end=255
-  _globals['_HANDSHAKEREQUEST']._serialized_start=257
-  _globals['_HANDSHAKEREQUEST']._serialized_end=289
-  _globals['_RESPONSEMESSAGE']._serialized_start=291
-  _globals['_RESPONSEMESSAGE']._serialized_end=338
-  _globals['_NODESERVICES']._serialized_start=341
-  _globals['_NODESERVICES']._serialized_end=582
+  _globals['_MESSAGEBATCH']._serialized_start=160
+  _globals['_MESSAGEBATCH']._serialized_end=207
+  _globals['_WEIGHTS']._serialized_start=210
+  _globals['_WEIGHTS']._serialized_end=368
+  _globals['_WEIGHTSHEADER']._serialized_start=371
+  _globals['_WEIGHTSHEADER']._serialized_end=525
+  _globals['_WEIGHTSCHUNK']._serialized_start=527
+  _globals['_WEIGHTSCHUNK']._serialized_end=608
+  _globals['_HANDSHAKEREQUEST']._serialized_start=610
+  _globals['_HANDSHAKEREQUEST']._serialized_end=675
+  _globals['_MEMBERUPDATE']._serialized_start=677
+  _globals['_MEMBERUPDATE']._serialized_end=760
+  _globals['_PROBEREQUEST']._serialized_start=762
+  _globals['_PROBEREQUEST']._serialized_end=859
+  _globals['_PROBERESPONSE']._serialized_start=861
+  _globals['_PROBERESPONSE']._serialized_end=926
+  _globals['_RESPONSEMESSAGE']._serialized_start=929
+  _globals['_RESPONSEMESSAGE']._serialized_end=1206
+  _globals['_NODESERVICES']._serialized_start=1258
+  _globals['_NODESERVICES']._serialized_end=1733
 # @@protoc_insertion_point(module_scope)
@@ -30,11 +30,31 @@ class NodeServicesStub(object):
                 request_serializer=node__pb2.Message.SerializeToString,
                 response_deserializer=node__pb2.ResponseMessage.FromString,
                 )
+        self.send_messages = channel.unary_unary(
+                '/node.NodeServices/send_messages',
+                request_serializer=node__pb2.MessageBatch.SerializeToString,
+                response_deserializer=node__pb2.ResponseMessage.FromString,
+                )
         self.add_model = channel.unary_unary(
                 '/node.NodeServices/add_model',
                 request_serializer=node__pb2.Weights.SerializeToString,
                 response_deserializer=node__pb2.ResponseMessage.FromString,
                 )
+        self.add_model_stream = channel.stream_unary(
+                '/node.NodeServices/add_model_stream',
+                request_serializer=node__pb2.WeightsChunk.SerializeToString,
+                response_deserializer=node__pb2.ResponseMessage.FromString,
+                )
+        self.offer_model = channel.unary_unary(
+                '/node.NodeServices/offer_model',
+                request_serializer=node__pb2.WeightsHeader.SerializeToString,
+                response_deserializer=node__pb2.ResponseMessage.FromString,
+                )
+        self.probe = channel.unary_unary(
+                '/node.NodeServices/probe',
+                request_serializer=node__pb2.ProbeRequest.SerializeToString,
+                response_deserializer=node__pb2.ProbeResponse.FromString,
+                )
 
 
 class NodeServicesServicer(object):
@@ -58,12 +78,36 @@ class NodeServicesServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def send_messages(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def add_model(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def add_model_stream(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def offer_model(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def probe(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_NodeServicesServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -82,11 +126,31 @@ def add_NodeServicesServicer_to_server(servicer, server):
                     request_deserializer=node__pb2.Message.FromString,
                     response_serializer=node__pb2.ResponseMessage.SerializeToString,
             ),
+            'send_messages': grpc.unary_unary_rpc_method_handler(
+                    servicer.send_messages,
+                    request_deserializer=node__pb2.MessageBatch.FromString,
+                    response_serializer=node__pb2.ResponseMessage.SerializeToString,
+            ),
             'add_model': grpc.unary_unary_rpc_method_handler(
                     servicer.add_model,
                     request_deserializer=node__pb2.Weights.FromString,
                     response_serializer=node__pb2.ResponseMessage.SerializeToString,
             ),
+            'add_model_stream': grpc.stream_unary_rpc_method_handler(
+                    servicer.add_model_stream,
+                    request_deserializer=node__pb2.WeightsChunk.FromString,
+                    response_serializer=node__pb2.ResponseMessage.SerializeToString,
+            ),
+            'offer_model': grpc.unary_unary_rpc_method_handler(
+                    servicer.offer_model,
+                    request_deserializer=node__pb2.WeightsHeader.FromString,
+                    response_serializer=node__pb2.ResponseMessage.SerializeToString,
+            ),
+            'probe': grpc.unary_unary_rpc_method_handler(
+                    servicer.probe,
+                    request_deserializer=node__pb2.ProbeRequest.FromString,
+                    response_serializer=node__pb2.ProbeResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'node.NodeServices', rpc_method_handlers)
@@ -148,6 +212,23 @@ class NodeServices(object):
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
 
+    @staticmethod
+    def send_messages(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/node.NodeServices/send_messages',
+            node__pb2.MessageBatch.SerializeToString,
+            node__pb2.ResponseMessage.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
     @staticmethod
     def add_model(request,
             target,
@@ -164,3 +245,54 @@ class NodeServices(object):
             node__pb2.ResponseMessage.FromString,
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def add_model_stream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(request_iterator, target, '/node.NodeServices/add_model_stream',
+            node__pb2.WeightsChunk.SerializeToString,
+            node__pb2.ResponseMessage.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def offer_model(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/node.NodeServices/offer_model',
+            node__pb2.WeightsHeader.SerializeToString,
+            node__pb2.ResponseMessage.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def probe(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/node.NodeServices/probe',
+            node__pb2.ProbeRequest.SerializeToString,
+            node__pb2.ProbeResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
@@ -0,0 +1,189 @@
+#
+# This file is part of the Fedstellar platform (see https://github.com/enriquetomasmb/fedstellar).
+# Copyright (c) 2023 Enrique Tomás Martínez Beltrán.
+#
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class ChannelPool:
+    """
+    Pool of reusable channels (and stubs) to nodes that are not direct neighbors, keyed by address.
+    Channels idle for more than ttl seconds are closed (see expire), and the least recently used idle channel is
+    closed when the pool exceeds its capacity. Channels in use are never closed by the pool.
+    Hit (reused channel), miss (new channel) and eviction counters are kept to tune the pool.
+
+    Args:
+        connect (callable): Function addr -> (channel, stub) that creates a channel.
+        close (callable): Function (channel, stub) -> None that closes a channel.
+        capacity (int): Maximum number of channels.
+        ttl (float): Idle time (seconds) after which a channel is closed.
+    """
+
+    def __init__(self, connect, close, capacity, ttl):
+        self.capacity = max(1, int(capacity))
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__connect = connect
+        self.__close = close
+        self.__channels = OrderedDict()  # addr -> [channel, stub, users, time of last use] (LRU order)
+        self.__detached = {}  # channel -> entry of the channels removed while in use
+        self.__lock = threading.Lock()
+
+    def acquire(self, addr):
+        """
+        Get the channel to a node, creating it if there is none. It must be released after use (see release).
+
+        Args:
+            addr (str): Address of the node.
+
+        Returns:
+            tuple: (channel, stub).
+        """
+        self.__lock.acquire()
+        entry = self.__channels.get(addr)
+        if entry is not None:
+            self.hits += 1
+            entry[2] += 1
+            self.__channels.move_to_end(addr)
+            self.__lock.release()
+            return entry[0], entry[1]
+        self.misses += 1
+        self.__lock.release()
+
+        # Connect without holding the lock
+        channel, stub = self.__connect(addr)
+        self.__lock.acquire()
+        entry = self.__channels.get(addr)
+        if entry is not None:
+            # Another thread connected meanwhile, use its channel
+            entry[2] += 1
+            self.__channels.move_to_end(addr)
+            self.__lock.release()
+            self.__close(channel, stub)
+            return entry[0], entry[1]
+        self.__channels[addr] = [channel, stub, 1, time.time()]
+        evicted = self.__evict_lru()
+        self.__lock.release()
+        self.__close_all(evicted)
+        return channel, stub
+
+    def release(self, addr, channel, discard=False):
+        """
+        Release a channel obtained with acquire.
+
+        Args:
+            addr (str): Address of the node.
+            channel: Channel returned by acquire.
+            discard (bool): If True, close the channel once unused (e.g. after an error). New calls get a new channel.
+        """
+        self.__lock.acquire()
+        evicted = []
+        entry = self.__channels.get(addr)
+        if entry is not None and entry[0] is channel:
+            entry[2] -= 1
+            entry[3] = time.time()
+            if discard:
+                entry = self.__detach(addr)
+                evicted = [entry] if entry is not None else []
+            else:
+                evicted = self.__evict_lru()
+        else:
+            # Removed while in use, close it when unused
+            entry = self.__detached.get(channel)
+            if entry is not None:
+                entry[2] -= 1
+                if entry[2] <= 0:
+                    evicted.append(self.__detached.pop(channel))
+        self.__lock.release()
+        self.__close_all(evicted)
+
+    def remove(self, addr):
+        """
+        Close the channel to a node (e.g. when the node is removed). If in use, it is closed when released.
+
+        Args:
+            addr (str): Address of the node.
+        """
+        self.__lock.acquire()
+        entry = self.__detach(addr)
+        self.__lock.release()
+        if entry is not None:
+            self.__close_all([entry])
+
+    def __detach(self, addr):
+        """
+        Remove a channel from the pool (lock must be held).
+
+        Returns:
+            list: Entry of the channel if it must be closed now (unused), None otherwise.
+        """
+        entry = self.__channels.pop(addr, None)
+        if entry is None:
+            return None
+        if entry[2] > 0:
+            self.__detached[entry[0]] = entry
+            return None
+        return entry
+
+    def expire(self):
+        """
+        Close the channels idle for more than ttl seconds.
+        """
+        t = time.time()
+        self.__lock.acquire()
+        expired = [addr for addr, entry in self.__channels.items() if entry[2] <= 0 and t - entry[3] > self.ttl]
+        evicted = [self.__channels.pop(addr) for addr in expired]
+        self.evictions += len(evicted)
+        self.__lock.release()
+        self.__close_all(evicted)
+
+    def clear(self):
+        """
+        Close all the channels.
+        """
+        self.__lock.acquire()
+        evicted = list(self.__channels.values())
+        self.__channels.clear()
+        self.__lock.release()
+        self.__close_all(evicted)
+
+    def __evict_lru(self):
+        # Lock must be held
+        evicted = []
+        for addr in list(self.__channels.keys()):
+            if len(self.__channels) <= self.capacity:
+                break
+            if self.__channels[addr][2] <= 0:
+                evicted.append(self.__channels.pop(addr))
+        self.evictions += len(evicted)
+        return evicted
+
+    def __close_all(self, entries):
+        for entry in entries:
+            self.__close(entry[0], entry[1])
+
+    def __contains__(self, addr):
+        return addr in self.__channels
+
+    def __len__(self):
+        return len(self.__channels)
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: Capacity, current size, hits, misses, evictions and hit ratio of the pool.
+        """
+        total = self.hits + self.misses
+        return {
+            "capacity": self.capacity,
+            "size": len(self.__channels),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total > 0 else 0.0,
+        }
@@ -0,0 +1,71 @@
+#
+# This file is part of the Fedstellar platform (see https://github.com/enriquetomasmb/fedstellar).
+# Copyright (c) 2023 Enrique Tomás Martínez Beltrán.
+#
+
+import threading
+
+
+class DeduplicationIndex:
+    """
+    Bounded index of the last processed message hashes (hash set + ring buffer).
+    Insertion, lookup and eviction of the oldest hash are O(1). Hit (duplicated) and miss (new) counters are kept
+    to tune the window size (AMOUNT_LAST_MESSAGES_SAVED).
+
+    Args:
+        capacity (int): Number of hashes to remember.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = max(1, int(capacity))
+        self.hits = 0
+        self.misses = 0
+        self.__ring = [None] * self.capacity
+        self.__position = 0
+        self.__hashes = set()
+        self.__lock = threading.Lock()
+
+    def add(self, msg_hash):
+        """
+        Add a message hash to the index. If the index is full, the oldest hash is evicted.
+
+        Args:
+            msg_hash (int): Hash of the message.
+
+        Returns:
+            bool: True if the hash was added, False if it was already in the index.
+        """
+        self.__lock.acquire()
+        if msg_hash in self.__hashes:
+            self.hits += 1
+            self.__lock.release()
+            return False
+        self.misses += 1
+        oldest = self.__ring[self.__position]
+        if oldest is not None:
+            self.__hashes.discard(oldest)
+        self.__ring[self.__position] = msg_hash
+        self.__hashes.add(msg_hash)
+        self.__position = (self.__position + 1) % self.capacity
+        self.__lock.release()
+        return True
+
+    def __contains__(self, msg_hash):
+        return msg_hash in self.__hashes
+
+    def __len__(self):
+        return len(self.__hashes)
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: Capacity, current size, hits, misses and hit ratio of the index.
+        """
+        total = self.hits + self.misses
+        return {
+            "capacity": self.capacity,
+            "size": len(self.__hashes),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total > 0 else 0.0,
+        }
@@ -0,0 +1,115 @@
+#
+# This file is part of the Fedstellar platform (see https://github.com/enriquetomasmb/fedstellar).
+# Copyright (c) 2023 Enrique Tomás Martínez Beltrán.
+#
+
+import json
+import struct
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+import torch
+
+###########################
+#   Flat weight format    #
+###########################
+#
+# MAGIC | header length (uint32, little endian) | header (JSON) | padding | data region
+#
+# The header lists, for each array, its name, kind (torch/numpy), dtype, shape and offset in the data region, plus
+# extra JSON metadata (e.g. non-array values or codec information). Arrays are stored contiguously, each one aligned to
+# ALIGNMENT bytes. Decoding creates views (torch.frombuffer / np.frombuffer) over the received bytes, without per-array
+# copies and without unpickling. The views are read-only: they must not be modified in place.
+
+MAGIC = b"FSTF"
+ALIGNMENT = 64
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def is_flat(data):
+    """
+    Returns:
+        bool: True if the payload uses the flat format.
+    """
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def pack(arrays, meta=None):
+    """
+    Serialize arrays (torch tensors or numpy arrays) in the flat format.
+
+    Args:
+        arrays (dict): Arrays by name (in order).
+        meta (dict): Extra metadata (JSON serializable).
+
+    Returns:
+        bytes: Serialized arrays.
+    """
+    entries = []
+    chunks = []
+    offset = 0
+    for name, array in arrays.items():
+        if isinstance(array, torch.Tensor):
+            tensor = array.detach().cpu().contiguous()
+            raw = tensor.reshape(-1).view(torch.uint8).numpy() if tensor.numel() > 0 else b""
+            entry = {"name": name, "kind": "torch", "dtype": str(tensor.dtype).replace("torch.", ""), "shape": list(tensor.shape)}
+        else:
+            array = np.ascontiguousarray(array)
+            raw = array.reshape(-1).view(np.uint8) if array.size > 0 else b""
+            entry = {"name": name, "kind": "numpy", "dtype": array.dtype.str, "shape": list(array.shape)}
+        aligned = _align(offset)
+        if aligned > offset:
+            chunks.append(bytes(aligned - offset))
+        entry["offset"] = aligned
+        entries.append(entry)
+        chunks.append(raw)
+        offset = aligned + len(raw)
+
+    header = json.dumps({"arrays": entries, "meta": meta or {}}).encode()
+    prefix = MAGIC + struct.pack("<I", len(header)) + header
+    padding = bytes(_align(len(prefix)) - len(prefix))
+    return b"".join([prefix, padding] + chunks)
+
+
+def unpack(data):
+    """
+    Deserialize arrays serialized with pack (views over data).
+
+    Args:
+        data (bytes): Serialized arrays.
+
+    Returns:
+        tuple: Arrays by name (OrderedDict) and metadata (dict).
+
+    Raises:
+        ValueError: If the payload is not in the flat format.
+    """
+    if not is_flat(data):
+        raise ValueError("Payload is not in the flat format")
+    (length,) = struct.unpack_from("<I", data, len(MAGIC))
+    start = len(MAGIC) + 4
+    header = json.loads(bytes(data[start:start + length]))
+    base = _align(start + length)
+
+    arrays = OrderedDict()
+    for entry in header["arrays"]:
+        shape = tuple(entry["shape"])
+        offset = base + entry["offset"]
+        if entry["kind"] == "torch":
+            dtype = getattr(torch, entry["dtype"])
+            numel = int(np.prod(shape))
+            if numel == 0:
+                arrays[entry["name"]] = torch.empty(shape, dtype=dtype)
+                continue
+            with warnings.catch_warnings():
+                # bytes are not writable, the tensors are read-only views
+                warnings.simplefilter("ignore", UserWarning)
+                arrays[entry["name"]] = torch.frombuffer(data, dtype=dtype, count=numel, offset=offset).view(shape)
+        else:
+            dtype = np.dtype(entry["dtype"])
+            arrays[entry["name"]] = np.frombuffer(data, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+    return arrays, header["meta"]
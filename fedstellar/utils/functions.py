@@ -1,3 +1,4 @@
+import hashlib
 import logging
 
 def print_msg_box(msg, indent=1, width=None, title=None):
@@ -18,3 +19,8 @@ def print_msg_box(msg, indent=1, width=None, title=None):
     box += ''.join([f'║{space}{line:<{width}}{space}║\n' for line in lines])
     box += f'╚{"═" * (width + indent * 2)}╝'  # lower_border
     logging.info(box)
+
+
+def payload_digest(data):
+    """Digest of a serialized payload (used to verify and identify model transfers)."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
@@ -0,0 +1,155 @@
+#
+# This file is part of the Fedstellar platform (see https://github.com/enriquetomasmb/fedstellar).
+# Copyright (c) 2023 Enrique Tomás Martínez Beltrán.
+#
+
+import random
+import threading
+
+TARGET_POLICIES = ["random", "fastest", "weighted", "eft"]
+
+
+class LinkStats:
+    """
+    Rolling estimates (exponentially weighted moving averages) of the round-trip time and the throughput of the link
+    with each neighbor, used to choose the gossip targets:
+        - random: uniform random sample (link quality is ignored).
+        - fastest: neighbors with the highest throughput.
+        - weighted: random sample weighted by throughput.
+        - eft: earliest finish time, i.e. the lowest estimated time to transfer a model (RTT + model size /
+          throughput, including the models already queued to the neighbor).
+    Neighbors without estimates are preferred by fastest and eft (so they get measured), and get the mean weight in
+    weighted.
+
+    Args:
+        alpha (float): Weight of the new samples in the averages (0, 1].
+    """
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.model_size = None  # size (bytes) of the last model sent
+        self.__rtt = {}
+        self.__throughput = {}
+        self.__lock = threading.Lock()
+
+    def __update(self, estimates, nei, sample):
+        # Lock must be held
+        previous = estimates.get(nei)
+        estimates[nei] = sample if previous is None else (1 - self.alpha) * previous + self.alpha * sample
+
+    def add_rtt(self, nei, seconds):
+        """
+        Add a round-trip time sample (e.g. a control message).
+
+        Args:
+            nei (str): Address of the neighbor.
+            seconds (float): Duration of the call.
+        """
+        self.__lock.acquire()
+        self.__update(self.__rtt, nei, seconds)
+        self.__lock.release()
+
+    def add_transfer(self, nei, nbytes, seconds):
+        """
+        Add a throughput sample (e.g. a model transfer).
+
+        Args:
+            nei (str): Address of the neighbor.
+            nbytes (int): Bytes transferred.
+            seconds (float): Duration of the transfer.
+        """
+        if seconds <= 0:
+            return
+        self.__lock.acquire()
+        self.model_size = nbytes
+        self.__update(self.__throughput, nei, nbytes / seconds)
+        self.__lock.release()
+
+    def remove(self, nei):
+        """
+        Discard the estimates of a neighbor.
+
+        Args:
+            nei (str): Address of the neighbor.
+        """
+        self.__lock.acquire()
+        self.__rtt.pop(nei, None)
+        self.__throughput.pop(nei, None)
+        self.__lock.release()
+
+    def get(self, nei):
+        """
+        Returns:
+            tuple: RTT (seconds) and throughput (bytes/s) estimates of a neighbor (None if unknown).
+        """
+        return self.__rtt.get(nei), self.__throughput.get(nei)
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: RTT and throughput estimates of each neighbor.
+        """
+        self.__lock.acquire()
+        stats = {nei: {"rtt": rtt, "throughput": self.__throughput.get(nei)} for nei, rtt in self.__rtt.items()}
+        for nei, throughput in self.__throughput.items():
+            stats.setdefault(nei, {"rtt": None, "throughput": throughput})
+        self.__lock.release()
+        return stats
+
+    def transfer_time(self, nei, queued=0):
+        """
+        Estimate the time to transfer a model to a neighbor.
+
+        Args:
+            nei (str): Address of the neighbor.
+            queued (int): Models already queued to the neighbor.
+
+        Returns:
+            float: Estimated time (seconds), None if unknown.
+        """
+        rtt, throughput = self.get(nei)
+        if throughput is None or self.model_size is None:
+            return None
+        return (rtt or 0) + (queued + 1) * self.model_size / throughput
+
+    def select(self, neis, k, policy="random", queued=None):
+        """
+        Select gossip targets.
+
+        Args:
+            neis (list): Candidate neighbors.
+            k (int): Number of targets.
+            policy (str): Selection policy (see TARGET_POLICIES).
+            queued (dict): Models already queued to each neighbor (eft).
+
+        Returns:
+            list: Selected neighbors.
+        """
+        k = min(k, len(neis))
+        if policy == "random" or k == len(neis):
+            return random.sample(neis, k)
+        queued = queued or {}
+
+        if policy == "fastest":
+            # Unknown first, then by throughput (ties broken randomly)
+            key = lambda n: (self.__throughput.get(n) is not None, -(self.__throughput.get(n) or 0), random.random())
+            return sorted(neis, key=key)[:k]
+
+        if policy == "eft":
+            times = {n: self.transfer_time(n, queued.get(n, 0)) for n in neis}
+            key = lambda n: (times[n] is not None, times[n] or 0, random.random())
+            return sorted(neis, key=key)[:k]
+
+        if policy == "weighted":
+            known = [self.__throughput[n] for n in neis if n in self.__throughput]
+            default = sum(known) / len(known) if known else 1.0
+            weights = {n: self.__throughput.get(n, default) for n in neis}
+            selected = []
+            candidates = list(neis)
+            for _ in range(k):
+                nei = random.choices(candidates, weights=[weights[n] for n in candidates])[0]
+                candidates.remove(nei)
+                selected.append(nei)
+            return selected
+
+        raise ValueError(f"Unknown gossip target policy {policy}")
@@ -0,0 +1,101 @@
+#
+# This file is part of the Fedstellar platform (see https://github.com/enriquetomasmb/fedstellar).
+# Copyright (c) 2023 Enrique Tomás Martínez Beltrán.
+#
+
+import threading
+from collections import OrderedDict
+
+
+class DecodedModelCache:
+    """
+    LRU cache of decoded (and validated) models, keyed by the digest of their payload. Byte-identical models received
+    several times (e.g. the aggregated model during diffusion) are decoded and checked once. The size of an entry is
+    the size of its payload, and the least recently used entries are evicted when the total exceeds max_bytes. Hit and
+    miss counters are kept to report the hit ratio.
+
+    Cached models are shared by every reception of the payload, so they must not be modified in place.
+
+    Args:
+        max_bytes (int): Maximum total size of the cached payloads (0 disables the cache).
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max(0, int(max_bytes))
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()  # digest -> (model, size)
+        self.__size = 0
+        self.__lock = threading.Lock()
+
+    def get(self, digest):
+        """
+        Args:
+            digest (str): Digest of the payload.
+
+        Returns:
+            The decoded model, None if it is not cached.
+        """
+        self.__lock.acquire()
+        entry = self.__entries.get(digest)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.__entries.move_to_end(digest)
+        self.__lock.release()
+        return entry[0] if entry is not None else None
+
+    def put(self, digest, model, size):
+        """
+        Cache a decoded model. Models larger than max_bytes are not cached.
+
+        Args:
+            digest (str): Digest of the payload.
+            model: Decoded model.
+            size (int): Size of the payload.
+        """
+        if size > self.max_bytes:
+            return
+        self.__lock.acquire()
+        old = self.__entries.pop(digest, None)
+        if old is not None:
+            self.__size -= old[1]
+        self.__entries[digest] = (model, size)
+        self.__size += size
+        while self.__size > self.max_bytes:
+            _, (_, evicted_size) = self.__entries.popitem(last=False)
+            self.__size -= evicted_size
+        self.__lock.release()
+
+    def clear(self):
+        self.__lock.acquire()
+        self.__entries.clear()
+        self.__size = 0
+        self.__lock.release()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get_stats(self, reset=False):
+        """
+        Args:
+            reset (bool): If True, reset the hit and miss counters.
+
+        Returns:
+            dict: Number of entries, size, hits, misses and hit ratio of the cache.
+        """
+        self.__lock.acquire()
+        total = self.hits + self.misses
+        stats = {
+            "entries": len(self.__entries),
+            "bytes": self.__size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total > 0 else 0.0,
+        }
+        if reset:
+            self.hits = 0
+            self.misses = 0
+        self.__lock.release()
+        return stats
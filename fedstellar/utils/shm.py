@@ -0,0 +1,145 @@
+#
+# This file is part of the Fedstellar platform (see https://github.com/enriquetomasmb/fedstellar).
+# Copyright (c) 2023 Enrique Tomás Martínez Beltrán.
+#
+
+import logging
+import mmap
+import os
+import socket
+import threading
+from collections import OrderedDict
+
+###########################
+#  Shared-memory segments #
+###########################
+#
+# Models exchanged between nodes of the same host (e.g. containers with ipc: host) are written once into a segment
+# (a file in a shared memory directory, /dev/shm by default), and only its name and digest are sent. The receiver maps
+# the segment read-only and decodes the model from the mapping (zero-copy). Segments are files, so a mapping stays valid
+# after the sender deletes the segment: the sender deletes it once unused (no send in progress) and evicted.
+
+
+def get_host_id():
+    """
+    Returns:
+        str: Identifier of the host (boot id of the kernel, shared by the containers of the host).
+    """
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            return f.read().strip()
+    except OSError:
+        return socket.gethostname()
+
+
+def open_segment(directory, name):
+    """
+    Map a segment read-only.
+
+    Args:
+        directory (str): Shared memory directory.
+        name (str): Name of the segment.
+
+    Returns:
+        mmap.mmap: Contents of the segment, None if it does not exist.
+    """
+    if os.path.basename(name) != name:
+        return None
+    try:
+        fd = os.open(os.path.join(directory, name), os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        size = os.fstat(fd).st_size
+        if size == 0:
+            return None
+        return mmap.mmap(fd, size, prot=mmap.PROT_READ)
+    finally:
+        os.close(fd)
+
+
+class SegmentStore:
+    """
+    Segments created by a node, one per payload (identified by its digest). Each send holds a reference to its
+    segment (see acquire and release). At most capacity unused segments are kept (least recently used ones are
+    deleted first), so the same payload sent to several neighbors is written once.
+
+    Args:
+        directory (str): Shared memory directory.
+        prefix (str): Prefix of the names of the segments (unique per node).
+        capacity (int): Maximum number of unused segments.
+    """
+
+    def __init__(self, directory, prefix, capacity):
+        self.directory = directory
+        self.prefix = prefix
+        self.capacity = max(1, int(capacity))
+        self.__segments = OrderedDict()  # digest -> [name, references] (LRU order)
+        self.__lock = threading.Lock()
+
+    def acquire(self, payload, digest):
+        """
+        Get the segment of a payload, writing it if there is none. It must be released after use.
+
+        Args:
+            payload (bytes): Payload.
+            digest (str): Digest of the payload.
+
+        Returns:
+            str: Name of the segment.
+
+        Raises:
+            OSError: If the segment cannot be written.
+        """
+        self.__lock.acquire()
+        try:
+            entry = self.__segments.get(digest)
+            if entry is None:
+                name = f"{self.prefix}-{digest[:32]}"
+                path = os.path.join(self.directory, name)
+                # Written under a temporary name, so receivers never map a partial segment
+                with open(f"{path}.tmp", "wb") as f:
+                    f.write(payload)
+                os.replace(f"{path}.tmp", path)
+                entry = self.__segments[digest] = [name, 0]
+            entry[1] += 1
+            self.__segments.move_to_end(digest)
+            return entry[0]
+        finally:
+            self.__lock.release()
+
+    def release(self, digest):
+        """
+        Release a segment obtained with acquire.
+
+        Args:
+            digest (str): Digest of the payload.
+        """
+        self.__lock.acquire()
+        entry = self.__segments.get(digest)
+        if entry is not None:
+            entry[1] -= 1
+        unused = [d for d, e in self.__segments.items() if e[1] <= 0]
+        evicted = [self.__segments.pop(d)[0] for d in unused[:max(0, len(unused) - self.capacity)]]
+        self.__lock.release()
+        self.__delete(evicted)
+
+    def clear(self):
+        """
+        Delete all the segments.
+        """
+        self.__lock.acquire()
+        evicted = [name for name, _ in self.__segments.values()]
+        self.__segments.clear()
+        self.__lock.release()
+        self.__delete(evicted)
+
+    def __delete(self, names):
+        for name in names:
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError as e:
+                logging.debug(f"Cannot delete shared memory segment {name}: {e}")
+
+    def __len__(self):
+        return len(self.__segments)
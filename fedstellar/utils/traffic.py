@@ -0,0 +1,121 @@
+#
+# This file is part of the Fedstellar platform (see https://github.com/enriquetomasmb/fedstellar).
+# Copyright (c) 2023 Enrique Tomás Martínez Beltrán.
+#
+
+import bisect
+import threading
+
+# Upper bounds (seconds) of the latency histogram buckets (the last bucket has no upper bound)
+LATENCY_BUCKETS = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 30, 60]
+
+
+class TrafficStats:
+    """
+    Traffic and latency accounting per (cmd, neighbor, direction): number of messages, bytes, errors and a latency
+    histogram (LATENCY_BUCKETS). Directions are "out" (sent by this node, latency of the call) and "in" (received,
+    latency of the handler). It has its own lock (held only to update the counters), so recording never waits for the
+    neighbors lock.
+    """
+
+    def __init__(self):
+        self.__stats = {}  # (cmd, nei, direction) -> [count, bytes, errors, latency sum, histogram]
+        self.__lock = threading.Lock()
+
+    def record(self, cmd, nei, direction, nbytes, seconds=None, error=False):
+        """
+        Record a message.
+
+        Args:
+            cmd (str): Command of the message (e.g. beat, add_model).
+            nei (str): Address of the neighbor.
+            direction (str): "out" or "in".
+            nbytes (int): Size of the message.
+            seconds (float): Latency (None if unknown).
+            error (bool): True if the message failed.
+        """
+        key = (cmd, nei, direction)
+        self.__lock.acquire()
+        entry = self.__stats.get(key)
+        if entry is None:
+            entry = self.__stats[key] = [0, 0, 0, 0.0, [0] * (len(LATENCY_BUCKETS) + 1)]
+        entry[0] += 1
+        entry[1] += nbytes
+        if error:
+            entry[2] += 1
+        if seconds is not None:
+            entry[3] += seconds
+            entry[4][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.__lock.release()
+
+    def snapshot(self, reset=False):
+        """
+        Get the counters (e.g. for benchmarks).
+
+        Args:
+            reset (bool): If True, reset the counters.
+
+        Returns:
+            dict: (cmd, nei, direction) -> {count, bytes, errors, latency_sum, histogram}.
+        """
+        self.__lock.acquire()
+        stats = self.__stats
+        if reset:
+            self.__stats = {}
+        else:
+            stats = {key: [c, b, e, s, list(h)] for key, (c, b, e, s, h) in stats.items()}
+        self.__lock.release()
+        return {
+            key: {"count": c, "bytes": b, "errors": e, "latency_sum": s, "histogram": h}
+            for key, (c, b, e, s, h) in stats.items()
+        }
+
+    def get_metrics(self, reset=False):
+        """
+        Get the counters aggregated over the neighbors, as metrics to log
+        (Traffic/<direction>/<cmd>/{count, bytes, errors, latency_mean, latency_p95}).
+
+        Args:
+            reset (bool): If True, reset the counters.
+
+        Returns:
+            dict: Metrics.
+        """
+        totals = {}
+        for (cmd, _, direction), entry in self.snapshot(reset=reset).items():
+            total = totals.setdefault((cmd, direction), {"count": 0, "bytes": 0, "errors": 0, "latency_sum": 0.0, "histogram": [0] * (len(LATENCY_BUCKETS) + 1)})
+            for field in ("count", "bytes", "errors", "latency_sum"):
+                total[field] += entry[field]
+            total["histogram"] = [a + b for a, b in zip(total["histogram"], entry["histogram"])]
+
+        metrics = {}
+        for (cmd, direction), total in totals.items():
+            prefix = f"Traffic/{direction}/{cmd}"
+            metrics[f"{prefix}/count"] = total["count"]
+            metrics[f"{prefix}/bytes"] = total["bytes"]
+            metrics[f"{prefix}/errors"] = total["errors"]
+            timed = sum(total["histogram"])
+            if timed > 0:
+                metrics[f"{prefix}/latency_mean"] = total["latency_sum"] / timed
+                metrics[f"{prefix}/latency_p95"] = quantile(total["histogram"], 0.95)
+        return metrics
+
+
+def quantile(histogram, q):
+    """
+    Approximate a quantile of a latency histogram (upper bound of the bucket that contains it).
+
+    Args:
+        histogram (list): Counts of the LATENCY_BUCKETS buckets.
+        q (float): Quantile (0, 1].
+
+    Returns:
+        float: Latency (seconds). The last bound for the unbounded bucket.
+    """
+    target = q * sum(histogram)
+    accumulated = 0
+    for i, count in enumerate(histogram):
+        accumulated += count
+        if count > 0 and accumulated >= target:
+            return LATENCY_BUCKETS[min(i, len(LATENCY_BUCKETS) - 1)]
+    return LATENCY_BUCKETS[-1]
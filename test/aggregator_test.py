@@ -0,0 +1,120 @@
+from types import SimpleNamespace
+
+import torch
+
+from fedstellar.learning.aggregators.fedavg import FedAvg
+
+
+def make_config(**participant):
+    config = {"device_args": {"role": "aggregator"}, "AGGREGATION_TIMEOUT": 1, "AGGREGATION_CHUNK_SIZE": 1048576, "AGGREGATION_WORKERS": 1}
+    config.update(participant)
+    return SimpleNamespace(participant=config)
+
+
+def model(value):
+    return {"layer": torch.full((2, 2), float(value))}
+
+
+def test_accepts_model():
+    aggregator = FedAvg("n0", make_config())
+    aggregator.set_nodes_to_aggregate(["n0", "n1", "n2"])
+    cases = [
+        (["n1"], 1, False),  # wrong round
+        ([], 0, False),  # no contributors
+        (["n3"], 0, False),  # not in the train set
+        (["n1"], 0, True),
+        (["n1"], 0, False),  # already aggregated (nothing to add)
+        (["n1", "n2"], 0, True),  # one contributor not aggregated yet
+        (["n0", "n1", "n2"], 0, True),  # full aggregation
+        (["n0"], 0, False),  # all the models were added
+    ]
+    for contributors, round, expected in cases:
+        assert aggregator.accepts_model(contributors, round=round) == expected, contributors
+        added = aggregator.add_model(model(1), contributors, 1, round=round)
+        if expected:
+            assert added is not None
+    aggregator.clear()
+
+
+def test_accepts_model_waiting_aggregated_model():
+    aggregator = FedAvg("n0", make_config())
+    aggregator.set_nodes_to_aggregate(["n0", "n1"])
+    aggregator.set_waiting_aggregated_model(["n0", "n1"])
+    assert not aggregator.accepts_model(["n1"], round=0)
+    assert aggregator.accepts_model(["n1", "n0"], round=0)
+    assert aggregator.accepts_model(["n0"], round=0, local=True)
+    aggregator.clear()
+
+
+def test_streaming_fedavg_matches_fedavg():
+    results = []
+    for streaming in (False, True):
+        aggregator = FedAvg("n0", make_config(aggregator_args={"algorithm": "FedAvg", "streaming": streaming}))
+        aggregator.set_nodes_to_aggregate(["n0", "n1", "n2", "n3"])
+        inputs = [model(1), model(2), model(4)]
+        aggregator.add_model(inputs[0], ["n0"], 1, round=0)
+        aggregator.add_model(inputs[1], ["n1", "n2"], 2, round=0)
+        aggregator.add_model(inputs[2], ["n2", "n3"], 3, round=0)  # only n3 is added
+        if streaming:
+            # Only the local model is kept
+            assert [m is None for m, _ in aggregator.get_aggregated_models_weights().values()] == [False, True, True]
+        assert sorted(aggregator.get_aggregated_models()) == ["n0", "n1", "n2", "n3"]
+        results.append(aggregator.wait_and_get_aggregation())
+        # Inputs are not modified
+        assert [float(m["layer"][0, 0]) for m in inputs] == [1, 2, 4]
+        aggregator.clear()
+    assert torch.allclose(results[0]["layer"], results[1]["layer"])
+    assert torch.allclose(results[1]["layer"], torch.full((2, 2), (1 + 4 + 12) / 6))
+
+
+def test_median_and_trimmedmean():
+    from fedstellar.learning.aggregators.median import Median
+    from fedstellar.learning.aggregators.trimmedmean import TrimmedMean
+
+    models = {f"n{i}": (model(v), 1) for i, v in enumerate([1, 5, 2, 9])}
+    median = Median("n0", make_config()).aggregate(models)
+    assert torch.allclose(median["layer"], torch.full((2, 2), 3.5))
+    trimmed = TrimmedMean("n0", make_config(), beta=1).aggregate(models)
+    assert torch.allclose(trimmed["layer"], torch.full((2, 2), 3.5))
+    # Chunks of parameters, beta from the config
+    config = make_config(aggregator_args={"algorithm": "TrimmedMean", "beta": 1}, AGGREGATION_CHUNK_SIZE=3)
+    trimmed = TrimmedMean("n0", config).aggregate(models)
+    assert torch.allclose(trimmed["layer"], torch.full((2, 2), 3.5))
+    models.pop("n3")
+    median = Median("n0", make_config(AGGREGATION_CHUNK_SIZE=3)).aggregate(models)
+    assert torch.allclose(median["layer"], torch.full((2, 2), 2.0))
+
+
+def test_krum_and_multikrum():
+    from fedstellar.learning.aggregators.krum import Krum
+
+    values = [1, 1.5, 2, 2.5, 50]  # the last model is an outlier
+    models = {f"n{i}": (model(v), i + 1) for i, v in enumerate(values)}
+    aggregator = Krum("n0", make_config(aggregator_args={"algorithm": "Krum", "f": 1}))
+    distances = aggregator.get_distances(aggregator.get_gram([m for m, _ in models.values()]))
+    expected = torch.tensor([[4 * (a - b) ** 2 for b in values] for a in values])
+    assert torch.allclose(distances, expected)
+    # Scores: sum of the n - f - 2 = 2 nearest distances, 1.5 and 2 are tied
+    assert torch.allclose(aggregator.get_scores(distances), torch.tensor([5., 2., 2., 5., 4 * (47.5 ** 2 + 48 ** 2)]))
+    krum = aggregator.aggregate(models)
+    assert torch.allclose(krum["layer"], torch.full((2, 2), 1.5))
+
+    aggregator = Krum("n0", make_config(aggregator_args={"algorithm": "Krum", "f": 1, "m": 3}))
+    multikrum = aggregator.aggregate(models)
+    assert torch.allclose(multikrum["layer"], torch.full((2, 2), (1 * 1 + 1.5 * 2 + 2 * 3) / 6))
+
+
+def test_aggregation_is_deterministic_across_workers():
+    from fedstellar.learning.aggregators.krum import Krum
+    from fedstellar.learning.aggregators.median import Median
+    from fedstellar.learning.aggregators.trimmedmean import TrimmedMean
+
+    torch.manual_seed(0)
+    models = {f"n{i}": ({"a": torch.randn(7, 5), "b": torch.randn(3)}, i + 1) for i in range(6)}
+    aggregator_args = {"algorithm": "Krum", "f": 1, "m": 3, "beta": 1}
+    for cls in (FedAvg, Krum, Median, TrimmedMean):
+        results = [
+            cls("n0", make_config(aggregator_args=aggregator_args, AGGREGATION_CHUNK_SIZE=4, AGGREGATION_WORKERS=workers)).aggregate(models)
+            for workers in (1, 3)
+        ]
+        assert all(torch.equal(results[0][name], results[1][name]) for name in ("a", "b")), cls.__name__
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import os
+import socket
+import time
+
+import pytest
+
+from fedstellar.base_node import BaseNode
+from fedstellar.config.config import Config
+
+CONFIG_EXAMPLE = os.path.join(os.path.dirname(__file__), "..", "fedstellar", "frontend", "config", "participant.json.example")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_node(tmp_path):
+    """
+    Node (not started) using the asyncio gRPC transport.
+    """
+    port = free_port()
+    config = Config(entity="participant")
+    with open(CONFIG_EXAMPLE) as f:
+        config.participant = json.load(f)
+    for key in ("log_dir", "config_dir", "model_dir"):
+        config.participant["tracking_args"][key] = str(tmp_path)
+    config.participant["network_args"].update({"ip": "127.0.0.1", "port": port})
+    config.participant.update({"TRANSPORT": "aio", "GRPC_TIMEOUT": 5})
+    return BaseNode("test", port=port, config=config)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+def test_aio_connect_send_and_stop(tmp_path):
+    a, b = make_node(tmp_path), make_node(tmp_path)
+    received = []
+    b.add_message_handler("test", lambda msg: received.append(msg.args[0]))
+    a.start()
+    b.start()
+    try:
+        # Handshake (both nodes become neighbors)
+        assert a.connect(b.addr)
+        wait_until(lambda: a.addr in b.get_neighbors())
+
+        # A single message (send_message) and a batch (send_messages, deduplicated by the servicer)
+        msgs = [a._neighbors.build_msg("test", [str(i)]) for i in range(3)]
+        a._neighbors.send_messages([(b.addr, msgs[0])])
+        a._neighbors.send_messages([(b.addr, msgs[0]), (b.addr, msgs[1]), (b.addr, msgs[2])])
+        wait_until(lambda: len(received) == 3)
+        assert received == ["0", "1", "2"]
+    finally:
+        a.stop()
+    # The neighbor is notified of the disconnection
+    wait_until(lambda: a.addr not in b.get_neighbors())
+    b.stop()
+
+
+def test_aio_blocking_calls_are_rejected_in_the_loop(tmp_path):
+    node = make_node(tmp_path)
+    node.start()
+    try:
+        loop = node._BaseNode__loop
+
+        async def connect():
+            return node._neighbors._connect("127.0.0.1:1", handshake_msg=False)
+
+        # Waiting for the loop from the loop itself would deadlock it
+        with pytest.raises(RuntimeError):
+            asyncio.run_coroutine_threadsafe(connect(), loop).result(timeout=5)
+    finally:
+        node.stop()
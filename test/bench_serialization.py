@@ -0,0 +1,57 @@
+#
+# Benchmark of the model serialization: torch.save/torch.load (previous format) vs the flat format.
+# Usage: python -m test.bench_serialization
+#
+
+import io
+import time
+
+import torch
+
+from fedstellar.learning.pytorch import codecs
+
+
+def build_model():
+    return torch.nn.Sequential(
+        torch.nn.Conv2d(3, 64, 3),
+        torch.nn.BatchNorm2d(64),
+        torch.nn.Conv2d(64, 128, 3),
+        torch.nn.BatchNorm2d(128),
+        torch.nn.Flatten(),
+        torch.nn.Linear(128 * 28 * 28, 256),
+        torch.nn.Linear(256, 10),
+    )
+
+
+def bench(name, fn, repeat=20):
+    fn()
+    t = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - t) / repeat * 1000
+    print(f"{name:<28} {elapsed:8.2f} ms")
+
+
+def torch_save(params):
+    buffer = io.BytesIO()
+    torch.save(params, buffer)
+    return buffer.getvalue()
+
+
+def main():
+    params = build_model().state_dict()
+    size = sum(v.numel() * v.element_size() for v in params.values())
+    print(f"Model: {len(params)} tensors, {size / 2**20:.1f} MiB")
+
+    legacy = torch_save(params)
+    data = codecs.encode(params)
+    print(f"Payload: torch.save {len(legacy)} bytes, flat {len(data)} bytes")
+
+    bench("encode torch.save", lambda: torch_save(params))
+    bench("encode flat", lambda: codecs.encode(params))
+    bench("decode torch.load", lambda: torch.load(io.BytesIO(legacy), map_location="cpu"))
+    bench("decode flat", lambda: codecs.decode(data))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+from fedstellar.utils.channel_pool import ChannelPool
+
+
+def test_channel_pool():
+    closed = []
+    pool = ChannelPool(lambda addr: (object(), addr), lambda channel, stub: closed.append(stub), capacity=2, ttl=0)
+
+    # Channels are reused
+    channel_a, stub = pool.acquire("a")
+    pool.release("a", channel_a)
+    assert pool.acquire("a") == (channel_a, stub)
+    pool.release("a", channel_a)
+    assert pool.get_stats()["hits"] == 1 and pool.get_stats()["misses"] == 1
+
+    # The least recently used idle channel is evicted
+    channel_b, _ = pool.acquire("b")
+    pool.release("b", channel_b)
+    channel_c, _ = pool.acquire("c")
+    assert closed == ["a"]
+    assert "a" not in pool and len(pool) == 2
+
+    # Channels in use are closed once released
+    pool.remove("c")
+    assert closed == ["a"]
+    pool.release("c", channel_c)
+    assert closed == ["a", "c"]
+
+    # Idle channels expire
+    pool.expire()
+    assert closed == ["a", "c", "b"]
+    assert len(pool) == 0
+    assert pool.get_stats()["evictions"] == 2
@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+import torch
+
+from fedstellar.learning.pytorch import codecs
+from fedstellar.learning.pytorch.lightninglearner import LightningLearner
+from fedstellar.learning.pytorch.mnist.models.mlp import MNISTModelMLP
+
+
+def test_codecs_roundtrip():
+    params = {
+        "weight": torch.randn(8, 4, 3),
+        "bias": torch.randn(8),
+        "num_batches_tracked": torch.tensor(5),
+    }
+    tolerances = {"none": 0, "fp16": 1e-2, "bf16": 5e-2, "int8": 5e-2, "int8_channel": 5e-2}
+    for codec in codecs.available_codecs(["fp16", "bf16", "int8", "int8_channel", "int8_channel+zstd", "fp16+lz4", "none+zstd"]):
+        data = codecs.encode(params, codec)
+        assert codecs.get_codec(data) == codec
+        decoded = codecs.decode(data)
+        assert list(decoded.keys()) == list(params.keys())
+        for key, value in params.items():
+            assert decoded[key].dtype == value.dtype
+            assert decoded[key].shape == value.shape
+            assert torch.allclose(decoded[key].float(), value.float(), atol=tolerances[codecs.parse_codec(codec)[0]])
+
+
+def test_codecs_negotiation():
+    # Unknown codecs are discarded, "none" is always available
+    assert codecs.available_codecs(["fp8", "int8+unknown"]) == ["none"]
+    assert codecs.available_codecs(["int8", "none", "fp16"]) == ["int8", "none", "fp16"]
+
+
+def test_decoded_parameters_are_accepted_by_the_learner():
+    config = SimpleNamespace(participant={"scenario_args": {"random_seed": 42}})
+    logger = SimpleNamespace(log_metrics=lambda *args, **kwargs: None, global_step=0)
+    learner = LightningLearner(MNISTModelMLP(), None, config=config, logger=logger)
+    params = {k: v.clone() for k, v in learner.get_parameters().items()}
+    tolerances = {"none": 0, "fp16": 1e-2, "bf16": 5e-2, "int8": 5e-2, "int8_channel": 5e-2}
+    for codec, tolerance in tolerances.items():
+        payload = learner.encode_parameters(params=params, codec=codec)
+        decoded = learner.decode_parameters(payload)
+        assert learner.check_parameters(decoded)
+        learner.set_parameters(decoded)
+        for key, value in learner.get_parameters().items():
+            assert value.dtype == params[key].dtype
+            assert torch.allclose(value.float(), params[key].float(), atol=tolerance)
+        # The model holds its own (writable) copy of the decoded parameters, not the read-only views of the payload
+        for value in learner.get_parameters().values():
+            if torch.is_floating_point(value):
+                value.add_(1)
+        assert codecs.decode(payload).keys() == decoded.keys()
+        assert all(torch.equal(codecs.decode(payload)[k], decoded[k]) for k in decoded)
+        learner.set_parameters(params)
@@ -0,0 +1,26 @@
+from fedstellar.utils.deduplication import DeduplicationIndex
+
+
+def test_deduplication_index():
+    index = DeduplicationIndex(capacity=3)
+
+    # New hashes are added, duplicated ones are rejected
+    assert index.add(1)
+    assert index.add(2)
+    assert not index.add(1)
+    assert 1 in index and 2 in index
+    assert len(index) == 2
+
+    # The oldest hash is evicted when the index is full
+    assert index.add(3)
+    assert index.add(4)
+    assert 1 not in index
+    assert len(index) == 3
+    assert index.add(1)
+    assert 2 not in index
+
+    stats = index.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 5
+    assert stats["size"] == 3
+    assert stats["hit_ratio"] == 1 / 6
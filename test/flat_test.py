@@ -0,0 +1,64 @@
+import io
+import pickle
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import torch
+
+from fedstellar.learning.exceptions import DecodingParamsError
+from fedstellar.learning.pytorch import codecs
+from fedstellar.learning.scikit.scikitlearner import ScikitLearner
+from fedstellar.utils import flat
+
+
+def test_flat_roundtrip():
+    arrays = {
+        "weight": torch.randn(8, 4, 3),
+        "half": torch.randn(5).to(torch.bfloat16),
+        "num_batches_tracked": torch.tensor(5),
+        "empty": torch.zeros(0, 3),
+        "coef": np.arange(6, dtype=np.float64).reshape(2, 3),
+    }
+    data = flat.pack(arrays, meta={"round": 1})
+    decoded, meta = flat.unpack(data)
+    assert meta == {"round": 1}
+    assert list(decoded.keys()) == list(arrays.keys())
+    for key, value in arrays.items():
+        if isinstance(value, torch.Tensor):
+            assert decoded[key].dtype == value.dtype
+            assert torch.equal(decoded[key], value)
+        else:
+            assert np.array_equal(decoded[key], value)
+
+
+def test_flat_legacy_payloads():
+    # Payloads of nodes still using torch.save are decoded
+    params = {"weight": torch.randn(3, 3)}
+    buffer = io.BytesIO()
+    torch.save(params, buffer)
+    assert not flat.is_flat(buffer.getvalue())
+    assert torch.equal(codecs.decode(buffer.getvalue())["weight"], params["weight"])
+
+
+class Exploit:
+    def __reduce__(self):
+        return (exec, ("raise RuntimeError('unpickled')",))
+
+
+def test_pickled_objects_are_not_loaded():
+    # Legacy torch.save payloads are loaded with weights_only
+    buffer = io.BytesIO()
+    torch.save({"weight": Exploit()}, buffer)
+    with pytest.raises(pickle.UnpicklingError):
+        codecs.decode(buffer.getvalue())
+
+    # Pickled scikit-learn payloads are only accepted with ALLOW_PICKLE_PAYLOADS
+    logger = SimpleNamespace(log_metrics=lambda *args, **kwargs: None, global_step=0)
+    learner = ScikitLearner(None, None, config=SimpleNamespace(participant={"ALLOW_PICKLE_PAYLOADS": False}), logger=logger)
+    with pytest.raises(DecodingParamsError):
+        learner.decode_parameters(pickle.dumps({"weight": Exploit()}))
+    with pytest.raises(TypeError):
+        learner.encode_parameters(params={"estimator": object()})
+    learner = ScikitLearner(None, None, config=SimpleNamespace(participant={"ALLOW_PICKLE_PAYLOADS": True}), logger=logger)
+    assert learner.decode_parameters(pickle.dumps({"C": 1.0, "tags": {1, 2}})) == {"C": 1.0, "tags": {1, 2}}
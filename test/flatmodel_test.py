@@ -0,0 +1,47 @@
+from collections import OrderedDict
+
+import torch
+
+from fedstellar.learning.aggregators.flatmodel import FlatLayout, FlatModel, reduce_columns, stack_models
+
+
+def make_model(value):
+    return OrderedDict([
+        ("conv.weight", torch.full((2, 3), float(value))),
+        ("bn.num_batches_tracked", torch.tensor(int(value))),
+        ("fc.bias", torch.arange(4, dtype=torch.float32) + value),
+    ])
+
+
+def test_layout_is_cached_and_round_trips():
+    model = make_model(3)
+    layout = FlatLayout.get(model)
+    assert FlatLayout.get(make_model(5)) is layout
+    assert layout.size == 6 + 1 + 4 and layout.dtype == torch.float32
+
+    flat = FlatModel.from_state_dict(model)
+    restored = flat.to_state_dict()
+    assert list(restored) == list(model)
+    for name in model:
+        assert restored[name].dtype == model[name].dtype
+        assert torch.equal(restored[name], model[name])
+    # Layers of the vector dtype are views
+    restored["conv.weight"][0, 0] = 7
+    assert flat.vector[0] == 7
+
+
+def test_stack_and_accumulate():
+    matrix, layout = stack_models([make_model(1), make_model(2)])
+    assert matrix.shape == (2, layout.size)
+    vector = torch.zeros(layout.size)
+    layout.accumulate(vector, make_model(1), alpha=2)
+    assert torch.equal(vector, 2 * matrix[0])
+
+
+def test_reduce_columns_by_chunks():
+    models = [make_model(v) for v in (1, 4, 2)]
+    matrix, layout = stack_models(models)
+    assert torch.equal(layout.stack(models, 5, 9), matrix[:, 5:9])
+    for chunk_size in (1, 4, layout.size):
+        reduced = reduce_columns(models, lambda block: block.max(dim=0).values, chunk_size)
+        assert all(torch.equal(reduced[name], make_model(4)[name]) for name in reduced)
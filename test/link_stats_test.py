@@ -0,0 +1,23 @@
+import pytest
+
+from fedstellar.utils.link_stats import LinkStats
+
+
+def test_link_stats():
+    stats = LinkStats(alpha=0.5)
+    stats.add_rtt("a", 0.2)
+    stats.add_rtt("a", 0.4)
+    stats.add_transfer("a", 1000, 1)
+    stats.add_transfer("b", 1000, 0.1)
+    assert stats.get("a") == (pytest.approx(0.3), 1000)
+    assert stats.get("b") == (None, 10000)
+    assert stats.transfer_time("a") == pytest.approx(1.3)
+    assert stats.transfer_time("b", queued=1) == pytest.approx(0.2)
+
+    # Unknown neighbors are tried first, then the fastest ones
+    assert stats.select(["a", "b", "c"], 2, policy="fastest") == ["c", "b"]
+    assert stats.select(["a", "b"], 1, policy="eft") == ["b"]
+    # Models queued to the fast neighbor delay it
+    assert stats.select(["a", "b"], 1, policy="eft", queued={"b": 20}) == ["a"]
+    assert sorted(stats.select(["a", "b", "c"], 2, policy="weighted")) in (["a", "b"], ["a", "c"], ["b", "c"])
+    assert len(stats.select(["a", "b", "c"], 5)) == 3
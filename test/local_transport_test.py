@@ -0,0 +1,63 @@
+import grpc
+import pytest
+
+from fedstellar.local_transport import LocalServer, LocalStub, LocalTransportError, LocalWeights
+from fedstellar.proto import node_pb2
+
+
+class DummyNode:
+    addr = "local:1"
+
+    def __init__(self):
+        self.received = []
+
+    def send_message(self, request, _):
+        self.received.append(request)
+        return node_pb2.ResponseMessage()
+
+    def add_model(self, request, _):
+        self.received.append(request)
+        return node_pb2.ResponseMessage()
+
+
+def test_local_dispatch():
+    node = DummyNode()
+    server = LocalServer(node)
+    server.start()
+    try:
+        stub = LocalStub(node.addr)
+        msg = node_pb2.Message(source="local:2", cmd="beat")
+        future = stub.send_message.future(msg, timeout=5)
+        assert not future.result().error
+        assert future.code() == grpc.StatusCode.OK
+        payload = b"model"
+        stub.add_model(LocalWeights("local:2", 0, payload, [], 1), timeout=5)
+        # Messages are copied (the receiver may modify them), the model payload is handed over without copies
+        assert node.received[0] is not msg and node.received[0] == msg
+        assert node.received[1].weights is payload
+    finally:
+        server.stop(0)
+    with pytest.raises(LocalTransportError):
+        LocalStub(node.addr).send_message(node_pb2.Message(), timeout=5)
+
+
+def test_gossip_ttl_is_decremented_per_hop():
+    class GossipNode(DummyNode):
+        def send_message(self, request, _):
+            request.ttl -= 1  # as Neighbors.gossip does before forwarding
+            return super().send_message(request, _)
+
+    nodes = [GossipNode(), GossipNode()]
+    nodes[1].addr = "local:3"
+    servers = [LocalServer(node) for node in nodes]
+    for server in servers:
+        server.start()
+    try:
+        msg = node_pb2.Message(source="local:2", ttl=5, cmd="beat")
+        for node in nodes:
+            LocalStub(node.addr).send_message(msg, timeout=5)
+        assert msg.ttl == 5
+        assert [node.received[0].ttl for node in nodes] == [4, 4]
+    finally:
+        for server in servers:
+            server.stop(0)
@@ -0,0 +1,130 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from fedstellar.membership import Membership
+from fedstellar.proto import node_pb2
+
+
+class FakeNeighbors:
+    def __init__(self):
+        self.neighbors = set()
+
+    def add(self, addr, non_direct=False):
+        self.neighbors.add(addr)
+
+    def remove(self, addr):
+        self.neighbors.discard(addr)
+
+    def get_all(self):
+        return list(self.neighbors)
+
+
+def update(addr, incarnation, state):
+    return node_pb2.MemberUpdate(addr=addr, incarnation=incarnation, state=state)
+
+
+def test_membership_updates():
+    config = SimpleNamespace(participant={"SWIM_MAX_PIGGYBACK": 10, "SWIM_INDIRECT_PROBES": 3})
+    neighbors = FakeNeighbors()
+    membership = Membership("a", config, neighbors)
+
+    # New members are added as neighbors
+    membership.merge([update("b", 0, node_pb2.ALIVE), update("c", 0, node_pb2.ALIVE)])
+    assert sorted(neighbors.get_all()) == ["b", "c"]
+
+    # Suspicion overrides alive with the same incarnation, but not an older one
+    membership.merge([update("b", 0, node_pb2.SUSPECT)])
+    membership.merge([update("b", 0, node_pb2.ALIVE)])
+    assert membership.get_members(states=(node_pb2.SUSPECT,)) == ["b"]
+    membership.merge([update("b", 1, node_pb2.ALIVE)])
+    assert membership.get_members(states=(node_pb2.SUSPECT,)) == []
+
+    # Dead members are removed
+    membership.merge([update("c", 0, node_pb2.DEAD)])
+    assert neighbors.get_all() == ["b"]
+    assert membership.get_members() == ["b"]
+
+    # Suspicions about itself are refuted with a higher incarnation
+    membership.merge([update("a", 0, node_pb2.SUSPECT)])
+    res = membership.handle_probe(node_pb2.ProbeRequest(source="b"))
+    assert res.ack
+    assert update("a", 1, node_pb2.ALIVE) in res.updates
+
+
+class ProbedNeighbors(FakeNeighbors):
+    """
+    Direct probes to "t" fail. Indirect probes take the given delay (seconds) per helper, then ack or not.
+    """
+
+    def __init__(self, helpers):
+        super().__init__()
+        self.helpers = helpers
+        self.probed = []
+
+    def send_probe(self, addr, request, timeout):
+        if not request.target:
+            self.probed.append(addr)
+            if addr == "t":
+                raise TimeoutError()
+            return node_pb2.ProbeResponse(ack=True)
+        delay, ack = self.helpers[addr]
+        time.sleep(min(delay, timeout))
+        return node_pb2.ProbeResponse(ack=ack and delay <= timeout)
+
+
+def make_membership(helpers, **participant):
+    config = SimpleNamespace(participant={
+        "SWIM_MAX_PIGGYBACK": 10, "SWIM_PROBE_TIMEOUT": 0.5, "SWIM_INDIRECT_PROBES": 3, "SWIM_SUSPECT_TIMEOUT": 10,
+        "SWIM_DEAD_TIMEOUT": 60, **participant,
+    })
+    neighbors = ProbedNeighbors(helpers)
+    membership = Membership("a", config, neighbors)
+    membership.merge([update(addr, 0, node_pb2.ALIVE) for addr in ["t"] + list(helpers)])
+    return membership, neighbors
+
+
+def probe_target(helpers, membership=None, neighbors=None):
+    if membership is None:
+        membership, neighbors = make_membership(helpers)
+    probes = neighbors.probed.count("t")
+    while neighbors.probed.count("t") == probes:
+        start = time.time()
+        membership.probe_round()
+    return membership, time.time() - start
+
+
+def test_indirect_probes_are_concurrent():
+    # The first ack ends the indirect phase (the slow helpers are not waited for)
+    membership, elapsed = probe_target({"b": (5, False), "c": (0.1, True), "d": (5, False)})
+    assert elapsed < 0.5
+    assert membership.get_members(states=(node_pb2.SUSPECT,)) == []
+
+    # Without acks, the whole indirect phase is bounded by one timeout (2 x SWIM_PROBE_TIMEOUT)
+    membership, elapsed = probe_target({"b": (5, False), "c": (5, False), "d": (0.1, False)})
+    assert elapsed < 1.5
+    assert membership.get_members(states=(node_pb2.SUSPECT,)) == ["t"]
+
+
+def test_indirect_probes_run_on_a_bounded_pool():
+    membership, neighbors = make_membership({"b": (5, False), "c": (5, False), "d": (5, False)}, SWIM_PROBE_TIMEOUT=0.1)
+    for _ in range(5):
+        probe_target(None, membership, neighbors)
+    threads = [t for t in threading.enumerate() if t.name.startswith("swim-indirect-probe-a")]
+    assert 0 < len(threads) <= 3
+
+    # Once stopped, no indirect probes are sent
+    membership.stop()
+    membership, elapsed = probe_target(None, membership, neighbors)
+    assert elapsed < 0.1
+
+
+def test_dead_members_are_forgotten():
+    membership, neighbors = make_membership({}, SWIM_DEAD_TIMEOUT=0.1)
+    membership.merge([update("c", 0, node_pb2.ALIVE)])
+    membership.merge([update("c", 0, node_pb2.DEAD)])
+    membership.probe_round()
+    assert membership.get_members(states=(node_pb2.DEAD,)) == ["c"]
+    time.sleep(0.2)
+    membership.probe_round()
+    assert membership.get_members(states=(node_pb2.DEAD,)) == []
@@ -0,0 +1,29 @@
+from fedstellar.utils.model_cache import DecodedModelCache
+
+
+def test_hits_and_misses():
+    cache = DecodedModelCache(100)
+    assert cache.get("a") is None
+    model = {"layer": [1, 2, 3]}
+    cache.put("a", model, 10)
+    assert cache.get("a") is model
+    stats = cache.get_stats(reset=True)
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (1, 1, 0.5)
+    assert cache.get_stats()["hits"] == 0
+
+
+def test_lru_eviction_by_size():
+    cache = DecodedModelCache(100)
+    cache.put("a", "A", 40)
+    cache.put("b", "B", 40)
+    cache.get("a")  # "b" becomes the least recently used
+    cache.put("c", "C", 40)
+    assert cache.get("b") is None
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+    assert cache.get_stats()["bytes"] == 80
+    # Larger than the cache (or disabled cache)
+    cache.put("d", "D", 101)
+    assert cache.get("d") is None
+    disabled = DecodedModelCache(0)
+    disabled.put("a", "A", 1)
+    assert len(disabled) == 0
@@ -0,0 +1,28 @@
+from fedstellar.base_node import MAX_MESSAGE_LENGTH, ModelStreamAssembler
+from fedstellar.proto import node_pb2
+from fedstellar.utils.functions import payload_digest
+
+
+def header(total_size, digest=""):
+    return node_pb2.WeightsChunk(header=node_pb2.WeightsHeader(source="a", total_size=total_size, digest=digest))
+
+
+def test_model_stream_reassembly():
+    payload = b"0123456789"
+    assembler = ModelStreamAssembler(max_size=MAX_MESSAGE_LENGTH)
+    assert assembler.add(header(len(payload), payload_digest(payload)))
+    for i in range(0, len(payload), 4):
+        assert assembler.add(node_pb2.WeightsChunk(chunk=payload[i:i + 4]))
+    assert assembler.get_weights().weights == payload
+    assert not assembler.add(node_pb2.WeightsChunk(chunk=b"x"))  # exceeds the announced size
+
+
+def test_model_stream_rejects_oversized_headers():
+    # The announced size is checked before allocating the buffer
+    for total_size in (MAX_MESSAGE_LENGTH + 1, 2 ** 62, -1):
+        assembler = ModelStreamAssembler(max_size=MAX_MESSAGE_LENGTH)
+        assert not assembler.add(header(total_size))
+        assert "announces" in assembler.error
+    assembler = ModelStreamAssembler(max_size=8)
+    assert not assembler.add(header(9))
+    assert ModelStreamAssembler(max_size=8).add(header(8))
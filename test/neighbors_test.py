@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+import time
+
+import grpc
+
+from fedstellar.base_node import BaseNode
+from fedstellar.config.config import Config
+from fedstellar.local_transport import LocalNeighbors, LocalServer
+from fedstellar.proto import node_pb2
+
+CONFIG_EXAMPLE = os.path.join(os.path.dirname(__file__), "..", "fedstellar", "frontend", "config", "participant.json.example")
+
+
+def make_config(tmp_path, **participant):
+    config = Config(entity="participant")
+    with open(CONFIG_EXAMPLE) as f:
+        config.participant = json.load(f)
+    for key in ("log_dir", "config_dir", "model_dir"):
+        config.participant["tracking_args"][key] = str(tmp_path)
+    config.participant["TRANSPORT"] = "local"
+    config.participant.update(participant)
+    return config
+
+
+class Unimplemented(grpc.RpcError):
+    def code(self):
+        return grpc.StatusCode.UNIMPLEMENTED
+
+
+class Peer:
+    """
+    Node of the local transport that records the calls it receives (sleeping delay seconds in each one).
+    """
+
+    def __init__(self, addr, delay=0, fail=False, batches=True):
+        self.addr = addr
+        self.delay = delay
+        self.fail = fail
+        self.batches = batches
+        self.calls = []  # (method, time, commands)
+        self.lock = threading.Lock()
+
+    def handshake(self, request, _):
+        return node_pb2.ResponseMessage()
+
+    def disconnect(self, request, _):
+        return node_pb2.ResponseMessage()
+
+    def __record(self, method, msgs):
+        self.lock.acquire()
+        self.calls.append((method, time.time(), [msg.cmd for msg in msgs]))
+        self.lock.release()
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("peer failure")
+        return node_pb2.ResponseMessage()
+
+    def send_message(self, request, _):
+        return self.__record("send_message", [request])
+
+    def send_messages(self, request, _):
+        if not self.batches:
+            raise Unimplemented()
+        return self.__record("send_messages", request.messages)
+
+
+def connect(tmp_path, peers):
+    neighbors = LocalNeighbors("local:0", make_config(tmp_path))
+    servers = [LocalServer(peer) for peer in peers]
+    for server in servers:
+        server.start()
+    for peer in peers:
+        assert neighbors.add(peer.addr)
+    return neighbors, servers
+
+
+def test_messages_are_sent_to_the_neighbors_concurrently(tmp_path):
+    peers = [Peer("local:1", delay=0.5), Peer("local:2", delay=0.5), Peer("local:3", delay=0.5, fail=True)]
+    neighbors, servers = connect(tmp_path, peers)
+    try:
+        start = time.time()
+        neighbors.send_messages([(peer.addr, neighbors.build_msg("beat")) for peer in peers])
+        elapsed = time.time() - start
+
+        # The time spent is the one of the slowest neighbor (not the sum), the calls start together
+        assert elapsed < 1
+        starts = [peer.calls[0][1] for peer in peers]
+        assert max(starts) - min(starts) < 0.25
+
+        # The failing neighbor is removed, the others are kept
+        assert sorted(neighbors.get_all()) == ["local:1", "local:2"]
+    finally:
+        for server in servers:
+            server.stop(0)
+
+
+def test_messages_to_a_neighbor_are_batched(tmp_path):
+    peers = [Peer("local:1"), Peer("local:2", batches=False)]
+    neighbors, servers = connect(tmp_path, peers)
+    try:
+        # A single message is sent with send_message, several ones in a single send_messages call
+        neighbors.send_messages([("local:1", neighbors.build_msg("beat"))])
+        neighbors.send_messages([("local:1", neighbors.build_msg("a")), ("local:1", neighbors.build_msg("b"))])
+        assert [(method, cmds) for method, _, cmds in peers[0].calls] == [("send_message", ["beat"]), ("send_messages", ["a", "b"])]
+
+        # Neighbors without send_messages get the messages one by one (also the next batches)
+        for _ in range(2):
+            neighbors.send_messages([("local:2", neighbors.build_msg("a")), ("local:2", neighbors.build_msg("b"))])
+        assert [(method, cmds) for method, _, cmds in peers[1].calls] == [("send_message", ["a"]), ("send_message", ["b"])] * 2
+        assert sorted(neighbors.get_all()) == ["local:1", "local:2"]
+    finally:
+        for server in servers:
+            server.stop(0)
+
+
+def test_batches_are_deduplicated_per_message(tmp_path):
+    node = BaseNode("test", port=46000, config=make_config(tmp_path))
+    received = []
+    node.add_message_handler("cmd", lambda msg: received.append(msg.args[0]))
+
+    def fail(msg):
+        raise ValueError("wrong")
+
+    node.add_message_handler("fail", fail)
+    msgs = [node._neighbors.build_msg("cmd", [str(i)]) for i in range(3)]
+
+    # Messages already processed (in the batch or before) are skipped, the others are processed
+    res = node.send_messages(node_pb2.MessageBatch(messages=[msgs[0], msgs[1], msgs[0]]), None)
+    assert not res.error
+    res = node.send_messages(node_pb2.MessageBatch(messages=[msgs[1], msgs[2]]), None)
+    assert not res.error
+    assert received == ["0", "1", "2"]
+
+    # Failing messages do not stop the batch, the first error is returned
+    res = node.send_messages(
+        node_pb2.MessageBatch(messages=[
+            node._neighbors.build_msg("fail"), node._neighbors.build_msg("cmd", ["3"]), node._neighbors.build_msg("unknown"),
+        ]),
+        None,
+    )
+    assert "wrong" in res.error
+    assert received == ["0", "1", "2", "3"]
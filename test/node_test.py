@@ -0,0 +1,237 @@
+import json
+import os
+import threading
+import time
+
+import torch
+
+from fedstellar.config.config import Config
+from fedstellar.learning.pytorch.lightninglearner import LightningLearner
+from fedstellar.learning.pytorch.mnist.models.mlp import MNISTModelMLP
+from fedstellar.local_transport import LocalWeights
+from fedstellar.messages import LearningNodeMessages
+from fedstellar.node import Node
+from fedstellar.proto import node_pb2
+
+CONFIG_EXAMPLE = os.path.join(os.path.dirname(__file__), "..", "fedstellar", "frontend", "config", "participant.json.example")
+
+
+def make_node(tmp_path, port=45000, learner=LightningLearner, **participant):
+    """
+    Node (not started) using the in-process transport, without data (nothing is trained).
+    """
+    config = Config(entity="participant")
+    with open(CONFIG_EXAMPLE) as f:
+        config.participant = json.load(f)
+    for key in ("log_dir", "config_dir", "model_dir"):
+        config.participant["tracking_args"][key] = str(tmp_path)
+    config.participant["network_args"].update({"ip": "127.0.0.1", "port": port})
+    config.participant["scenario_args"]["start_time"] = "01/01/2024 00:00:00"
+    config.participant["TRANSPORT"] = "local"
+    config.participant.update(participant)
+    return Node(idx=0, experiment_name="test", model=MNISTModelMLP(), data=None, host="127.0.0.1", port=port, config=config, learner=learner)
+
+
+class NoDeltaLearner(LightningLearner):
+    def compute_delta(self, params, base, topk=1.0):
+        return None
+
+    def apply_delta(self, base, delta):
+        return None
+
+
+def test_full_models_are_sent_when_the_learner_does_not_support_deltas(tmp_path):
+    node = make_node(tmp_path, learner=NoDeltaLearner, DELTA_ENCODING=True, MODEL_INVENTORY=False)
+    bases = []
+
+    def send_model(nei, round, encoded_model, contributors, weight, **kwargs):
+        bases.append(kwargs.get("base"))
+        return node_pb2.ResponseMessage()
+
+    node._neighbors.send_model = send_model
+    node.round = 0
+    params = node.learner.get_parameters()
+    for _ in range(3):
+        node._Node__send_model("127.0.0.1:1", params, [node.addr], 1, 0, 0)
+    assert bases == [None, None, None]
+    assert node._Node__sent_bases == {}
+
+    # A delta received by a learner without delta support is answered as if the base was missing
+    payload = node.learner.encode_parameters(params=params)
+    node._Node__received_bases["127.0.0.1:1"] = ("base", params)
+    request = LocalWeights("127.0.0.1:1", 0, payload, ["127.0.0.1:1"], 1, base="base")
+    assert node._Node__decode_model(request, payload, None) == (None, False)
+
+
+def test_models_held_or_not_needed_by_the_neighbor_are_not_transferred(tmp_path):
+    nei = "127.0.0.1:1"
+    node = make_node(tmp_path, MODEL_INVENTORY=True)
+    node.round = 0
+    offers = []
+    sent = []
+    node._neighbors.send_model = lambda nei, round, encoded_model, contributors, weight, **kwargs: sent.append(encoded_model)
+    params = node.learner.get_parameters()
+
+    def send_model(answer):
+        def offer_model(nei, round, digest, size, contributors=[], weight=1):
+            offers.append(digest)
+            return answer
+
+        node._neighbors.offer_model = offer_model
+        node._Node__send_model(nei, params, [node.addr], 1, 0, node._Node__model_version)
+
+    # The neighbor would discard the model: only the offer is sent
+    send_model(node_pb2.ResponseMessage(not_needed=True))
+    assert len(offers) == 1 and sent == []
+
+    # The neighbor wants the model: it is transferred after the offer
+    send_model(node_pb2.ResponseMessage())
+    assert len(offers) == 2 and len(sent) == 1
+
+    # The neighbor already holds the model: it is remembered, so the next transfers are skipped without offers
+    send_model(node_pb2.ResponseMessage(have_model=True))
+    send_model(node_pb2.ResponseMessage())
+    assert len(offers) == 3 and len(sent) == 1
+
+
+def test_encoded_model_is_invalidated_when_the_model_changes(tmp_path):
+    node = make_node(tmp_path)
+    node.round = 0
+    contributors = [node.addr]
+
+    def get_encoded_model(**kwargs):
+        return node._Node__get_encoded_model(node.learner.get_parameters(), contributors, node._Node__model_version, **kwargs)
+
+    payload, _, digest = get_encoded_model()
+    # Encoded once per model (and codec)
+    assert get_encoded_model()[0] is payload
+    assert get_encoded_model(codec="fp16")[2] != digest
+
+    # New parameters (aggregation)
+    params = node.learner.get_parameters()
+    params = {k: v + 1 if torch.is_floating_point(v) else v for k, v in params.items()}
+    node.aggregator.wait_and_get_aggregation = lambda: params
+    node._Node__wait_aggregated_model()
+    new_payload, _, new_digest = get_encoded_model()
+    assert new_digest != digest
+    decoded = node.learner.decode_parameters(new_payload)
+    assert all(torch.equal(decoded[k], params[k]) for k in params)
+
+    # New model (with the initial parameters again)
+    node.set_model(MNISTModelMLP())
+    assert get_encoded_model()[2] != new_digest
+
+
+def test_model_queued_before_an_invalidation_is_not_cached(tmp_path):
+    nei = "127.0.0.1:1"
+    node = make_node(tmp_path, GOSSIP_MODELS_PERIOD=0.1, MODEL_INVENTORY=False)
+    node.get_neighbors = lambda only_direct=False, only_undirected=False: [nei]
+    node.round = 0
+    contributors = [node.addr]
+    old_params = {k: v.clone() for k, v in node.learner.get_parameters().items()}
+
+    # The model is queued (not sent yet)
+    needed = [True]
+    queued = []
+
+    def queue_model(nei, round, send):
+        queued.append(send)
+        needed[0] = False
+
+    node._neighbors.queue_model = queue_model
+    node._Node__gossip_model(lambda n: needed[0], lambda n: None, lambda n: (old_params, contributors, 1))
+    assert len(queued) == 1
+
+    # The model changes before the outbox sends the queued one
+    new_params = {k: v + 1 if torch.is_floating_point(v) else v for k, v in old_params.items()}
+    node.aggregator.wait_and_get_aggregation = lambda: new_params
+    node._Node__wait_aggregated_model()
+
+    sent = []
+    node._neighbors.send_model = lambda nei, round, encoded_model, contributors, weight, **kwargs: sent.append(encoded_model)
+    needed[0] = True
+    queued[0]()
+    decoded = node.learner.decode_parameters(sent[0])
+    assert all(torch.equal(decoded[k], old_params[k]) for k in old_params)
+
+    # The stale payload is not reused for the new model
+    payload, _, _ = node._Node__get_encoded_model(node.learner.get_parameters(), contributors, node._Node__model_version)
+    decoded = node.learner.decode_parameters(payload)
+    assert all(torch.equal(decoded[k], new_params[k]) for k in new_params)
+
+
+def run_in_thread(function):
+    """
+    Run a function in a thread. Returns the thread and a dict with the result and the elapsed time once finished.
+    """
+    result = {}
+
+    def run():
+        start = time.time()
+        result["value"] = function()
+        result["elapsed"] = time.time() - start
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, result
+
+
+def test_vote_loop_wakes_up_on_votes_stop_and_timeout(tmp_path):
+    nei = "127.0.0.1:1"
+    node = make_node(tmp_path, VOTE_TIMEOUT=30, TRAIN_SET_SIZE=2)
+    node.get_neighbors = lambda only_direct=False, only_undirected=False: [nei]
+
+    # The loop proceeds as soon as the missing vote arrives
+    node.round = 0
+    thread, result = run_in_thread(node._Node__vote_train_set)
+    time.sleep(0.3)
+    node._Node__vote_train_set_callback(
+        node_pb2.Message(source=nei, cmd=LearningNodeMessages.VOTE_TRAIN_SET, args=[nei, "1000"], round=0)
+    )
+    thread.join(timeout=5)
+    assert result["elapsed"] < 2 and nei in result["value"]
+
+    # The loop exits promptly when learning is stopped
+    thread, result = run_in_thread(node._Node__vote_train_set)
+    time.sleep(0.3)
+    node._Node__stop_learning()
+    thread.join(timeout=5)
+    assert result["elapsed"] < 2 and result["value"] == []
+
+    # Without votes, the loop ends at the timeout
+    node.round = 0
+    node.config.participant["VOTE_TIMEOUT"] = 0.5
+    thread, result = run_in_thread(node._Node__vote_train_set)
+    thread.join(timeout=5)
+    assert 0.5 <= result["elapsed"] < 2 and node.addr in result["value"]
+
+
+def test_gossip_loop_wakes_up_on_models_and_stop(tmp_path):
+    nei = "127.0.0.1:1"
+    node = make_node(tmp_path, GOSSIP_MODELS_PERIOD=30)
+    node.get_neighbors = lambda only_direct=False, only_undirected=False: [nei]
+
+    def gossip():
+        node._Node__gossip_model(
+            lambda n: node.addr not in node._Node__models_aggregated.get(n, []),
+            lambda n: None,
+            lambda n: (None, None, None),
+        )
+
+    # The loop ends as soon as the neighbor reports the models it aggregated (not at the end of the period)
+    node.round = 0
+    thread, result = run_in_thread(gossip)
+    time.sleep(0.3)
+    node._Node__models_agregated_callback(
+        node_pb2.Message(source=nei, cmd=LearningNodeMessages.MODELS_AGGREGATED, args=[node.addr], round=0)
+    )
+    thread.join(timeout=5)
+    assert result["elapsed"] < 2
+
+    # The loop exits promptly when learning is stopped
+    node._Node__models_aggregated = {}
+    thread, result = run_in_thread(gossip)
+    time.sleep(0.3)
+    node._Node__stop_learning()
+    thread.join(timeout=5)
+    assert result["elapsed"] < 2
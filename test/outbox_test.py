@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from fedstellar.outbox import Outbox
+
+
+def wait_until(condition, timeout=1):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+def test_outbox():
+    config = SimpleNamespace(participant={
+        "GOSSIP_PERIOD": 0.1,
+        "GOSSIP_MESSAGES_PER_PERIOD": 10,
+        "OUTBOX_MAX_MESSAGES": 3,
+        "OUTBOX_MAX_MODELS": 2,
+    })
+    sent = []
+    release = threading.Event()
+    outbox = Outbox("a", "b", lambda nei, msgs: sent.extend(msgs), config)
+
+    # A slow model transfer does not delay the messages
+    outbox.put_model(0, release.wait)
+    assert outbox.flush(timeout=1)
+    outbox.put_message("vote")
+    assert outbox.flush(timeout=1)
+    assert sent == ["vote"]
+
+    # Models of the same round are merged, the oldest ones are dropped when the outbox is full
+    wait_until(lambda: outbox.pending_models() == 0)  # the slow transfer is in progress
+    models = []
+    outbox.put_model(1, lambda: models.append("1a"))
+    outbox.put_model(1, lambda: models.append("1b"))
+    outbox.put_model(2, lambda: models.append("2"))
+    outbox.put_model(3, lambda: models.append("3"))
+    stats = outbox.get_stats()
+    assert stats["merged"] == 1 and stats["dropped"] == 1
+    release.set()
+    outbox.put_message("done")
+    assert outbox.flush(timeout=1)
+    outbox.stop()
+    assert sent == ["vote", "done"]
+    assert outbox.get_stats()["messages"] == 2
+
+
+def test_outbox_on_event_loop():
+    config = SimpleNamespace(participant={
+        "GOSSIP_PERIOD": 0.1,
+        "GOSSIP_MESSAGES_PER_PERIOD": 10,
+        "OUTBOX_MAX_MESSAGES": 3,
+        "OUTBOX_MAX_MODELS": 2,
+    })
+    loop = asyncio.new_event_loop()
+    loop_thread = threading.Thread(target=loop.run_forever, daemon=True)
+    loop_thread.start()
+    sent = []
+
+    async def send_messages(nei, msgs):
+        sent.extend(msgs)
+
+    threads = threading.active_count()
+    outbox = Outbox("a", "b", send_messages, config, loop=loop)
+    assert threading.active_count() == threads  # no sender threads
+    release = threading.Event()
+    models = []
+    outbox.put_model(0, release.wait)  # a slow model transfer does not block the loop
+    outbox.put_model(1, lambda: models.append(1))
+    outbox.put_message("vote")
+    assert outbox.flush(timeout=1)
+    assert sent == ["vote"]
+    release.set()
+    wait_until(lambda: outbox.get_stats()["models"] == 2)
+    assert models == [1]
+    outbox.stop()
+    asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), loop).result()  # the tasks finish
+    loop.call_soon_threadsafe(loop.stop)
+    loop_thread.join(timeout=1)
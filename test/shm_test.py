@@ -0,0 +1,25 @@
+import os
+
+from fedstellar.utils.shm import SegmentStore, open_segment
+
+
+def test_segment_store(tmp_path):
+    store = SegmentStore(str(tmp_path), "node", capacity=1)
+    name = store.acquire(b"model-a", "a" * 32)
+    assert store.acquire(b"model-a", "a" * 32) == name
+    assert os.listdir(tmp_path) == [name]
+
+    mapping = open_segment(str(tmp_path), name)
+    assert mapping[:] == b"model-a"
+    store.release("a" * 32)
+    store.release("a" * 32)
+    # A second unused segment evicts the first one (capacity 1), but mappings remain valid
+    store.acquire(b"model-b", "b" * 32)
+    store.release("b" * 32)
+    assert len(store) == 1 and name not in os.listdir(tmp_path)
+    assert mapping[:] == b"model-a"
+    assert open_segment(str(tmp_path), name) is None
+    assert open_segment(str(tmp_path), "../" + name) is None
+
+    store.clear()
+    assert os.listdir(tmp_path) == []
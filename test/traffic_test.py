@@ -0,0 +1,37 @@
+import pytest
+
+from fedstellar.utils.traffic import LATENCY_BUCKETS, TrafficStats, quantile
+
+
+def test_record_and_snapshot():
+    stats = TrafficStats()
+    stats.record("beat", "n1", "out", 10, 0.003)
+    stats.record("beat", "n1", "out", 20, 0.004, error=True)
+    stats.record("beat", "n1", "in", 15)
+    snapshot = stats.snapshot()
+    out = snapshot[("beat", "n1", "out")]
+    assert (out["count"], out["bytes"], out["errors"]) == (2, 30, 1)
+    assert out["latency_sum"] == pytest.approx(0.007)
+    assert out["histogram"][LATENCY_BUCKETS.index(0.005)] == 2
+    # Received without latency (e.g. duplicates)
+    assert sum(snapshot[("beat", "n1", "in")]["histogram"]) == 0
+
+
+def test_metrics_aggregate_neighbors_and_reset():
+    stats = TrafficStats()
+    stats.record("add_model", "n1", "out", 1000, 0.1)
+    stats.record("add_model", "n2", "out", 3000, 0.3)
+    stats.record("vote_train_set", "n1", "in", 50)
+    metrics = stats.get_metrics(reset=True)
+    assert metrics["Traffic/out/add_model/count"] == 2
+    assert metrics["Traffic/out/add_model/bytes"] == 4000
+    assert metrics["Traffic/out/add_model/latency_mean"] == pytest.approx(0.2)
+    assert metrics["Traffic/out/add_model/latency_p95"] == 0.5
+    assert "Traffic/in/vote_train_set/latency_mean" not in metrics
+    assert stats.snapshot() == {}
+
+
+def test_quantile_overflow_bucket():
+    histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+    histogram[-1] = 1
+    assert quantile(histogram, 0.5) == LATENCY_BUCKETS[-1]